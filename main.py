@@ -1,7 +1,17 @@
 #!/usr/bin/env python
 import os
-import subprocess
 import sys
+import time
+import argparse
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+# Os módulos das etapas ficam em src/ e são importados diretamente no modo em processo
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from instrumentation import configurar_instrumentacao, CAMINHO_METRICAS_PADRAO
+
+ETAPAS = ["eda", "data_processing", "feature_engineering", "model_training", "evaluation", "predict_price"]
 
 
 def run_module(module_name: str) -> None:
@@ -13,11 +23,184 @@ def run_module(module_name: str) -> None:
     else:
         print(f"Módulo {module_name} executado com sucesso.")
 
-def main() -> None:
-    etapas = ["eda", "data_processing", "feature_engineering", "model_training", "evaluation", "predict_price"]
-    print("Iniciando execução do pipeline completo...\n")
-    for etapa in etapas:
+def run_subprocess() -> None:
+    """
+    Executa cada etapa como um script independente, comunicando-se pelos arquivos em disco.
+    """
+    for etapa in ETAPAS:
         run_module(etapa)
+
+def run_eda(df) -> float:
+    """
+    Executa a EDA em um processo separado, em paralelo à cadeia principal do pipeline. É um processo, e não
+    uma thread, porque a EDA e a avaliação desenham com o pyplot, cujo estado (figura atual, estilo do seaborn,
+    filtros de warnings) é global e não é seguro entre threads; o custo é uma cópia do DataFrame bruto
+    (cerca de 0,15 s e 8 MB para 50 mil anúncios).
+    """
+    import eda
+    inicio = time.perf_counter()
+    eda.executar(df)
+    return time.perf_counter() - inicio
+
+def run_in_process(salvar_dados: bool = False, forcar=(), busca: str = "grid", orcamento_s: float = None,
+                   backends=("random_forest",), memoria_mb: float = None) -> None:
+    """
+    Executa todas as etapas em um único processo, passando os DataFrames diretamente de uma
+    etapa para a outra. Os datasets intermediários só são gravados quando `salvar_dados` é verdadeiro;
+    modelos e relatórios são sempre salvos (os scripts de cada etapa refazem as etapas anteriores quando não
+    encontram os datasets intermediários). A EDA, que não alimenta as demais etapas, roda em paralelo, em outro
+    processo (ver `run_eda`).
+
+    Etapas cujas entradas (dados, código-fonte e parâmetros) não mudaram desde a última execução
+    são reaproveitadas do cache; `forcar` lista as etapas a recalcular mesmo assim ('all' para todas).
+    `busca` e `orcamento_s` definem o modo de busca de hiperparâmetros do treinamento e `backends`, os modelos
+    treinados e comparados (o primeiro passa a ser o modelo ativo). `memoria_mb` é o orçamento de RAM do treino.
+    """
+    import eda
+    import data_processing
+    import feature_engineering
+    import spatial_features
+    import categorical_encoding
+    import text_features
+    import model_training
+    import evaluation
+    import predict_price
+    import report_figures
+    import memory_budget
+    import data_storage
+    import column_stats
+    import sketches
+    import model_backends
+    import model_artifact
+    import model_versions
+    from stage_cache import StageCache
+    from model_backends import obter_backend
+
+    cache = StageCache(forcar=forcar)
+    caminho_bruto = os.path.join("data", "raw", "teste_indicium_precificacao.csv")
+    chaves = {}
+    # Cada chave lista os módulos cujo código decide a saída da etapa, inclusive os compartilhados
+    chaves["eda"] = cache.chave("eda", arquivos=[caminho_bruto], modulos=[eda, report_figures, column_stats])
+    chaves["data_processing"] = cache.chave("data_processing", arquivos=[caminho_bruto],
+                                            modulos=[data_processing, data_storage, column_stats, sketches])
+    chaves["feature_engineering"] = cache.chave("feature_engineering", modulos=[feature_engineering, spatial_features, categorical_encoding,
+                                                                                text_features, data_storage, column_stats],
+                                                dependencias=[chaves["data_processing"]])
+    chaves["model_training"] = cache.chave("model_training", modulos=[model_training, memory_budget, model_backends, model_artifact,
+                                                                      model_versions, data_storage],
+                                           parametros={"busca": busca, "orcamento_s": orcamento_s, "backends": list(backends),
+                                                       "memoria_mb": memoria_mb},
+                                           dependencias=[chaves["feature_engineering"]])
+    chaves["evaluation"] = cache.chave("evaluation", modulos=[evaluation, report_figures, model_backends, model_artifact],
+                                       dependencias=[chaves["model_training"]])
+    artefatos_eda = [os.path.join("reports", "eda")]
+
+    tempos = {}
+    df_bruto = None
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        eda_futuro = None
+        if not cache.buscar("eda", chaves["eda"])[0]:
+            df_bruto = data_processing.carregar_dados(caminho_bruto)
+            eda_futuro = executor.submit(run_eda, df_bruto)
+
+        def etapa_data_processing():
+            bruto = df_bruto if df_bruto is not None else data_processing.carregar_dados(caminho_bruto)
+            return data_processing.executar(bruto, salvar=salvar_dados)
+
+        inicio = time.perf_counter()
+        df = cache.executar("data_processing", chaves["data_processing"], etapa_data_processing,
+                            artefatos=[os.path.join("reports", "data_processing")])
+        tempos["data_processing"] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        df, pipeline = cache.executar("feature_engineering", chaves["feature_engineering"],
+                                      lambda: feature_engineering.executar(df, salvar=salvar_dados),
+                                      artefatos=[os.path.join("models", "scaler.pkl"),
+                                                 os.path.join("models", "feature_pipeline.pkl"),
+                                                 os.path.join("reports", "feature_engineering")])
+        tempos["feature_engineering"] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        treino = cache.executar("model_training", chaves["model_training"],
+                                lambda: model_training.executar(*model_training.split_features_target(df),
+                                                               busca=busca, orcamento_s=orcamento_s,
+                                                               janela={"origem": caminho_bruto, "linhas": int(len(df))},
+                                                               backends=backends, categorias=pipeline["categorias"],
+                                                               memoria_mb=memoria_mb),
+                                artefatos=[obter_backend(nome).caminho() for nome in backends] +
+                                          [obter_backend(nome).caminho_artefato() for nome in backends] +
+                                          [os.path.join("models", "modelo_ativo.json"),
+                                           os.path.join("reports", "model_training")])
+        tempos["model_training"] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        cache.executar("evaluation", chaves["evaluation"],
+                       lambda: evaluation.executar(treino["model"], treino["X_test"], treino["y_test"], treino["best_params"],
+                                                   teste=treino["teste"]),
+                       artefatos=[os.path.join("reports", "evaluation.txt"), os.path.join("reports", "evaluation_fatias.csv"),
+                                  os.path.join("reports", "figures")])
+        tempos["evaluation"] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        predict_price.precificar_exemplo(treino["model"], pipeline)
+        tempos["predict_price"] = time.perf_counter() - inicio
+
+        if eda_futuro is not None:
+            tempos["eda"] = eda_futuro.result()
+            cache.registrar("eda", chaves["eda"], None, tempos["eda"], artefatos_eda)
+        else:
+            cache.marcar_reaproveitado("eda")
+            tempos["eda"] = 0.0
+
+    # Etapas reaproveitadas não gravam os datasets intermediários; gravá-los a partir do cache se pedido
+    if salvar_dados:
+        for etapa, modulo, caminho, dados in [
+            ("data_processing", data_processing, os.path.join("data", "processed", "nyc_rental_data_processed.parquet"), None),
+            ("feature_engineering", feature_engineering, os.path.join("data", "final", "nyc_rental_data_features.parquet"), df),
+        ]:
+            if cache.resultados.get(etapa, ("",))[0] == "reaproveitado":
+                if dados is None:
+                    dados = cache.buscar(etapa, chaves[etapa])[1]
+                modulo.salvar_dados(dados, caminho)
+
+    print("\nTempo por etapa:")
+    for etapa in ETAPAS:
+        print(f" - {etapa}: {tempos[etapa]:.2f}s")
+    print("\n" + cache.resumo())
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Executa o pipeline completo de previsão de preços.")
+    parser.add_argument("--subprocess", action="store_true",
+                        help="Executa cada etapa como um script separado (modo antigo).")
+    parser.add_argument("--salvar-dados", action="store_true",
+                        help="Grava os datasets intermediários (data/processed e data/final) no modo em processo. "
+                             "Sem ela, os scripts de src/ executados depois refazem as etapas anteriores.")
+    parser.add_argument("--force", action="append", default=[], choices=ETAPAS[:-1] + ["all"], metavar="ETAPA",
+                        help="Recalcula a etapa mesmo que suas entradas não tenham mudado (pode ser repetido; 'all' para todas).")
+    parser.add_argument("--busca", choices=["grid", "halving", "adaptativa"], default="grid",
+                        help="Modo de busca de hiperparâmetros do treinamento (padrão: grid).")
+    parser.add_argument("--orcamento-s", type=float, default=None,
+                        help="Orçamento de tempo, em segundos, para a busca adaptativa.")
+    parser.add_argument("--backends", nargs="+", choices=["random_forest", "hist_gradient_boosting"], default=["random_forest"],
+                        help="Backends a treinar e comparar; o primeiro passa a ser o modelo ativo (padrão: random_forest).")
+    parser.add_argument("--memoria-mb", type=float, default=None,
+                        help="Orçamento de RAM, em MB, para o treinamento (limita workers, bootstrap e tamanho das árvores).")
+    parser.add_argument("--metricas", nargs="?", const=CAMINHO_METRICAS_PADRAO, default=None, metavar="CAMINHO",
+                        help=f"Registra as métricas de cada etapa em um arquivo JSON-lines (sem CAMINHO: {CAMINHO_METRICAS_PADRAO}). "
+                             "Desativado por padrão.")
+    parser.add_argument("--perfilar", metavar="ETAPA", default=None,
+                        help="Gera perfil do cProfile e pilhas para flamegraph de uma etapa (ex.: model_training.train_model).")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    configurar_instrumentacao(args.metricas, args.perfilar)
+    print("Iniciando execução do pipeline completo...\n")
+    if args.subprocess:
+        run_subprocess()
+    else:
+        run_in_process(salvar_dados=args.salvar_dados, forcar=args.force, busca=args.busca,
+                       orcamento_s=args.orcamento_s, backends=args.backends, memoria_mb=args.memoria_mb)
     print("\nPipeline completo executado com sucesso!")
 
 if __name__ == '__main__':
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+import os
+import sys
+import json
+import time
+import ctypes
+import argparse
+import tempfile
+import logging
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+
+from synthetic_data import gerar_anuncios
+from data_processing import carregar_dados, tratar_valores_ausentes, remover_outliers
+from data_storage import aplicar_esquema, ESQUEMA_PROCESSADO
+from feature_engineering import (criar_novas_features, codificar_variaveis_categoricas, transformar_variavel_alvo,
+                                 ajustar_pipeline_features)
+from model_artifact import salvar_artefato, carregar_artefato
+from model_backends import obter_backend, listar_backends
+from predict_price import preparar_entrada, prever_preco, precificar_lote
+from instrumentation import medir_trecho
+
+# Configuração do logger
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+TAMANHOS_PADRAO = (10_000, 100_000, 1_000_000)
+DIRETORIO_BENCHMARK = os.path.join("reports", "benchmark")
+CAMINHO_RESULTADOS = os.path.join(DIRETORIO_BENCHMARK, "resultados.json")
+CAMINHO_BASELINE = os.path.join(DIRETORIO_BENCHMARK, "baseline.json")
+N_PREVISOES_INDIVIDUAIS = 500
+# Hiperparâmetros fixos do treino medido, para que os tempos sejam comparáveis entre execuções
+PARAMETROS_TREINO = {
+    "random_forest": {"n_estimators": 50, "max_depth": 20, "min_samples_split": 2, "min_samples_leaf": 2},
+    "hist_gradient_boosting": {"hgb__max_iter": 200},
+}
+
+
+def _devolver_memoria_livre() -> None:
+    # Devolve ao sistema a memória já liberada pelas etapas anteriores (malloc_trim da glibc, só no Linux),
+    # para que o pico da etapa medida não seja absorvido por páginas residentes que o alocador reaproveitaria
+    if not sys.platform.startswith("linux"):
+        return
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def medir(funcao, *args, **kwargs):
+    """
+    Executa `funcao(*args, **kwargs)` medindo o tempo de parede e o pico de memória residente acima do
+    início do trecho, com a mesma medição (psutil) das métricas por etapa da instrumentação.
+    Retorna (resultado, {"tempo_s": ..., "memoria_pico_mb": ...}).
+    """
+    _devolver_memoria_livre()
+    with medir_trecho(f"benchmark_suite.{funcao.__name__}") as medicao:
+        resultado = funcao(*args, **kwargs)
+    return resultado, {"tempo_s": medicao.registro["tempo_parede_s"],
+                       "memoria_pico_mb": medicao.registro["rss_acrescimo_mb"]}
+
+
+def _prever_individualmente(registros: list, modelo, pipeline: dict) -> list:
+    latencias = []
+    for dados in registros:
+        inicio = time.perf_counter()
+        prever_preco(modelo, preparar_entrada(dados, pipeline))
+        latencias.append(time.perf_counter() - inicio)
+    return latencias
+
+
+def _prever_lote(df: pd.DataFrame, modelo, pipeline: dict) -> int:
+    return sum(len(bloco) for bloco in precificar_lote(df, modelo, pipeline))
+
+
+def benchmark_tamanho(n: int, backend: str = "random_forest", semente: int = 42,
+                      n_individuais: int = N_PREVISOES_INDIVIDUAIS) -> dict:
+    """
+    Mede cada etapa do pipeline sobre `n` anúncios sintéticos: leitura do CSV, tratamento de ausentes,
+    criação de features, codificação das categóricas, ajuste do pipeline de features, treino do `backend`
+    com hiperparâmetros fixos, previsão individual (`n_individuais` imóveis, um por vez) e previsão em lote.
+    As previsões usam o modelo carregado do artefato compacto, como na avaliação e no serviço.
+    Retorna um dicionário etapa -> {tempo_s, memoria_pico_mb, ...}.
+    """
+    etapas = {}
+    bruto = gerar_anuncios(n, semente)
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = os.path.join(diretorio, "anuncios.csv")
+        bruto.to_csv(caminho, index=False)
+        df, etapas["carregar_dados"] = medir(carregar_dados, caminho)
+
+    tratado, etapas["tratar_valores_ausentes"] = medir(tratar_valores_ausentes, df)
+    _, etapas["criar_novas_features"] = medir(criar_novas_features, tratado)
+    _, etapas["codificar_variaveis_categoricas"] = medir(codificar_variaveis_categoricas, criar_novas_features(tratado))
+
+    # Mesmo preparo do pipeline (remoção de outliers, esquema e alvo), fora das medições
+    processado = transformar_variavel_alvo(aplicar_esquema(remover_outliers(tratado, "price"), ESQUEMA_PROCESSADO))
+    (X, pipeline), etapas["ajustar_pipeline_features"] = medir(ajustar_pipeline_features, processado)
+
+    especificacao = obter_backend(backend)
+    modelo = especificacao.criar_estimador(X, pipeline["categorias"]).set_params(**PARAMETROS_TREINO.get(backend, {}))
+    _, etapas["treino"] = medir(modelo.fit, X, processado["price_log"])
+    del X
+
+    registros = bruto.sample(min(n_individuais, n), random_state=semente).to_dict("records")
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = os.path.join(diretorio, f"{backend}.modelo")
+        # O arquivo joblib acompanha o artefato, como em `ModelBackend.salvar`, para os lotes grandes
+        original = os.path.join(diretorio, f"{backend}.pkl")
+        joblib.dump(modelo, original)
+        salvar_artefato(modelo, caminho, backend=backend, estimador_original=original)
+        modelo = carregar_artefato(caminho)
+        latencias, etapas["previsao_individual"] = medir(_prever_individualmente, registros, modelo, pipeline)
+        linhas, etapas["previsao_lote"] = medir(_prever_lote, bruto, modelo, pipeline)
+
+    etapas["previsao_individual"].update({
+        "previsoes": len(latencias),
+        "latencia_p50_ms": float(np.percentile(latencias, 50) * 1000),
+        "latencia_p99_ms": float(np.percentile(latencias, 99) * 1000),
+    })
+    etapas["previsao_lote"]["linhas_por_s"] = linhas / max(etapas["previsao_lote"]["tempo_s"], 1e-9)
+
+    for etapa, medicao in etapas.items():
+        logger.info(f"[{n} linhas] {etapa}: {medicao['tempo_s']:.3f}s, pico de {medicao['memoria_pico_mb']:.1f} MB")
+    return etapas
+
+
+def executar_benchmark(tamanhos=TAMANHOS_PADRAO, backend: str = "random_forest", semente: int = 42) -> dict:
+    """
+    Executa o benchmark para cada tamanho e retorna os resultados com a descrição do ambiente.
+    """
+    resultados = {
+        "ambiente": {
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "sklearn": sklearn.__version__,
+            "cpus": os.cpu_count(),
+        },
+        "backend": backend,
+        "semente": semente,
+        "timestamp": time.time(),
+        "tamanhos": {},
+    }
+    for n in tamanhos:
+        logger.info(f"Benchmark com {n} anúncios sintéticos...")
+        resultados["tamanhos"][str(n)] = benchmark_tamanho(n, backend, semente)
+    return resultados
+
+
+def salvar_resultados(resultados: dict, caminho: str) -> None:
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(resultados, f, indent=4)
+    logger.info(f"Resultados do benchmark salvos em: {caminho}")
+
+
+def comparar_resultados(atual: dict, baseline: dict, tolerancia: float = 0.2, tempo_minimo_s: float = 0.01,
+                        memoria_minima_mb: float = 16.0) -> list:
+    """
+    Compara os resultados com um baseline salvo e retorna as regressões: etapas, em tamanhos presentes
+    nos dois, cujo tempo ou pico de memória cresceu mais que `tolerancia` (fração) em relação ao baseline.
+    Diferenças absolutas abaixo de `tempo_minimo_s` ou `memoria_minima_mb` são tratadas como ruído.
+    """
+    regressoes = []
+    for tamanho, etapas in atual["tamanhos"].items():
+        etapas_base = baseline.get("tamanhos", {}).get(tamanho, {})
+        for etapa, medicao in etapas.items():
+            if etapa not in etapas_base:
+                continue
+            for metrica, minimo in [("tempo_s", tempo_minimo_s), ("memoria_pico_mb", memoria_minima_mb)]:
+                valor, referencia = medicao[metrica], etapas_base[etapa][metrica]
+                if valor > referencia * (1 + tolerancia) and valor - referencia > minimo:
+                    regressoes.append({"tamanho": int(tamanho), "etapa": etapa, "metrica": metrica,
+                                       "baseline": referencia, "atual": valor,
+                                       "variacao": valor / referencia - 1 if referencia > 0 else float("inf")})
+    return regressoes
+
+
+def formatar_tabela(resultados: dict) -> str:
+    linhas = []
+    for tamanho, etapas in resultados["tamanhos"].items():
+        linhas.append(f"{int(tamanho):,} linhas".replace(",", "."))
+        for etapa, medicao in etapas.items():
+            linhas.append(f"  {etapa:<34}{medicao['tempo_s']:>10.3f}s{medicao['memoria_pico_mb']:>10.1f} MB")
+    return "\n".join(linhas)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark das etapas do pipeline com anúncios sintéticos.")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=list(TAMANHOS_PADRAO),
+                        help="Números de anúncios sintéticos (padrão: 10000 100000 1000000).")
+    parser.add_argument("--backend", choices=listar_backends(), default="random_forest")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--saida", default=CAMINHO_RESULTADOS, help="Arquivo JSON com os resultados.")
+    parser.add_argument("--comparar", nargs="?", const=CAMINHO_BASELINE, default=None, metavar="BASELINE",
+                        help=f"Compara com um baseline salvo (padrão: {CAMINHO_BASELINE}) e falha se houver regressões.")
+    parser.add_argument("--tolerancia", type=float, default=0.2,
+                        help="Aumento relativo tolerado antes de acusar regressão (padrão: 0.2).")
+    parser.add_argument("--salvar-baseline", action="store_true",
+                        help=f"Também grava os resultados como o novo baseline ({CAMINHO_BASELINE}).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logger.info("=== Executando benchmark_suite.py ===")
+    resultados = executar_benchmark(args.tamanhos, args.backend, args.semente)
+    salvar_resultados(resultados, args.saida)
+    print("\n" + formatar_tabela(resultados))
+    if args.salvar_baseline:
+        salvar_resultados(resultados, CAMINHO_BASELINE)
+
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressoes = comparar_resultados(resultados, baseline, args.tolerancia)
+        for r in regressoes:
+            logger.warning(f"Regressão em {r['etapa']} ({r['tamanho']} linhas), {r['metrica']}: "
+                           f"{r['baseline']:.3f} -> {r['atual']:.3f} ({r['variacao']:+.0%})")
+        if regressoes:
+            sys.exit(1)
+        logger.info(f"Nenhuma regressão em relação a {args.comparar} (tolerância de {args.tolerancia:.0%}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.preprocessing import TargetEncoder
+
+# Configuração do logger
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SUFIXO_ALVO = "_preco_medio"
+
+
+class CategoricalEncoder:
+    """
+    Codificador das variáveis categóricas, ajustado uma única vez e guardado no pipeline de features,
+    com vocabulário congelado no ajuste:
+    - `colunas_onehot` (baixa cardinalidade): one-hot com a primeira categoria (ordem alfabética) como
+      referência, como em pd.get_dummies(drop_first=True), emitido como matriz esparsa CSR, com no máximo
+      uma entrada por linha e coluna categórica. O pipeline densifica essas dummies (os modelos treinam
+      sobre uma matriz densa em float32), então a largura das features cresce com o número de categorias;
+      por isso o one-hot fica restrito às variáveis com poucas categorias, e as de alta cardinalidade vão
+      para o target encoding;
+    - `colunas_alvo` (alta cardinalidade, como os ~200 bairros): target encoding com suavização
+      (TargetEncoder do scikit-learn), uma coluna numérica por variável. No ajuste, cada linha recebe
+      a média calculada nos outros `n_folds` - 1 folds, para que o preço do anúncio não entre na
+      sua própria feature.
+
+    Categorias não vistas no ajuste (e valores ausentes) são tratadas sempre da mesma forma: no one-hot,
+    todas as dummies ficam em zero, como a categoria de referência; no target encoding, recebem a média
+    global do alvo.
+    """
+
+    def __init__(self, colunas_onehot=(), colunas_alvo=(), n_folds: int = 5, semente: int = 42):
+        self.colunas_onehot = list(colunas_onehot)
+        self.colunas_alvo = list(colunas_alvo)
+        self.n_folds = n_folds
+        self.semente = semente
+
+    @classmethod
+    def de_vocabulario(cls, categorias: dict) -> "CategoricalEncoder":
+        """
+        Cria o codificador one-hot a partir de vocabulários já conhecidos (pipelines salvos antes do codificador).
+        """
+        codificador = cls(colunas_onehot=list(categorias))
+        codificador._congelar(categorias, {})
+        return codificador
+
+    def _congelar(self, categorias: dict, alvo: dict) -> None:
+        self.categorias = {coluna: list(valores) for coluna, valores in categorias.items()}
+        self.alvo_ = alvo
+        # Posição de cada dummy na matriz one-hot; a categoria de referência não tem coluna
+        self._offsets = np.cumsum([0] + [len(valores) - 1 for valores in self.categorias.values()])
+        self._posicoes = {coluna: {categoria: self._offsets[j] + i - 1 for i, categoria in enumerate(valores) if i > 0}
+                          for j, (coluna, valores) in enumerate(self.categorias.items())}
+        self._valores_alvo = {coluna: dict(zip(codificador.categories_[0].tolist(), codificador.encodings_[0].tolist()))
+                              for coluna, codificador in alvo.items()}
+
+    def ajustar(self, df: pd.DataFrame, y=None):
+        """
+        Congela os vocabulários e ajusta o target encoding (quando há `colunas_alvo` e o alvo `y`).
+        Retorna o target encoding fora do fold das linhas de `df`, com formato (n, len(colunas_alvo)), ou None.
+        """
+        categorias = {coluna: sorted(df[coluna].dropna().unique().tolist()) for coluna in self.colunas_onehot}
+        alvo, fora_do_fold = {}, None
+        colunas_alvo = [coluna for coluna in self.colunas_alvo if coluna in df.columns]
+        if colunas_alvo and y is not None:
+            y = np.asarray(y, dtype=np.float64)
+            fora_do_fold = np.empty((len(df), len(colunas_alvo)))
+            for j, coluna in enumerate(colunas_alvo):
+                alvo[coluna] = TargetEncoder(target_type="continuous", cv=self.n_folds, shuffle=True,
+                                             random_state=self.semente)
+                fora_do_fold[:, j] = alvo[coluna].fit_transform(self._valores(df, coluna), y)[:, 0]
+            logger.info(f"Target encoding ajustado para {colunas_alvo} "
+                        f"({', '.join(str(len(c.categories_[0])) for c in alvo.values())} categorias).")
+        self.colunas_alvo = colunas_alvo if y is not None else []
+        self._congelar(categorias, alvo)
+        return fora_do_fold
+
+    @staticmethod
+    def _valores(df: pd.DataFrame, coluna: str) -> np.ndarray:
+        valores = df[coluna] if coluna in df.columns else pd.Series(np.nan, index=df.index)
+        return valores.astype(object).to_numpy().reshape(-1, 1)
+
+    def nomes_dummies(self) -> list:
+        return [f"{coluna}_{categoria}" for coluna, valores in self.categorias.items() for categoria in valores[1:]]
+
+    def nomes_alvo(self) -> list:
+        return [f"{coluna}{SUFIXO_ALVO}" for coluna in self.colunas_alvo]
+
+    def transformar_onehot(self, df: pd.DataFrame) -> sparse.csr_matrix:
+        """
+        Retorna as dummies de `df` como matriz esparsa CSR (float32) de formato (n, len(nomes_dummies())).
+        """
+        linhas, colunas = [], []
+        for j, (coluna, valores) in enumerate(self.categorias.items()):
+            serie = df[coluna] if coluna in df.columns else pd.Series(np.nan, index=df.index)
+            codigos = pd.Categorical(serie, categories=valores).codes
+            # Código -1 (não vista ou ausente) e 0 (referência) não geram entrada
+            ativas = np.flatnonzero(codigos > 0)
+            linhas.append(ativas)
+            colunas.append(self._offsets[j] + codigos[ativas] - 1)
+        linhas = np.concatenate(linhas) if linhas else np.empty(0, dtype=np.intp)
+        colunas = np.concatenate(colunas) if colunas else np.empty(0, dtype=np.intp)
+        return sparse.csr_matrix((np.ones(len(linhas), dtype=np.float32), (linhas, colunas)),
+                                 shape=(len(df), int(self._offsets[-1])))
+
+    def transformar_alvo(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Retorna o target encoding de `df` ajustado em todos os dados de treino, com formato (n, len(colunas_alvo)).
+        """
+        resultado = np.empty((len(df), len(self.colunas_alvo)))
+        for j, coluna in enumerate(self.colunas_alvo):
+            resultado[:, j] = self.alvo_[coluna].transform(self._valores(df, coluna))[:, 0]
+        return resultado
+
+    def posicao_dummy(self, coluna: str, valor):
+        """
+        Posição da dummy de `valor` na matriz one-hot (None para a referência e para categorias não vistas).
+        """
+        return self._posicoes[coluna].get(valor)
+
+    def valor_alvo(self, coluna: str, valor) -> float:
+        """
+        Target encoding de um único valor, sem DataFrames (média global do alvo para categorias não vistas).
+        """
+        return self._valores_alvo[coluna].get(valor, float(self.alvo_[coluna].target_mean_))
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+import weakref
+import warnings
+
+import numpy as np
+import pandas as pd
+
+QUANTIS = (0.25, 0.5, 0.75)
+
+_cache = {}
+
+
+def eh_numerica(dtype) -> bool:
+    """
+    Indica se o tipo é numérico (qualquer largura de inteiro ou float), excluindo booleanos.
+    """
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+def _estatisticas_numericas(df: pd.DataFrame, colunas: list) -> dict:
+    M = df[colunas].to_numpy(dtype=float, na_value=np.nan)
+    validos = ~np.isnan(M)
+    contagem = validos.sum(axis=0)
+
+    # Uma única ordenação por coluna fornece quantis, extremos, cardinalidade e moda (NaN vão para o fim)
+    ordenado = np.sort(M, axis=0)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        media = np.nanmean(M, axis=0)
+        centrado = M - media
+        m2 = np.nanmean(centrado ** 2, axis=0)
+        m3 = np.nanmean(centrado ** 3, axis=0)
+        m4 = np.nanmean(centrado ** 4, axis=0)
+        n = contagem.astype(float)
+        desvio = np.sqrt(m2 * n / (n - 1))
+        # Assimetria e curtose amostrais ajustadas, como em pandas.Series.skew/kurt
+        g1 = m3 / m2 ** 1.5
+        g2 = m4 / m2 ** 2 - 3.0
+        assimetria = np.where(n > 2, np.sqrt(n * (n - 1)) / (n - 2) * g1, np.nan)
+        curtose = np.where(n > 3, ((n + 1) * g2 + 6) * (n - 1) / ((n - 2) * (n - 3)), np.nan)
+
+    resultado = {}
+    for j, coluna in enumerate(colunas):
+        valores = ordenado[:contagem[j], j]
+        estatisticas = {
+            "tipo": str(df[coluna].dtype),
+            "contagem": int(contagem[j]),
+            "ausentes": int(len(df) - contagem[j]),
+            "media": media[j],
+            "desvio": desvio[j],
+            "assimetria": assimetria[j],
+            "curtose": curtose[j],
+        }
+        if valores.size:
+            posicoes = np.asarray(QUANTIS) * (valores.size - 1)
+            inferior = np.floor(posicoes).astype(int)
+            superior = np.minimum(inferior + 1, valores.size - 1)
+            quantis = valores[inferior] + (posicoes - inferior) * (valores[superior] - valores[inferior])
+            inicios = np.concatenate([[0], np.flatnonzero(np.diff(valores)) + 1])
+            repeticoes = np.diff(np.concatenate([inicios, [valores.size]]))
+            mais_frequente = int(np.argmax(repeticoes))
+            estatisticas.update({
+                "minimo": valores[0],
+                "q25": quantis[0],
+                "mediana": quantis[1],
+                "q75": quantis[2],
+                "maximo": valores[-1],
+                "cardinalidade": int(inicios.size),
+                "moda": valores[inicios[mais_frequente]],
+                "frequencia_moda": int(repeticoes[mais_frequente]),
+            })
+        else:
+            estatisticas.update({"cardinalidade": 0, "moda": np.nan, "frequencia_moda": 0})
+        resultado[coluna] = estatisticas
+    return resultado
+
+
+def _estatisticas_categoricas(df: pd.DataFrame, coluna: str) -> dict:
+    contagens = df[coluna].value_counts(dropna=True, sort=False)
+    contagens = contagens[contagens > 0]
+    estatisticas = {
+        "tipo": str(df[coluna].dtype),
+        "contagem": int(contagens.sum()),
+        "ausentes": int(len(df) - contagens.sum()),
+        "cardinalidade": int(len(contagens)),
+        "moda": np.nan,
+        "frequencia_moda": 0,
+    }
+    if len(contagens):
+        maximo = contagens.max()
+        candidatos = contagens.index[contagens == maximo]
+        # Em caso de empate, o menor valor, como em pandas.Series.mode()[0]
+        try:
+            moda = min(candidatos)
+        except TypeError:
+            moda = min(candidatos, key=str)
+        estatisticas.update({"moda": moda, "frequencia_moda": int(maximo)})
+    return estatisticas
+
+
+def calcular_estatisticas(df: pd.DataFrame, colunas=None) -> pd.DataFrame:
+    """
+    Calcula, em uma única passagem por coluna, contagem, ausentes, cardinalidade, moda, média,
+    desvio padrão, extremos, quartis, assimetria e curtose. Retorna um DataFrame com uma linha por coluna.
+    """
+    colunas = list(df.columns) if colunas is None else list(colunas)
+    numericas = [coluna for coluna in colunas if eh_numerica(df[coluna].dtype)]
+    resultado = _estatisticas_numericas(df, numericas) if numericas else {}
+    for coluna in colunas:
+        if coluna not in resultado:
+            resultado[coluna] = _estatisticas_categoricas(df, coluna)
+    estatisticas = pd.DataFrame.from_dict({coluna: resultado[coluna] for coluna in colunas}, orient='index')
+    estatisticas["numerica"] = [coluna in numericas for coluna in colunas]
+    return estatisticas
+
+
+def obter_estatisticas(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Retorna as estatísticas de todas as colunas do DataFrame, calculando-as apenas na primeira chamada
+    para cada objeto. O cache considera que o DataFrame não é modificado no local depois disso.
+    """
+    chave = id(df)
+    item = _cache.get(chave)
+    if item is not None and item[0]() is df:
+        return item[1]
+    estatisticas = calcular_estatisticas(df)
+    _cache[chave] = (weakref.ref(df, lambda _, chave=chave: _cache.pop(chave, None)), estatisticas)
+    return estatisticas
+
+
+def descrever(estatisticas: pd.DataFrame, incluir_todas: bool = False) -> pd.DataFrame:
+    """
+    Monta, a partir das estatísticas já calculadas, uma tabela no mesmo formato de DataFrame.describe().
+    Com `incluir_todas`, equivale a describe(include='all').
+    """
+    if incluir_todas:
+        linhas = ["count", "unique", "top", "freq", "mean", "std", "min", "25%", "50%", "75%", "max"]
+        selecionadas = estatisticas
+    else:
+        linhas = ["count", "mean", "std", "min", "25%", "50%", "75%", "max"]
+        selecionadas = estatisticas[estatisticas["numerica"]]
+    mapa = {"count": "contagem", "unique": "cardinalidade", "top": "moda", "freq": "frequencia_moda",
+            "mean": "media", "std": "desvio", "min": "minimo", "25%": "q25", "50%": "mediana",
+            "75%": "q75", "max": "maximo"}
+    tabela = pd.DataFrame(index=linhas, columns=selecionadas.index, dtype=object)
+    for coluna, linha in selecionadas.iterrows():
+        for nome in linhas:
+            categorica_apenas = nome in ("unique", "top", "freq")
+            estatistica_numerica = nome not in ("count", "unique", "top", "freq")
+            if (linha["numerica"] and categorica_apenas) or (not linha["numerica"] and estatistica_numerica):
+                tabela.loc[nome, coluna] = np.nan
+            else:
+                tabela.loc[nome, coluna] = linha.get(mapa[nome], np.nan)
+    if not incluir_todas:
+        tabela = tabela.astype(float)
+    return tabela
@@ -1,12 +1,23 @@
 #!/usr/bin/env python
 import os
+import argparse
 import pandas as pd
 import logging
 
+from data_storage import (ESQUEMA_PROCESSADO, aplicar_esquema, salvar_parquet, carregar_tabela, ParquetChunkWriter,
+                          tipos_leitura)
+from sketches import QuantileSketch, FrequencySketch
+from column_stats import eh_numerica, calcular_estatisticas, obter_estatisticas
+from instrumentation import instrumentar
+
 # Configuração do logger
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+CAMINHO_BRUTO = os.path.join("data", "raw", "teste_indicium_precificacao.csv")
+CAMINHO_PROCESSADOS = os.path.join("data", "processed", "nyc_rental_data_processed.parquet")
+
+@instrumentar
 def carregar_dados(caminho: str) -> pd.DataFrame:
     """
     Carrega os dados a partir de um arquivo CSV.
@@ -19,20 +30,24 @@ def carregar_dados(caminho: str) -> pd.DataFrame:
         logger.error(f"Erro ao carregar o arquivo '{caminho}': {e}", exc_info=True)
         raise
 
-def tratar_valores_ausentes(df: pd.DataFrame) -> pd.DataFrame:
+@instrumentar
+def tratar_valores_ausentes(df: pd.DataFrame, estatisticas: pd.DataFrame = None) -> pd.DataFrame:
     """
     Trata os valores ausentes, preenchendo com a mediana para colunas numéricas e moda para colunas categóricas.
+    As medianas e modas vêm das estatísticas por coluna, calculadas uma única vez se não forem informadas.
     """
-    df = df.copy()
+    estatisticas = estatisticas if estatisticas is not None else obter_estatisticas(df)
+    valores_preenchimento = {}
     for coluna in df.columns:
-        if df[coluna].dtype in ['float64', 'int64']:
-            df[coluna] = df[coluna].fillna(df[coluna].median())
-        else:
-            df[coluna] = df[coluna].fillna(df[coluna].mode()[0])
+        linha = estatisticas.loc[coluna]
+        if linha["ausentes"] > 0:
+            valores_preenchimento[coluna] = linha["mediana"] if linha["numerica"] else linha["moda"]
+    df = df.fillna(valores_preenchimento)
     logger.info("Valores ausentes tratados com sucesso.")
     return df
 
-def remover_outliers(df: pd.DataFrame, coluna: str, fator: float = 1.5) -> pd.DataFrame:
+@instrumentar
+def remover_outliers(df: pd.DataFrame, coluna: str, fator: float = 1.5, estatisticas: pd.DataFrame = None) -> pd.DataFrame:
     """
     Remove outliers utilizando o método do intervalo interquartil (IQR).
 
@@ -40,9 +55,12 @@ def remover_outliers(df: pd.DataFrame, coluna: str, fator: float = 1.5) -> pd.Da
     - df: DataFrame a ser processado.
     - coluna: Coluna sobre a qual a remoção de outliers será aplicada.
     - fator: Multiplicador do IQR para definir os limites (default é 1.5).
+    - estatisticas: Estatísticas por coluna já calculadas para `df`; se omitidas, calcula apenas as da coluna.
     """
-    Q1 = df[coluna].quantile(0.25)
-    Q3 = df[coluna].quantile(0.75)
+    if estatisticas is None or coluna not in estatisticas.index:
+        estatisticas = calcular_estatisticas(df, [coluna])
+    Q1 = estatisticas.loc[coluna, "q25"]
+    Q3 = estatisticas.loc[coluna, "q75"]
     IQR = Q3 - Q1
     limite_inferior = Q1 - fator * IQR
     limite_superior = Q3 + fator * IQR
@@ -50,38 +68,174 @@ def remover_outliers(df: pd.DataFrame, coluna: str, fator: float = 1.5) -> pd.Da
     logger.info(f"Outliers removidos na coluna '{coluna}' utilizando fator {fator}.")
     return df.loc[filtro]
 
+def estimar_tamanho_bloco(caminho: str, memoria_mb: float, linhas_amostra: int = 1000, fator_copias: float = 4.0) -> int:
+    """
+    Estima quantas linhas cabem em cada bloco para respeitar o orçamento de memória, a partir do
+    tamanho médio de uma linha em uma amostra do arquivo. `fator_copias` cobre as cópias
+    intermediárias feitas durante o tratamento de cada bloco.
+    """
+    amostra = pd.read_csv(caminho, nrows=linhas_amostra)
+    bytes_por_linha = max(amostra.memory_usage(deep=True, index=False).sum() / max(len(amostra), 1), 1.0)
+    return max(1000, int(memoria_mb * 1024 ** 2 / (bytes_por_linha * fator_copias)))
+
+def calcular_estatisticas_em_blocos(caminho: str, tamanho_bloco: int, coluna_outliers: str = "price") -> dict:
+    """
+    Percorre o arquivo em blocos acumulando sketches mescláveis: quantis aproximados para as colunas
+    numéricas e contagens de frequência para as demais. Retorna os valores de preenchimento
+    (mediana ou moda) de cada coluna e os quartis da coluna de outliers após o preenchimento.
+    """
+    quantis, frequencias, ausentes = {}, {}, {}
+    linhas = 0
+    for bloco in pd.read_csv(caminho, chunksize=tamanho_bloco, dtype=tipos_leitura(ESQUEMA_PROCESSADO)):
+        linhas += len(bloco)
+        for coluna in bloco.columns:
+            ausentes[coluna] = ausentes.get(coluna, 0) + int(bloco[coluna].isna().sum())
+            # O tipo de cada coluna vem do esquema (tipos de leitura), e não do conteúdo do bloco
+            if coluna not in quantis and coluna not in frequencias:
+                if eh_numerica(bloco[coluna].dtype):
+                    quantis[coluna] = QuantileSketch()
+                else:
+                    frequencias[coluna] = FrequencySketch()
+            if coluna in quantis:
+                quantis[coluna].atualizar(bloco[coluna].to_numpy(dtype=float, na_value=float('nan')))
+            else:
+                frequencias[coluna].atualizar(bloco[coluna])
+
+    valores_preenchimento = {coluna: sketch.quantil(0.5) for coluna, sketch in quantis.items()}
+    valores_preenchimento.update({coluna: sketch.moda() for coluna, sketch in frequencias.items()})
+
+    # Quartis da coluna de outliers considerando os ausentes já preenchidos com a mediana
+    sketch = quantis[coluna_outliers]
+    extras = {valores_preenchimento[coluna_outliers]: ausentes[coluna_outliers]} if ausentes[coluna_outliers] else None
+    q1, q3 = sketch.quantil([0.25, 0.75], extras=extras)
+    aproximado = any(s.n > s.k for s in quantis.values()) or not all(s.exato for s in frequencias.values())
+    return {
+        "linhas": linhas,
+        "valores_preenchimento": valores_preenchimento,
+        "quartis": (float(q1), float(q3)),
+        "aproximado": aproximado,
+    }
+
+@instrumentar
+def processar_em_blocos(caminho_entrada: str, caminho_saida: str, memoria_mb: float = 512,
+                        coluna_outliers: str = "price", fator: float = 1.5) -> dict:
+    """
+    Pré-processa arquivos maiores que a memória disponível em duas passagens por blocos.
+
+    A primeira passagem obtém os valores de preenchimento e os limites do IQR a partir de sketches
+    mescláveis (exatos enquanto o volume de dados cabe nos sketches, aproximados acima disso).
+    A segunda aplica o preenchimento, o filtro de outliers e o esquema, gravando o resultado bloco a bloco.
+    Os dois passos leem todos os blocos com os mesmos tipos (`tipos_leitura`), então o esquema gravado não
+    depende do conteúdo do primeiro bloco.
+    """
+    tamanho_bloco = estimar_tamanho_bloco(caminho_entrada, memoria_mb)
+    logger.info(f"Processamento em blocos de {tamanho_bloco} linhas (orçamento de {memoria_mb:.0f} MB).")
+    estatisticas = calcular_estatisticas_em_blocos(caminho_entrada, tamanho_bloco, coluna_outliers)
+    q1, q3 = estatisticas["quartis"]
+    iqr = q3 - q1
+    limite_inferior, limite_superior = q1 - fator * iqr, q3 + fator * iqr
+    if estatisticas["aproximado"]:
+        logger.info("Valores de preenchimento e limites do IQR estimados por sketches aproximados.")
+
+    linhas_escritas = 0
+    amostra = None
+    escrever_parquet = caminho_saida.endswith(".parquet")
+    if not escrever_parquet:
+        os.makedirs(os.path.dirname(caminho_saida), exist_ok=True)
+    with ParquetChunkWriter(caminho_saida) as writer:
+        for i, bloco in enumerate(pd.read_csv(caminho_entrada, chunksize=tamanho_bloco,
+                                              dtype=tipos_leitura(ESQUEMA_PROCESSADO))):
+            bloco = bloco.fillna(estatisticas["valores_preenchimento"])
+            bloco = bloco.loc[(bloco[coluna_outliers] >= limite_inferior) & (bloco[coluna_outliers] <= limite_superior)]
+            bloco = aplicar_esquema(bloco, ESQUEMA_PROCESSADO)
+            if escrever_parquet:
+                writer.escrever(bloco)
+            else:
+                bloco.to_csv(caminho_saida, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+            linhas_escritas += len(bloco)
+            amostra = bloco.head(0)
+    logger.info(f"Outliers removidos na coluna '{coluna_outliers}' utilizando fator {fator}.")
+    logger.info(f"Dados processados em blocos: {estatisticas['linhas']} linhas lidas, {linhas_escritas} gravadas em: {caminho_saida}")
+    return {**estatisticas, "linhas_escritas": linhas_escritas, "tamanho_bloco": tamanho_bloco,
+            "limites": (limite_inferior, limite_superior), "amostra": amostra}
+
 def salvar_dados(df: pd.DataFrame, caminho: str) -> None:
     """
-    Salva o DataFrame em um arquivo CSV no caminho especificado.
+    Salva o DataFrame no caminho especificado, em Parquet (tipado) ou CSV conforme a extensão.
     """
     os.makedirs(os.path.dirname(caminho), exist_ok=True)
-    df.to_csv(caminho, index=False)
+    if caminho.endswith(".parquet"):
+        salvar_parquet(df, caminho)
+    else:
+        df.to_csv(caminho, index=False)
     logger.info(f"Dados processados salvos com sucesso em: {caminho}")
 
-def gerar_relatorio(df: pd.DataFrame, caminho_report: str) -> None:
+def gerar_relatorio(df: pd.DataFrame, caminho_report: str, dimensoes: tuple = None) -> None:
     """
     Gera um relatório TXT contendo o resumo do pré-processamento.
+    No modo em blocos, `df` é o último bloco e `dimensoes` informa o tamanho total do dataset.
     """
     with open(caminho_report, 'w', encoding='utf-8') as f:
         f.write("RELATÓRIO DE PRÉ-PROCESSAMENTO\n")
         f.write("-------------------------------\n")
-        f.write(f"Dimensões do dataset: {df.shape}\n")
+        f.write(f"Dimensões do dataset: {dimensoes or df.shape}\n")
         f.write("Colunas e tipos:\n")
         f.write(df.dtypes.to_string())
     logger.info(f"Relatório de pré-processamento gerado em: {caminho_report}")
 
-def main():
-    logger.info("=== Executando data_processing.py ===")
-    caminho_entrada = os.path.join("data", "raw", "teste_indicium_precificacao.csv")
-    caminho_saida = os.path.join("data", "processed", "nyc_rental_data_processed.csv")
-    df = carregar_dados(caminho_entrada)
-    df = tratar_valores_ausentes(df)
-    df = remover_outliers(df, "price", fator=1.5)
-    salvar_dados(df, caminho_saida)
+@instrumentar
+def executar(df: pd.DataFrame, salvar: bool = True) -> pd.DataFrame:
+    """
+    Executa a etapa de pré-processamento sobre um DataFrame já carregado e retorna o resultado.
+    O dataset processado só é gravado em disco quando `salvar` é verdadeiro; o relatório é sempre gerado.
+    """
+    estatisticas = obter_estatisticas(df)
+    df = tratar_valores_ausentes(df, estatisticas)
+    # Os quartis de 'price' só mudam após o preenchimento se houver preços ausentes
+    estatisticas_price = estatisticas if estatisticas.loc["price", "ausentes"] == 0 else None
+    df = remover_outliers(df, "price", fator=1.5, estatisticas=estatisticas_price)
+    df = aplicar_esquema(df, ESQUEMA_PROCESSADO)
+    if salvar:
+        salvar_dados(df, CAMINHO_PROCESSADOS)
     
     report_dir = os.path.join("reports", "data_processing")
     os.makedirs(report_dir, exist_ok=True)
     gerar_relatorio(df, os.path.join(report_dir, "data_processing_report.txt"))
+    return df
+
+def carregar_ou_processar(caminho_processados: str = CAMINHO_PROCESSADOS, caminho_bruto: str = CAMINHO_BRUTO) -> pd.DataFrame:
+    """
+    Carrega o dataset processado, entrada das etapas seguintes quando executadas como scripts. Se ele não
+    existir (por padrão, a execução em processo do main.py não grava os datasets intermediários), refaz o
+    pré-processamento a partir dos dados brutos e o grava.
+    """
+    if os.path.exists(caminho_processados):
+        return carregar_tabela(caminho_processados)
+    logger.warning(f"{caminho_processados} não encontrado; refazendo o pré-processamento a partir de {caminho_bruto}.")
+    return executar(carregar_dados(caminho_bruto), salvar=True)
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Pré-processamento dos dados de aluguel.")
+    parser.add_argument("--blocos", action="store_true",
+                        help="Processa o arquivo em blocos, para datasets maiores que a memória.")
+    parser.add_argument("--memoria-mb", type=float, default=512,
+                        help="Orçamento de memória por bloco no modo em blocos, em MB.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    logger.info("=== Executando data_processing.py ===")
+    caminho_entrada = CAMINHO_BRUTO
+    if args.blocos:
+        resultado = processar_em_blocos(caminho_entrada, CAMINHO_PROCESSADOS, memoria_mb=args.memoria_mb)
+        report_dir = os.path.join("reports", "data_processing")
+        os.makedirs(report_dir, exist_ok=True)
+        amostra = resultado["amostra"]
+        gerar_relatorio(amostra, os.path.join(report_dir, "data_processing_report.txt"),
+                        dimensoes=(resultado["linhas_escritas"], amostra.shape[1]))
+    else:
+        df = carregar_dados(caminho_entrada)
+        executar(df)
     
     logger.info("Processamento de dados concluído com sucesso.\nMódulo data_processing executado com sucesso.")
 
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+import os
+import json
+import shutil
+import logging
+import tempfile
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+# Configuração do logger
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Esquema explícito do dataset processado: categorias para as variáveis categóricas, inteiros de 32 bits
+# para contagens e float32 onde a precisão permite. Latitude e longitude seguem em float64 para não
+# alterar as distâncias calculadas na engenharia de atributos.
+ESQUEMA_PROCESSADO = {
+    'id': 'int64',
+    'host_id': 'int64',
+    'bairro_group': 'category',
+    'bairro': 'category',
+    'room_type': 'category',
+    'latitude': 'float64',
+    'longitude': 'float64',
+    'price': 'int32',
+    'minimo_noites': 'int32',
+    'numero_de_reviews': 'int32',
+    'reviews_por_mes': 'float32',
+    'calculado_host_listings_count': 'int32',
+    'disponibilidade_365': 'int32',
+}
+
+
+def tipos_leitura(esquema: dict) -> dict:
+    """
+    Tipos para ler um CSV em blocos sem depender do conteúdo de cada bloco: colunas numéricas do esquema em
+    float64 (o tipo que o pandas daria a uma coluna inteira com ausentes, convertido pelo esquema após o
+    preenchimento), categorias e colunas fora do esquema como texto. Assim, um bloco em que uma coluna está
+    toda ausente, ou só tem inteiros, recebe os mesmos tipos dos demais.
+    """
+    tipos = defaultdict(lambda: 'str')
+    for coluna, tipo in esquema.items():
+        if tipo != 'category':
+            tipos[coluna] = 'float64'
+    return tipos
+
+
+def aplicar_esquema(df: pd.DataFrame, esquema: dict) -> pd.DataFrame:
+    """
+    Converte as colunas presentes no DataFrame para os tipos definidos no esquema.
+    """
+    tipos = {coluna: tipo for coluna, tipo in esquema.items() if coluna in df.columns}
+    return df.astype(tipos)
+
+
+def aplicar_esquema_features(df: pd.DataFrame, target_column: str = 'price_log') -> pd.DataFrame:
+    """
+    Converte o dataset final para o esquema de armazenamento: features numéricas em float32
+    (a precisão utilizada internamente pelas árvores do scikit-learn), dummies booleanas e alvo em float64.
+    """
+    tipos = {}
+    for coluna, tipo in df.dtypes.items():
+        if coluna == target_column:
+            tipos[coluna] = 'float64'
+        elif pd.api.types.is_bool_dtype(tipo):
+            tipos[coluna] = 'bool'
+        elif pd.api.types.is_numeric_dtype(tipo):
+            tipos[coluna] = 'float32'
+    return df.astype(tipos)
+
+
+def salvar_parquet(df: pd.DataFrame, caminho: str) -> None:
+    """
+    Salva o DataFrame em Parquet, preservando os tipos das colunas.
+    """
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    df.to_parquet(caminho, index=False)
+
+
+def carregar_tabela(caminho: str) -> pd.DataFrame:
+    """
+    Carrega uma tabela em Parquet ou CSV, conforme a extensão do arquivo.
+    """
+    if caminho.endswith(".parquet"):
+        return pd.read_parquet(caminho)
+    return pd.read_csv(caminho)
+
+
+def _caminhos_matriz(caminho_base: str) -> dict:
+    return {
+        "X": f"{caminho_base}_X.npy",
+        "y": f"{caminho_base}_y.npy",
+        "colunas": f"{caminho_base}_colunas.json",
+    }
+
+
+def salvar_matriz_features(df: pd.DataFrame, caminho_base: str, target_column: str = 'price_log') -> None:
+    """
+    Salva o dataset final como uma matriz NumPy contígua em float32 (features), um vetor float64 (alvo)
+    e a lista de colunas, para ser carregado por mapeamento de memória sem cópias.
+    """
+    caminhos = _caminhos_matriz(caminho_base)
+    os.makedirs(os.path.dirname(caminho_base), exist_ok=True)
+    X = df.drop(columns=[target_column])
+    np.save(caminhos["X"], np.ascontiguousarray(X.to_numpy(dtype=np.float32)))
+    np.save(caminhos["y"], df[target_column].to_numpy(dtype=np.float64))
+    with open(caminhos["colunas"], 'w', encoding='utf-8') as f:
+        json.dump({"colunas": list(X.columns), "target": target_column}, f, indent=4)
+    logger.info(f"Matriz de features salva com sucesso em: {caminhos['X']}")
+
+
+def carregar_matriz_features(caminho_base: str) -> (pd.DataFrame, pd.Series):
+    """
+    Carrega a matriz de features por mapeamento de memória. O DataFrame retornado é uma visão
+    sobre o arquivo (somente leitura), sem cópia dos dados.
+    """
+    caminhos = _caminhos_matriz(caminho_base)
+    with open(caminhos["colunas"], 'r', encoding='utf-8') as f:
+        metadados = json.load(f)
+    X = np.load(caminhos["X"], mmap_mode='r')
+    y = np.load(caminhos["y"], mmap_mode='r')
+    logger.info(f"Matriz de features mapeada em memória de: {caminhos['X']} ({X.shape[0]} linhas, {X.shape[1]} colunas)")
+    return (pd.DataFrame(X, columns=metadados["colunas"], copy=False),
+            pd.Series(y, name=metadados["target"], copy=False))
+
+
+def diretorio_memoria_compartilhada() -> str:
+    """
+    Diretório para matrizes compartilhadas entre processos: /dev/shm (em memória) quando disponível,
+    senão o diretório temporário do sistema.
+    """
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+@contextmanager
+def matriz_compartilhada(X: pd.DataFrame, y=None, diretorio: str = None):
+    """
+    Escreve as features (e o alvo, se informado) uma única vez como arrays contíguos, float32 e float64,
+    em arquivos .npy na memória compartilhada, e os entrega mapeados em memória, somente leitura.
+    O joblib passa arrays mapeados aos workers pelo nome do arquivo, então todos os processos leem as
+    mesmas páginas sem copiar a matriz. A matriz é preenchida coluna a coluna, sem uma cópia intermediária
+    em float64, e os arquivos são removidos ao sair do contexto.
+    """
+    pasta = tempfile.mkdtemp(prefix="matriz_", dir=diretorio or diretorio_memoria_compartilhada())
+    try:
+        caminho_X = os.path.join(pasta, "X.npy")
+        M = np.lib.format.open_memmap(caminho_X, mode='w+', dtype=np.float32, shape=X.shape)
+        for j, coluna in enumerate(X.columns):
+            M[:, j] = X[coluna].to_numpy(dtype=np.float32)
+        M.flush()
+        del M
+        X_compartilhada = np.load(caminho_X, mmap_mode='r')
+        y_compartilhado = None
+        if y is not None:
+            caminho_y = os.path.join(pasta, "y.npy")
+            np.save(caminho_y, np.asarray(y, dtype=np.float64))
+            y_compartilhado = np.load(caminho_y, mmap_mode='r')
+        logger.info(f"Matriz compartilhada criada em {pasta} ({X.shape[0]} linhas, {X.shape[1]} colunas, "
+                    f"{X_compartilhada.nbytes / 2**20:.1f} MB)")
+        yield X_compartilhada, y_compartilhado
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+def _tipo_arrow(tipo):
+    import pyarrow as pa
+
+    if isinstance(tipo, pd.CategoricalDtype):
+        return pa.dictionary(pa.int32(), pa.string())
+    if tipo == object or pd.api.types.is_string_dtype(tipo):
+        return pa.string()
+    return pa.from_numpy_dtype(tipo)
+
+
+class ParquetChunkWriter:
+    """
+    Escreve um arquivo Parquet bloco a bloco, com o esquema fixado pelos tipos pandas do primeiro bloco
+    (e não pelos valores: uma coluna de texto toda ausente continua texto), que os demais blocos devem repetir.
+    Colunas categóricas são gravadas como dicionários com índices int32, para que blocos com
+    quantidades diferentes de categorias compartilhem o mesmo esquema.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._writer = None
+        self._schema = None
+
+    def escrever(self, df: pd.DataFrame) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([pa.field(coluna, _tipo_arrow(tipo)) for coluna, tipo in df.dtypes.items()])
+        if self._writer is None:
+            self._schema = schema
+            os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+            self._writer = pq.ParquetWriter(self.caminho, self._schema)
+        elif not schema.equals(self._schema):
+            raise ValueError(f"Bloco com esquema diferente do primeiro bloco: {schema} (esperado {self._schema})")
+        self._writer.write_table(pa.Table.from_pandas(df, schema=self._schema, preserve_index=False))
+
+    def fechar(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 import os
+import argparse
 import warnings
 from io import StringIO
 
@@ -8,6 +9,9 @@ import numpy as np
 import pandas as pd
 import seaborn as sns
 
+from column_stats import calcular_estatisticas, obter_estatisticas, descrever
+from report_figures import LIMITE_PONTOS, ESTILO_PADRAO, finalizar_figura, renderizar_figuras
+
 
 def load_data(filepath: str) -> pd.DataFrame:
     try:
@@ -18,18 +22,20 @@ def load_data(filepath: str) -> pd.DataFrame:
         raise
 
 
-def resumo_dados(df: pd.DataFrame) -> None:
+def resumo_dados(df: pd.DataFrame, estatisticas: pd.DataFrame = None) -> None:
+    estatisticas = estatisticas if estatisticas is not None else obter_estatisticas(df)
     print("=== Resumo dos Dados ===")
     print("\nInformações Gerais:")
     print(df.info())
     print("\nPrimeiras Linhas do Dataset:")
     print(df.head())
     print("\nResumo Estatístico (incluindo variáveis categóricas):")
-    print(df.describe(include='all'))
+    print(descrever(estatisticas, incluir_todas=True))
 
 
-def analise_valores_ausentes(df: pd.DataFrame) -> pd.DataFrame:
-    missing = df.isnull().sum().reset_index()
+def analise_valores_ausentes(df: pd.DataFrame, estatisticas: pd.DataFrame = None) -> pd.DataFrame:
+    estatisticas = estatisticas if estatisticas is not None else obter_estatisticas(df)
+    missing = estatisticas["ausentes"].reindex(df.columns).reset_index()
     missing.columns = ['Coluna', 'Valores Ausentes']
     print("\n=== Valores Ausentes por Coluna ===")
     print(missing)
@@ -43,9 +49,7 @@ def plot_histograma(df: pd.DataFrame, coluna: str, bins: int = 30, save_path: st
     plt.xlabel(coluna, fontsize=12)
     plt.ylabel("Frequência", fontsize=12)
     plt.tight_layout()
-    if save_path:
-        plt.savefig(save_path)
-    plt.show()
+    finalizar_figura(save_path)
 
 
 def plot_boxplot(df: pd.DataFrame, coluna: str, save_path: str = None) -> None:
@@ -54,9 +58,7 @@ def plot_boxplot(df: pd.DataFrame, coluna: str, save_path: str = None) -> None:
     plt.title(f"Boxplot de '{coluna}'", fontsize=14)
     plt.xlabel(coluna, fontsize=12)
     plt.tight_layout()
-    if save_path:
-        plt.savefig(save_path)
-    plt.show()
+    finalizar_figura(save_path)
 
 
 def plot_barplot_room_type(df: pd.DataFrame, save_path: str = None) -> None:
@@ -67,23 +69,27 @@ def plot_barplot_room_type(df: pd.DataFrame, save_path: str = None) -> None:
     plt.xlabel("Tipo de Quarto", fontsize=12)
     plt.ylabel("Contagem", fontsize=12)
     plt.tight_layout()
-    if save_path:
-        plt.savefig(save_path)
-    plt.show()
+    finalizar_figura(save_path)
 
 
-def plot_geographical(df: pd.DataFrame, save_path: str = None) -> None:
+def plot_geographical(df: pd.DataFrame, save_path: str = None, limite: int = LIMITE_PONTOS) -> None:
     plt.figure(figsize=(10, 8))
-    sns.scatterplot(x='longitude', y='latitude', hue='bairro_group',
-                    data=df, palette='viridis', alpha=0.6, edgecolor=None)
+    if len(df) > limite:
+        # Muitos imóveis: densidade em hexágonos, com o nome de cada bairro_group na sua posição mediana
+        plt.hexbin(df['longitude'], df['latitude'], gridsize=120, bins='log', mincnt=1, cmap='viridis')
+        plt.colorbar(label="Imóveis")
+        for grupo, posicao in df.groupby('bairro_group')[['longitude', 'latitude']].median().iterrows():
+            plt.annotate(grupo, (posicao['longitude'], posicao['latitude']), ha='center', fontsize=10,
+                         fontweight='bold', bbox=dict(boxstyle='round', facecolor='white', alpha=0.7))
+    else:
+        sns.scatterplot(x='longitude', y='latitude', hue='bairro_group',
+                        data=df, palette='viridis', alpha=0.6, edgecolor=None)
+        plt.legend(title="Bairro Group", loc='best', fontsize=9)
     plt.title("Distribuição Geográfica dos Imóveis", fontsize=14)
     plt.xlabel("Longitude", fontsize=12)
     plt.ylabel("Latitude", fontsize=12)
-    plt.legend(title="Bairro Group", loc='best', fontsize=9)
     plt.tight_layout()
-    if save_path:
-        plt.savefig(save_path)
-    plt.show()
+    finalizar_figura(save_path)
 
 
 def plot_correlacao(df: pd.DataFrame, save_path: str = None) -> None:
@@ -93,16 +99,16 @@ def plot_correlacao(df: pd.DataFrame, save_path: str = None) -> None:
     sns.heatmap(correlacao, annot=True, fmt=".2f", cmap="coolwarm", square=True)
     plt.title("Matriz de Correlação das Variáveis Numéricas", fontsize=14)
     plt.tight_layout()
-    if save_path:
-        plt.savefig(save_path)
-    plt.show()
+    finalizar_figura(save_path)
 
 
-def gerar_relatorio_txt(df: pd.DataFrame, missing: pd.DataFrame, caminho_report: str) -> None:
+def gerar_relatorio_txt(df: pd.DataFrame, missing: pd.DataFrame, caminho_report: str,
+                        estatisticas: pd.DataFrame = None) -> None:
+    estatisticas = estatisticas if estatisticas is not None else obter_estatisticas(df)
     buffer = StringIO()
     df.info(buf=buffer)
     info_str = buffer.getvalue()
-    desc = df.describe(include='all').to_string()
+    desc = descrever(estatisticas, incluir_todas=True).to_string()
     missing_str = missing.to_string(index=False)
     texto_relatorio = (
         "RELATÓRIO DE ANÁLISE EXPLORATÓRIA DE DADOS (EDA)\n"
@@ -125,34 +131,69 @@ def gerar_relatorio_txt(df: pd.DataFrame, missing: pd.DataFrame, caminho_report:
     print(f"\nRelatório EDA gerado com sucesso: {caminho_report}")
 
 
-def main():
+def tarefas_figuras(df: pd.DataFrame) -> list:
+    """
+    Lista as figuras da EDA como tarefas independentes (funcao, args, kwargs, arquivo), cada uma
+    recebendo apenas as colunas que usa.
+    """
+    precos = df[["price"]].assign(price_log=np.log1p(df["price"]))
+    return [
+        (plot_histograma, (precos[["price"]], "price"), {"bins": 50}, "eda_distribuicao_price.png"),
+        (plot_boxplot, (precos[["price"]], "price"), {}, "eda_boxplot_price.png"),
+        (plot_histograma, (df[["minimo_noites"]], "minimo_noites"), {"bins": 50}, "eda_distribuicao_minimo_noites.png"),
+        (plot_boxplot, (df[["minimo_noites"]], "minimo_noites"), {}, "eda_boxplot_minimo_noites.png"),
+        (plot_barplot_room_type, (df[["room_type"]],), {}, "eda_barras_room_type.png"),
+        (plot_geographical, (df[["longitude", "latitude", "bairro_group"]],), {}, "eda_distribuicao_geografica.png"),
+        (plot_correlacao, (df.select_dtypes(include=[np.number]),), {}, "eda_matriz_correlacao.png"),
+        # Análise da transformação do target
+        (plot_histograma, (precos[["price_log"]], "price_log"), {"bins": 50}, "eda_distribuicao_price_log.png"),
+        (plot_boxplot, (precos[["price_log"]], "price_log"), {}, "eda_boxplot_price_log.png"),
+    ]
+
+
+def executar(df: pd.DataFrame, exibir: bool = False, processos: int = None) -> None:
+    """
+    Executa a EDA. Por padrão as figuras são geradas no modo headless, em paralelo, e as que não mudaram
+    desde a última execução são reaproveitadas; com `exibir`, são desenhadas uma a uma e exibidas na tela.
+    """
     warnings.filterwarnings("ignore")
-    caminho_arquivo = os.path.join("data", "raw", "teste_indicium_precificacao.csv")
-    df = load_data(caminho_arquivo)
-    resumo_dados(df)
-    missing = analise_valores_ausentes(df)
+    # Estatísticas de todas as colunas calculadas uma única vez e reaproveitadas no resumo e no relatório
+    estatisticas = obter_estatisticas(df)
+    resumo_dados(df, estatisticas)
+    missing = analise_valores_ausentes(df, estatisticas)
     caminho_figures = os.path.join("reports", "eda", "figures")
     caminho_relatorios = os.path.join("reports", "eda", "relatorios")
     os.makedirs(caminho_figures, exist_ok=True)
     os.makedirs(caminho_relatorios, exist_ok=True)
-    sns.set(style="whitegrid", context="notebook")
-    
-    # Gráficos de variáveis numéricas
-    plot_histograma(df, "price", bins=50, save_path=os.path.join(caminho_figures, "eda_distribuicao_price.png"))
-    plot_boxplot(df, "price", save_path=os.path.join(caminho_figures, "eda_boxplot_price.png"))
-    plot_histograma(df, "minimo_noites", bins=50, save_path=os.path.join(caminho_figures, "eda_distribuicao_minimo_noites.png"))
-    plot_boxplot(df, "minimo_noites", save_path=os.path.join(caminho_figures, "eda_boxplot_minimo_noites.png"))
-    plot_barplot_room_type(df, save_path=os.path.join(caminho_figures, "eda_barras_room_type.png"))
-    plot_geographical(df, save_path=os.path.join(caminho_figures, "eda_distribuicao_geografica.png"))
-    plot_correlacao(df, save_path=os.path.join(caminho_figures, "eda_matriz_correlacao.png"))
-    
-    # Análise da transformação do target
-    df["price_log"] = np.log1p(df["price"])
-    plot_histograma(df, "price_log", bins=50, save_path=os.path.join(caminho_figures, "eda_distribuicao_price_log.png"))
-    plot_boxplot(df, "price_log", save_path=os.path.join(caminho_figures, "eda_boxplot_price_log.png"))
-    
+
+    tarefas = tarefas_figuras(df)
+    if exibir:
+        sns.set(**ESTILO_PADRAO)
+        for funcao, args, kwargs, nome in tarefas:
+            funcao(*args, save_path=os.path.join(caminho_figures, nome), **kwargs)
+    else:
+        renderizar_figuras(tarefas, caminho_figures, processos=processos)
+
+    df = df.assign(price_log=np.log1p(df["price"]))
     caminho_relatorio = os.path.join(caminho_relatorios, "eda_relatorio.txt")
-    gerar_relatorio_txt(df, missing, caminho_relatorio)
+    estatisticas = pd.concat([estatisticas, calcular_estatisticas(df, ["price_log"])])
+    gerar_relatorio_txt(df, missing, caminho_relatorio, estatisticas)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Análise exploratória dos dados de aluguel.")
+    parser.add_argument("--exibir", action="store_true",
+                        help="Exibe as figuras na tela, uma a uma, em vez de gerá-las em paralelo no modo headless.")
+    parser.add_argument("--processos", type=int, default=None,
+                        help="Número de processos para gerar as figuras (padrão: número de CPUs).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    caminho_arquivo = os.path.join("data", "raw", "teste_indicium_precificacao.csv")
+    df = load_data(caminho_arquivo)
+    executar(df, exibir=args.exibir, processos=args.processos)
     print("\nAnálise Exploratória (EDA) concluída com sucesso!")
 
 
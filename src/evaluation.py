@@ -1,27 +1,37 @@
 #!/usr/bin/env python
 import os
+import time
+import argparse
 import warnings
-import joblib
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 import json
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-from sklearn.model_selection import train_test_split
 import logging
 from scipy.stats import normaltest
 
+from data_storage import carregar_tabela
+from feature_engineering import separar_treino_teste, carregar_ou_gerar_features
+from model_backends import caminho_modelo_ativo, obter_backend, obter_modelo_ativo, versao_modelo_ativo
+from model_artifact import carregar_modelo_salvo, registrar_limite_percurso, FlorestaCompacta
+from report_figures import dispersao, finalizar_figura, renderizar_figuras
+from instrumentation import instrumentar
+
 # Configuração do logger
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+TAMANHOS_BENCHMARK = (1, 100, 1_000, 10_000, 100_000)
+CAMINHO_TESTE = os.path.join("reports", "model_training", "previsoes_teste.parquet")
+N_REAMOSTRAS = 2000
+
 def load_model(model_path: str):
     """
-    Carrega o modelo treinado a partir do caminho especificado.
+    Carrega o modelo treinado a partir do caminho especificado (artefato compacto ou arquivo joblib).
     """
     try:
-        model = joblib.load(model_path)
+        model = carregar_modelo_salvo(model_path)
         logger.info(f"Modelo carregado com sucesso de: {model_path}")
         return model
     except Exception as e:
@@ -30,10 +40,10 @@ def load_model(model_path: str):
 
 def load_data(filepath: str) -> pd.DataFrame:
     """
-    Carrega os dados a partir de um arquivo CSV.
+    Carrega os dados a partir de um arquivo Parquet ou CSV.
     """
     try:
-        df = pd.read_csv(filepath)
+        df = carregar_tabela(filepath)
         logger.info(f"Dados carregados com sucesso de: {filepath}")
         return df
     except Exception as e:
@@ -56,62 +66,145 @@ def load_best_params(path: str) -> dict:
                 "min_samples_split": "Desconhecido",
                 "min_samples_leaf": "Desconhecido"}
 
-def generate_plots(y_true, y_pred, report_figures_dir: str):
+def calcular_metricas(y_true, y_pred) -> dict:
     """
-    Gera gráficos de avaliação dos resíduos e salva os mesmos no diretório especificado.
+    Calcula MAE, RMSE e R² com operações vetorizadas do NumPy.
     """
-    os.makedirs(report_figures_dir, exist_ok=True)
-    residuals = y_true - y_pred
-    
-    # Teste de normalidade dos resíduos
-    stat, p_value = normaltest(residuals)
-    if p_value < 0.05:
-        logger.info("Os resíduos não seguem uma distribuição normal (p-valor < 0.05).")
-    else:
-        logger.info("Os resíduos parecem seguir uma distribuição normal (p-valor >= 0.05).")
-    
+    y_true = np.asarray(y_true, dtype=np.float64)
+    erro = np.asarray(y_pred, dtype=np.float64) - y_true
+    sst = np.sum((y_true - y_true.mean()) ** 2)
+    return {
+        "MAE": float(np.abs(erro).mean()),
+        "RMSE": float(np.sqrt(np.mean(erro ** 2))),
+        "R2": float(1 - np.sum(erro ** 2) / sst) if sst > 0 else float("nan"),
+    }
+
+def intervalos_bootstrap(y_true, y_pred, n_reamostras: int = N_REAMOSTRAS, confianca: float = 0.95,
+                         semente: int = 42, max_elementos: int = 1 << 22) -> dict:
+    """
+    Intervalos de confiança bootstrap (percentil) para MAE, RMSE e R².
+
+    As reamostras são geradas como uma matriz de índices (reamostras x linhas) e as métricas de todas
+    elas são calculadas de uma vez a partir de somas por linha da matriz; as reamostras são processadas
+    em blocos de no máximo `max_elementos` elementos para limitar a memória.
+    """
+    y_true = np.asarray(y_true, dtype=np.float64)
+    erro = np.asarray(y_pred, dtype=np.float64) - y_true
+    n = len(y_true)
+    rng = np.random.default_rng(semente)
+    metricas = {"MAE": np.empty(n_reamostras), "RMSE": np.empty(n_reamostras), "R2": np.empty(n_reamostras)}
+    bloco = max(1, max_elementos // max(n, 1))
+    for inicio in range(0, n_reamostras, bloco):
+        fim = min(inicio + bloco, n_reamostras)
+        indices = rng.integers(0, n, size=(fim - inicio, n))
+        e, y = erro[indices], y_true[indices]
+        sse = np.einsum('ij,ij->i', e, e)
+        sst = np.einsum('ij,ij->i', y, y) - y.sum(axis=1) ** 2 / n
+        metricas["MAE"][inicio:fim] = np.abs(e).mean(axis=1)
+        metricas["RMSE"][inicio:fim] = np.sqrt(sse / n)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            metricas["R2"][inicio:fim] = 1 - sse / sst
+    alfa = (1 - confianca) / 2 * 100
+    return {nome: tuple(float(v) for v in np.nanpercentile(valores, [alfa, 100 - alfa]))
+            for nome, valores in metricas.items()}
+
+def metricas_por_fatia(y_true, y_pred, fatias: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calcula n, MAE, RMSE e R² para cada valor de cada coluna de `fatias` (ex.: bairro_group e room_type).
+    Todas as fatias de todas as colunas são agregadas em uma única passagem: cada linha recebe um código
+    de grupo por coluna, e as somas por grupo saem de um np.bincount sobre os códigos concatenados.
+    """
+    y_true = np.asarray(y_true, dtype=np.float64)
+    erro = np.asarray(y_pred, dtype=np.float64) - y_true
+    codigos, rotulos, deslocamento = [], [], 0
+    for coluna in fatias.columns:
+        codigos_coluna, valores = pd.factorize(fatias[coluna], sort=True)
+        codigos.append(np.where(codigos_coluna >= 0, codigos_coluna + deslocamento, -1))
+        rotulos.extend((coluna, valor) for valor in valores)
+        deslocamento += len(valores)
+    codigos = np.concatenate(codigos)
+    validos = codigos >= 0
+    codigos = codigos[validos]
+
+    def somar(pesos):
+        return np.bincount(codigos, np.tile(pesos, len(fatias.columns))[validos], minlength=deslocamento)
+
+    n = np.bincount(codigos, minlength=deslocamento)
+    sse = somar(erro ** 2)
+    sst = somar(y_true ** 2) - somar(y_true) ** 2 / np.maximum(n, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        resultado = pd.DataFrame({
+            "n": n,
+            "MAE": somar(np.abs(erro)) / n,
+            "RMSE": np.sqrt(sse / n),
+            "R2": np.where(sst > 0, 1 - sse / sst, np.nan),
+        }, index=pd.MultiIndex.from_tuples(rotulos, names=["variavel", "valor"]))
+    return resultado
+
+def plot_residuos_distribuicao(residuals, save_path: str = None) -> None:
     plt.figure(figsize=(10,6))
     sns.histplot(residuals, bins=30, kde=True, color='purple')
     plt.title("Distribuição dos Resíduos", fontsize=14)
     plt.xlabel("Resíduos", fontsize=12)
     plt.ylabel("Frequência", fontsize=12)
     plt.tight_layout()
-    path_residuos_hist = os.path.join(report_figures_dir, "residuos_distribuicao.png")
-    plt.savefig(path_residuos_hist)
-    plt.close()
-    
+    finalizar_figura(save_path)
+
+def plot_real_vs_previsto(y_true, y_pred, save_path: str = None) -> None:
     plt.figure(figsize=(10,6))
-    sns.scatterplot(x=y_true, y=y_pred, color='green', alpha=0.6)
+    dispersao(y_true, y_pred, color='green', alpha=0.6)
     plt.plot([y_true.min(), y_true.max()], [y_true.min(), y_true.max()], 'r--')
     plt.title("Valores Reais vs Previstos", fontsize=14)
     plt.xlabel("Valores Reais", fontsize=12)
     plt.ylabel("Valores Previstos", fontsize=12)
     plt.tight_layout()
-    path_scatter = os.path.join(report_figures_dir, "real_vs_previsto.png")
-    plt.savefig(path_scatter)
-    plt.close()
-    
+    finalizar_figura(save_path)
+
+def plot_residuos_vs_previsto(y_pred, residuals, save_path: str = None) -> None:
     plt.figure(figsize=(10,6))
-    sns.scatterplot(x=y_pred, y=residuals, color='orange', alpha=0.6)
+    dispersao(y_pred, residuals, color='orange', alpha=0.6)
     plt.axhline(0, linestyle='--', color='red')
     plt.title("Resíduos vs Valores Previstos", fontsize=14)
     plt.xlabel("Valores Previstos", fontsize=12)
     plt.ylabel("Resíduos", fontsize=12)
     plt.tight_layout()
-    path_residuos_scatter = os.path.join(report_figures_dir, "residuos_vs_previsto.png")
-    plt.savefig(path_residuos_scatter)
-    plt.close()
+    finalizar_figura(save_path)
+
+@instrumentar
+def generate_plots(y_true, y_pred, report_figures_dir: str):
+    """
+    Gera gráficos de avaliação dos resíduos e salva os mesmos no diretório especificado, em paralelo e
+    sem interface gráfica; figuras cujos dados não mudaram são reaproveitadas.
+    """
+    y_true = np.asarray(y_true, dtype=float)
+    y_pred = np.asarray(y_pred, dtype=float)
+    residuals = y_true - y_pred
+    
+    # Teste de normalidade dos resíduos
+    stat, p_value = normaltest(residuals)
+    if p_value < 0.05:
+        logger.info("Os resíduos não seguem uma distribuição normal (p-valor < 0.05).")
+    else:
+        logger.info("Os resíduos parecem seguir uma distribuição normal (p-valor >= 0.05).")
+    
+    caminhos = renderizar_figuras([
+        (plot_residuos_distribuicao, (residuals,), {}, "residuos_distribuicao.png"),
+        (plot_real_vs_previsto, (y_true, y_pred), {}, "real_vs_previsto.png"),
+        (plot_residuos_vs_previsto, (y_pred, residuals), {}, "residuos_vs_previsto.png"),
+    ], report_figures_dir)
     
     logger.info("Gráficos de avaliação gerados com sucesso.")
     return {
-        "residuos_hist": path_residuos_hist,
-        "real_vs_previsto": path_scatter,
-        "residuos_vs_previsto": path_residuos_scatter
+        "residuos_hist": caminhos["residuos_distribuicao.png"],
+        "real_vs_previsto": caminhos["real_vs_previsto.png"],
+        "residuos_vs_previsto": caminhos["residuos_vs_previsto.png"]
     }
 
-def generate_report(report_path: str, metrics: dict, best_params: dict, figures_paths: dict):
+def generate_report(report_path: str, metrics: dict, best_params: dict, figures_paths: dict,
+                    intervalos: dict = None, por_fatia: pd.DataFrame = None):
     """
-    Gera e salva um relatório de avaliação do modelo.
+    Gera e salva um relatório de avaliação do modelo, com os intervalos de confiança bootstrap
+    e as métricas por fatia, quando informados.
     """
     report_text = (
         "RELATÓRIO DE AVALIAÇÃO DO MODELO\n"
@@ -120,8 +213,16 @@ def generate_report(report_path: str, metrics: dict, best_params: dict, figures_
         f"MAE: {metrics['MAE']:.4f}\n"
         f"RMSE: {metrics['RMSE']:.4f}\n"
         f"R²: {metrics['R2']:.4f}\n\n"
-        "Melhores Hiperparâmetros:\n"
     )
+    if intervalos:
+        report_text += "Intervalos de Confiança (bootstrap, 95%):\n"
+        for nome, (inferior, superior) in intervalos.items():
+            report_text += f" - {nome}: [{inferior:.4f}, {superior:.4f}]\n"
+        report_text += "\n"
+    if por_fatia is not None and not por_fatia.empty:
+        report_text += "Métricas por Fatia:\n"
+        report_text += por_fatia.to_string(float_format=lambda v: f"{v:.4f}") + "\n\n"
+    report_text += "Melhores Hiperparâmetros:\n"
     for param, value in best_params.items():
         report_text += f" - {param}: {value}\n"
     
@@ -134,42 +235,153 @@ def generate_report(report_path: str, metrics: dict, best_params: dict, figures_
         f.write(report_text)
     logger.info(f"Relatório de avaliação salvo em: {report_path}")
 
-def main():
-    logger.info("=== Executando evaluation.py ===")
-    warnings.filterwarnings("ignore")
-    
-    caminho_dados = os.path.join("data", "final", "nyc_rental_data_features.csv")
-    df = load_data(caminho_dados)
-    
-    target_column = 'price_log'
-    # Remover colunas vazadoras e irrelevantes: price, id e host_id
-    features_to_drop = [target_column, 'price', 'id', 'host_id']
-    X = df.drop(columns=features_to_drop, errors='ignore')
-    y = df[target_column]
-    
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    
-    caminho_modelo = os.path.join("models", "random_forest.pkl")
-    model = load_model(caminho_modelo)
-    
-    y_pred = model.predict(X_test)
-    
-    mae = mean_absolute_error(y_test, y_pred)
-    rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-    r2 = r2_score(y_test, y_pred)
-    metrics = {"MAE": mae, "RMSE": rmse, "R2": r2}
+@instrumentar
+def executar(model, X_test, y_test, best_params: dict = None, teste: pd.DataFrame = None,
+             n_reamostras: int = N_REAMOSTRAS) -> dict:
+    """
+    Executa a etapa de avaliação do modelo sobre o conjunto de teste informado: calcula as métricas,
+    os intervalos de confiança bootstrap e as métricas por fatia, gera os gráficos e o relatório.
+    Se `teste` (o conjunto salvo pelo treinamento) for informado, as previsões e as fatias vêm dele,
+    sem chamar o modelo. Se `best_params` não for informado, é lido do relatório de treinamento.
+    """
+    if teste is not None:
+        y_test, y_pred = teste["y_true"].to_numpy(), teste["y_pred"].to_numpy()
+        fatias = teste.drop(columns=["indice", "y_true", "y_pred", "versao_modelo"], errors="ignore")
+    else:
+        y_test, y_pred, fatias = np.asarray(y_test, dtype=np.float64), model.predict(X_test), None
+
+    metrics = calcular_metricas(y_test, y_pred)
     logger.info(f"Métricas de Desempenho: {metrics}")
+    intervalos = intervalos_bootstrap(y_test, y_pred, n_reamostras)
+    logger.info(f"Intervalos de confiança bootstrap ({n_reamostras} reamostras): {intervalos}")
+    por_fatia = metricas_por_fatia(y_test, y_pred, fatias) if fatias is not None and len(fatias.columns) else None
+    if por_fatia is not None:
+        caminho_fatias = os.path.join("reports", "evaluation_fatias.csv")
+        por_fatia.to_csv(caminho_fatias)
+        logger.info(f"Métricas por fatia salvas em: {caminho_fatias}")
     
     # As figuras serão salvas na pasta 'reports/figures'
     report_figures_dir = os.path.join("reports", "figures")
     figures_paths = generate_plots(y_test, y_pred, report_figures_dir)
     
-    best_params_path = os.path.join("reports", "model_training", "best_params.json")
-    best_params = load_best_params(best_params_path)
+    if best_params is None:
+        best_params_path = os.path.join("reports", "model_training", "best_params.json")
+        best_params = load_best_params(best_params_path)
     
     # O relatório de avaliação será salvo na pasta 'reports'
     report_path = os.path.join("reports", "evaluation.txt")
-    generate_report(report_path, metrics, best_params, figures_paths)
+    generate_report(report_path, metrics, best_params, figures_paths, intervalos, por_fatia)
+    return metrics
+
+@instrumentar
+def benchmark_inferencia(modelo, X_test, tamanhos=TAMANHOS_BENCHMARK, semente: int = 42) -> (pd.DataFrame, int):
+    """
+    Compara o motor de florestas achatadas (FlorestaCompacta, com limiares e folhas em float32, como no
+    artefato salvo) com o RandomForestRegressor.predict em lotes de cada tamanho, amostrados do conjunto
+    de teste (com reposição quando o lote é maior que ele). Antes da medição, verifica que as previsões
+    do percurso vetorizado coincidem com as do scikit-learn no conjunto de teste (acima do limite, o motor
+    usa o próprio estimador do scikit-learn).
+    Retorna, por tamanho de lote, o tempo mediano de cada um (ms), a vazão (linhas/s) e o ganho do percurso
+    vetorizado, junto com o limite medido: o maior lote em que o percurso vetorizado foi mais rápido.
+    """
+    motor = FlorestaCompacta.de_modelo(modelo, precisao="float32")
+    M = motor._matriz(X_test)
+    referencia = modelo.predict(X_test)
+    diferenca = float(np.max(np.abs(motor.prever_vetorizado(M) - referencia), initial=0.0))
+    # Os limiares em float32 preservam as decisões; resta apenas o arredondamento dos valores das folhas
+    if diferenca > 1e-5:
+        raise ValueError(f"Previsões do motor divergem do scikit-learn (diferença máxima {diferenca:.3g}).")
+    logger.info(f"Motor de florestas verificado: diferença máxima para o scikit-learn de {diferenca:.3g}.")
+
+    rng = np.random.default_rng(semente)
+    linhas = []
+    limite = 0
+    for tamanho in tamanhos:
+        # Lotes pequenos são medidos várias vezes, com linhas diferentes, e resumidos pela mediana
+        repeticoes = max(1, min(20, TAMANHOS_BENCHMARK[-1] // tamanho))
+        tempos = {"sklearn": [], "motor": []}
+        for _ in range(repeticoes):
+            lote = X_test.iloc[rng.integers(0, len(X_test), tamanho)]
+            for nome, prever in (("sklearn", modelo.predict), ("motor", lambda lote: motor.prever_vetorizado(motor._matriz(lote)))):
+                inicio = time.perf_counter()
+                prever(lote)
+                tempos[nome].append(time.perf_counter() - inicio)
+        sklearn_s, motor_s = np.median(tempos["sklearn"]), np.median(tempos["motor"])
+        # O limite cresce enquanto o percurso vetorizado vence em todos os lotes até o atual
+        if motor_s < sklearn_s and limite == (linhas[-1]["linhas"] if linhas else 0):
+            limite = tamanho
+        linhas.append({
+            "linhas": tamanho,
+            "sklearn_ms": sklearn_s * 1000,
+            "motor_ms": motor_s * 1000,
+            "sklearn_linhas_por_s": tamanho / sklearn_s,
+            "motor_linhas_por_s": tamanho / motor_s,
+            "ganho": sklearn_s / motor_s,
+        })
+        logger.info(f"Lote de {tamanho} linha(s): scikit-learn {sklearn_s * 1000:.2f} ms, motor {motor_s * 1000:.2f} ms "
+                    f"({sklearn_s / motor_s:.2f}x)")
+    return pd.DataFrame(linhas).set_index("linhas"), limite
+
+def gerar_relatorio_benchmark(resultado: pd.DataFrame, caminho: str, n_arvores: int, limite: int):
+    """
+    Salva a comparação de tempos de inferência entre o motor de florestas e o scikit-learn.
+    """
+    texto = (
+        "BENCHMARK DE INFERÊNCIA (motor de florestas achatadas vs RandomForestRegressor.predict)\n"
+        "-------------------------------------------------------------------------------------\n\n"
+        f"Árvores: {n_arvores}\n"
+        f"Percurso vetorizado até {limite} linhas; lotes maiores usam o estimador original do scikit-learn.\n\n"
+        f"{resultado.to_string(float_format=lambda v: f'{v:.4f}')}\n"
+    )
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, 'w', encoding='utf-8') as f:
+        f.write(texto)
+    logger.info(f"Relatório de benchmark de inferência salvo em: {caminho}")
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Avalia o modelo ativo no conjunto de teste.")
+    parser.add_argument("--benchmark-inferencia", action="store_true",
+                        help="Compara o motor de florestas com o scikit-learn em lotes de 1 a 100.000 linhas e grava "
+                             "no artefato o maior lote em que o percurso vetorizado compensa.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    logger.info("=== Executando evaluation.py ===")
+    warnings.filterwarnings("ignore")
+    
+    teste = None
+    if os.path.exists(CAMINHO_TESTE):
+        # Conjunto de teste e previsões salvos pelo treinamento: sem nova separação nem nova previsão
+        teste = carregar_tabela(CAMINHO_TESTE)
+        versao = teste["versao_modelo"].iloc[0] if "versao_modelo" in teste.columns and len(teste) else None
+        if versao != versao_modelo_ativo():
+            raise ValueError(f"As previsões de {CAMINHO_TESTE} são da versão {versao} do modelo, mas a ativa é a "
+                             f"{versao_modelo_ativo()}. Refaça o treinamento ou a atualização incremental com os dados "
+                             f"processados disponíveis para gerar as previsões do modelo ativo.")
+        logger.info(f"Conjunto de teste carregado de: {CAMINHO_TESTE} ({len(teste)} linhas, versão {versao})")
+        executar(None, None, teste["y_true"], teste=teste)
+    else:
+        logger.warning(f"{CAMINHO_TESTE} não encontrado; refazendo a separação treino/teste e as previsões.")
+        # Matriz de features mapeada em memória, sem cópia nem parsing
+        X, y = carregar_ou_gerar_features()
+        _, posicoes_teste = separar_treino_teste(len(X))
+        X_test, y_test = X.iloc[posicoes_teste], y.iloc[posicoes_teste]
+        model = load_model(caminho_modelo_ativo())
+        executar(model, X_test, y_test)
+
+    if args.benchmark_inferencia:
+        if obter_modelo_ativo() == "random_forest":
+            if teste is not None:
+                X_test = carregar_ou_gerar_features()[0].iloc[teste["indice"].to_numpy()]
+            floresta = obter_backend("random_forest").carregar(compacto=False)
+            resultado, limite = benchmark_inferencia(floresta, X_test)
+            gerar_relatorio_benchmark(resultado, os.path.join("reports", "benchmark_inferencia.txt"), floresta.n_estimators, limite)
+            artefato = obter_backend("random_forest").caminho_artefato()
+            if os.path.isdir(artefato):
+                registrar_limite_percurso(artefato, limite)
+        else:
+            logger.warning("Benchmark de inferência disponível apenas para o backend random_forest.")
     
     logger.info("Avaliação do modelo concluída com sucesso.\nMódulo evaluation executado com sucesso.")
 
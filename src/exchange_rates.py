@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+import os
+import json
+import time
+import threading
+import logging
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Configuração do logger
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MOEDAS_PADRAO = ("BRL", "EUR")
+CAMINHO_CACHE_PADRAO = os.path.join("data", "external", "cotacoes_cache.json")
+
+
+class RateProvider:
+    """
+    Interface dos provedores de cotações: retorna quantas unidades de cada moeda valem 1 USD.
+    """
+
+    def obter_cotacoes(self, moedas=MOEDAS_PADRAO) -> dict:
+        raise NotImplementedError
+
+
+class AwesomeAPIRateProvider(RateProvider):
+    """
+    Obtém as cotações na AwesomeAPI reutilizando uma sessão HTTP com pool de conexões,
+    timeout e novas tentativas limitadas.
+    """
+    URL = "https://economia.awesomeapi.com.br/json/last/{pares}"
+
+    def __init__(self, timeout: tuple = (3.05, 5.0), tentativas: int = 2, session: requests.Session = None):
+        self.timeout = timeout
+        if session is None:
+            session = requests.Session()
+            retry = Retry(total=tentativas, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504))
+            session.mount("https://", HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=4))
+        self.session = session
+
+    def obter_cotacoes(self, moedas=MOEDAS_PADRAO) -> dict:
+        pares = ",".join(f"USD-{moeda}" for moeda in moedas)
+        response = self.session.get(self.URL.format(pares=pares), timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        return {moeda: float(data[f"USD{moeda}"]['bid']) for moeda in moedas}
+
+
+class StaticRateProvider(RateProvider):
+    """
+    Provedor local com cotações fixas, para uso offline e em testes.
+    """
+
+    def __init__(self, cotacoes: dict):
+        self.cotacoes = dict(cotacoes)
+
+    def obter_cotacoes(self, moedas=MOEDAS_PADRAO) -> dict:
+        return {moeda: float(self.cotacoes[moeda]) for moeda in moedas}
+
+
+class CachedRateProvider(RateProvider):
+    """
+    Envolve outro provedor com um cache de cotações com TTL, mantido em memória e em arquivo JSON.
+
+    Enquanto o cache estiver dentro do TTL, nenhuma chamada de rede é feita. Se o provedor falhar,
+    as últimas cotações conhecidas (mesmo expiradas) são utilizadas, permitindo operar offline.
+    Cada moeda guarda o horário da própria atualização, então uma consulta que traz apenas parte
+    das moedas não renova as demais.
+    """
+
+    def __init__(self, provedor: RateProvider = None, ttl: float = 3600.0, caminho_cache: str = CAMINHO_CACHE_PADRAO):
+        self.provedor = provedor if provedor is not None else AwesomeAPIRateProvider()
+        self.ttl = ttl
+        self.caminho_cache = caminho_cache
+        self._lock = threading.Lock()
+        self._cache = self._ler_arquivo()
+
+    def _ler_arquivo(self) -> dict:
+        if not self.caminho_cache or not os.path.exists(self.caminho_cache):
+            return {}
+        try:
+            with open(self.caminho_cache, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Cache de cotações ignorado ({self.caminho_cache}): {e}")
+            return {}
+        # Arquivos antigos têm um único horário para todas as moedas
+        if "timestamps" not in cache:
+            timestamp = cache.pop("timestamp", 0)
+            cache["timestamps"] = {moeda: timestamp for moeda in cache.get("cotacoes", {})}
+        return cache
+
+    def _salvar_arquivo(self) -> None:
+        if not self.caminho_cache:
+            return
+        diretorio = os.path.dirname(self.caminho_cache)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        temporario = self.caminho_cache + ".tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(self._cache, f, indent=4)
+        os.replace(temporario, self.caminho_cache)
+
+    def _cotacoes_em_cache(self, moedas, validas: bool):
+        cotacoes = self._cache.get("cotacoes", {})
+        if not all(moeda in cotacoes for moeda in moedas):
+            return None
+        if validas and time.time() - self._atualizacao(moedas) > self.ttl:
+            return None
+        return {moeda: cotacoes[moeda] for moeda in moedas}
+
+    def _atualizacao(self, moedas) -> float:
+        # Horário da atualização mais antiga entre as moedas pedidas
+        timestamps = self._cache.get("timestamps", {})
+        return min(timestamps.get(moeda, 0) for moeda in moedas)
+
+    def obter_cotacoes(self, moedas=MOEDAS_PADRAO) -> dict:
+        with self._lock:
+            cotacoes = self._cotacoes_em_cache(moedas, validas=True)
+            if cotacoes is not None:
+                return cotacoes
+            try:
+                novas = self.provedor.obter_cotacoes(moedas)
+            except Exception as e:
+                cotacoes = self._cotacoes_em_cache(moedas, validas=False)
+                if cotacoes is None:
+                    raise
+                idade = time.time() - self._atualizacao(moedas)
+                logger.warning(f"Falha ao atualizar cotações ({e}). Usando cotações em cache de {idade / 60:.0f} min atrás.")
+                return cotacoes
+            agora = time.time()
+            self._cache = {"timestamps": {**self._cache.get("timestamps", {}), **{moeda: agora for moeda in novas}},
+                           "cotacoes": {**self._cache.get("cotacoes", {}), **novas}}
+            try:
+                self._salvar_arquivo()
+            except OSError as e:
+                logger.warning(f"Não foi possível salvar o cache de cotações: {e}")
+            logger.info(f"Cotações atualizadas: {novas}")
+            return novas
+
+
+def converter_valores(valores_usd, cotacoes: dict) -> pd.DataFrame:
+    """
+    Converte um vetor de valores em USD para todas as moedas das cotações em uma única
+    multiplicação vetorizada. Retorna um DataFrame com uma coluna por moeda.
+    """
+    valores = np.asarray(valores_usd, dtype=float).reshape(-1)
+    moedas = list(cotacoes)
+    taxas = np.array([cotacoes[moeda] for moeda in moedas], dtype=float)
+    return pd.DataFrame(np.outer(valores, taxas), columns=moedas)
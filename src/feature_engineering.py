@@ -1,54 +1,84 @@
 #!/usr/bin/env python
 import os
+import copy
 import numpy as np
 import pandas as pd
 from sklearn.preprocessing import StandardScaler
+from sklearn.model_selection import train_test_split
 import joblib
 import logging
 import math
+from functools import lru_cache
+
+from data_storage import (aplicar_esquema_features, carregar_tabela, salvar_parquet, salvar_matriz_features,
+                          carregar_matriz_features)
+from data_processing import carregar_ou_processar
+from column_stats import calcular_estatisticas, obter_estatisticas, descrever
+from spatial_features import SpatialIndex, COLUNAS_ESPACIAIS
+from categorical_encoding import CategoricalEncoder
+from text_features import TextDateFeatures
+from instrumentation import instrumentar
 
 # Configuração do logger
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Variáveis de alta cardinalidade codificadas pela média suavizada do preço (target encoding)
+COLUNAS_TARGET_ENCODING = ['bairro']
+# Separação treino/teste do treinamento: as estatísticas calculadas a partir do preço só usam as linhas de treino
+FRACAO_TESTE = 0.2
+SEMENTE_DIVISAO = 42
+# Dataset final (Parquet e matriz de features em NumPy, sem extensão)
+CAMINHO_FEATURES = os.path.join("data", "final", "nyc_rental_data_features")
+# Coordenadas cujas features (distância ao centro e vizinhança) o ListingEncoder mantém memorizadas
+TAMANHO_MEMO_COORDENADAS = 4096
+
 def carregar_dados(caminho: str) -> pd.DataFrame:
     """
-    Carrega os dados a partir de um arquivo CSV.
+    Carrega os dados a partir de um arquivo Parquet ou CSV.
     """
-    df = pd.read_csv(caminho)
+    df = carregar_tabela(caminho)
     logger.info(f"Dados carregados com sucesso de: {caminho}")
     return df
 
+def distancia_centro(latitude, longitude):
+    """
+    Distância, em quilômetros, até o centro de Nova York (coordenadas: 40.7128, -74.0060) pela fórmula
+    de Haversine. Aceita escalares, arrays ou séries.
+    """
+    # Coordenadas do centro de Nova York
+    lat_centro = 40.7128
+    lon_centro = -74.0060
+
+    # Converter graus para radianos
+    lat1 = np.radians(latitude)
+    lon1 = np.radians(longitude)
+    lat2 = math.radians(lat_centro)
+    lon2 = math.radians(lon_centro)
+
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+
+    a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
+    c = 2 * np.arcsin(np.sqrt(a))
+    # Raio da Terra em quilômetros
+    raio = 6371
+    return c * raio
+
 def calcular_proximidade_centro(df: pd.DataFrame) -> pd.Series:
     """
     Calcula a proximidade do ponto dado com o centro de Nova York (coordenadas: 40.7128, -74.0060) utilizando a fórmula de Haversine.
     Se as colunas 'latitude' e 'longitude' não existirem, retorna uma série de zeros.
     """
     if 'latitude' in df.columns and 'longitude' in df.columns:
-        # Coordenadas do centro de Nova York
-        lat_centro = 40.7128
-        lon_centro = -74.0060
-        
-        # Converter graus para radianos
-        lat1 = np.radians(df['latitude'])
-        lon1 = np.radians(df['longitude'])
-        lat2 = math.radians(lat_centro)
-        lon2 = math.radians(lon_centro)
-        
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        
-        a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
-        c = 2 * np.arcsin(np.sqrt(a))
-        # Raio da Terra em quilômetros
-        raio = 6371
-        distancia = c * raio
+        distancia = distancia_centro(df['latitude'], df['longitude'])
         logger.info("Feature 'proximidade_centro' calculada utilizando a fórmula de Haversine.")
         return distancia
     else:
         logger.warning("Colunas 'latitude' e 'longitude' não encontradas. 'proximidade_centro' definido como 0.")
         return pd.Series(0, index=df.index)
 
+@instrumentar
 def criar_novas_features(df: pd.DataFrame) -> pd.DataFrame:
     """
     Cria novas features no dataset.
@@ -66,18 +96,32 @@ def criar_novas_features(df: pd.DataFrame) -> pd.DataFrame:
     logger.info("Novas features criadas com sucesso.")
     return df
 
+def selecionar_colunas_categoricas(df: pd.DataFrame, estatisticas: pd.DataFrame = None) -> list:
+    """
+    Seleciona as variáveis categóricas com baixa cardinalidade (menos de 50 categorias).
+    Exclui as colunas: 'nome', 'host_name', 'ultima_review', 'bairro'.
+    A cardinalidade vem das estatísticas por coluna; se não forem informadas, são calculadas só para as candidatas.
+    """
+    candidatas = [coluna for coluna in df.select_dtypes(include=["object", "category"]).columns
+                  if coluna not in ['nome', 'host_name', 'ultima_review', 'bairro']]
+    if estatisticas is None:
+        estatisticas = calcular_estatisticas(df, candidatas)
+    return [coluna for coluna in candidatas if estatisticas.loc[coluna, "cardinalidade"] < 50]
+
+@instrumentar
 def codificar_variaveis_categoricas(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Codifica variáveis categóricas com baixa cardinalidade utilizando one-hot encoding.
+    Codifica variáveis categóricas com baixa cardinalidade utilizando one-hot encoding (a primeira categoria
+    é a referência), com o mesmo `CategoricalEncoder` do pipeline de features.
     Exclui as colunas: 'nome', 'host_name', 'ultima_review', 'bairro'.
     """
-    colunas_para_codificar = []
-    for coluna in df.select_dtypes(include=["object"]).columns:
-        if coluna not in ['nome', 'host_name', 'ultima_review', 'bairro']:
-            if df[coluna].nunique() < 50:
-                colunas_para_codificar.append(coluna)
+    colunas_para_codificar = selecionar_colunas_categoricas(df)
     if colunas_para_codificar:
-        df = pd.get_dummies(df, columns=colunas_para_codificar, drop_first=True)
+        codificador = CategoricalEncoder(colunas_para_codificar)
+        codificador.ajustar(df)
+        dummies = pd.DataFrame(codificador.transformar_onehot(df).astype(bool).toarray(),
+                               columns=codificador.nomes_dummies(), index=df.index)
+        df = pd.concat([df.drop(columns=colunas_para_codificar), dummies], axis=1)
         logger.info(f"Variáveis categóricas codificadas: {colunas_para_codificar}")
     else:
         logger.info("Nenhuma variável categórica para codificar foi encontrada.")
@@ -105,7 +149,7 @@ def normalizar_variaveis_numericas(df: pd.DataFrame) -> (pd.DataFrame, StandardS
     """
     Normaliza variáveis numéricas (exceto 'price_log') utilizando StandardScaler.
     """
-    colunas_numericas = df.select_dtypes(include=["int64", "float64"]).columns.tolist()
+    colunas_numericas = df.select_dtypes(include=[np.number]).columns.tolist()
     if 'price_log' in colunas_numericas:
         colunas_numericas.remove('price_log')
     scaler = StandardScaler()
@@ -113,46 +157,397 @@ def normalizar_variaveis_numericas(df: pd.DataFrame) -> (pd.DataFrame, StandardS
     logger.info("Variáveis numéricas normalizadas com sucesso.")
     return df, scaler
 
+def separar_treino_teste(n_linhas: int) -> (np.ndarray, np.ndarray):
+    """
+    Posições das linhas de treino e de teste do dataset de features: a mesma separação feita no treinamento
+    do modelo, conhecida já no ajuste do pipeline para que o preço dos anúncios de teste não entre nas features.
+    """
+    return train_test_split(np.arange(n_linhas), test_size=FRACAO_TESTE, random_state=SEMENTE_DIVISAO)
+
+def codificador_categorico(pipeline: dict) -> CategoricalEncoder:
+    """
+    Retorna o codificador categórico do pipeline; pipelines salvos antes dele guardam apenas os vocabulários.
+    """
+    codificador = pipeline.get("codificador_categorico")
+    return codificador if codificador is not None else CategoricalEncoder.de_vocabulario(pipeline["categorias"])
+
+def _montar_features(df: pd.DataFrame, pipeline: dict, espaciais: np.ndarray = None,
+                     alvo: np.ndarray = None) -> pd.DataFrame:
+    """
+    Monta as features (ainda não normalizadas) a partir dos dados brutos, utilizando
+    a tabela de densidade, o índice espacial e o codificador categórico guardados no pipeline.
+    `espaciais` e `alvo` permitem informar features espaciais e target encoding já calculados
+    (os leave-one-out e fora do fold do ajuste).
+    """
+    df = df.copy()
+    if 'bairro' in df.columns:
+        df["densidade_imoveis"] = df["bairro"].astype(object).map(pipeline["densidade_por_bairro"]).fillna(pipeline["densidade_padrao"]).astype("int64")
+    else:
+        df["densidade_imoveis"] = pipeline["densidade_padrao"]
+    df["proximidade_centro"] = calcular_proximidade_centro(df)
+    if pipeline.get("espacial") is not None:
+        if espaciais is None:
+            if 'latitude' in df.columns and 'longitude' in df.columns:
+                espaciais = pipeline["espacial"].calcular(df['latitude'], df['longitude'])
+            else:
+                espaciais = np.full((len(df), len(COLUNAS_ESPACIAIS)), np.nan)
+        for i, coluna in enumerate(COLUNAS_ESPACIAIS):
+            df[coluna] = espaciais[:, i]
+
+    # One-hot com vocabulário congelado (categorias não vistas ficam com todas as dummies em zero),
+    # densificado direto em booleanos a partir da matriz esparsa, pois os modelos recebem uma matriz densa,
+    # e target encoding das variáveis de alta cardinalidade
+    codificador = codificador_categorico(pipeline)
+    blocos = [df, pd.DataFrame(codificador.transformar_onehot(df).astype(bool).toarray(),
+                               columns=codificador.nomes_dummies(), index=df.index)]
+    if codificador.colunas_alvo:
+        alvo = codificador.transformar_alvo(df) if alvo is None else alvo
+        blocos.append(pd.DataFrame(alvo, columns=codificador.nomes_alvo(), index=df.index))
+    # Recência da última review e hash das palavras do título, em largura fixa
+    if pipeline.get("texto") is not None:
+        recencia, hashes = pipeline["texto"].transformar(df)
+        blocos.append(pd.DataFrame(np.column_stack([recencia, hashes.toarray()]),
+                                   columns=pipeline["texto"].nomes_colunas(), index=df.index))
+    return pd.concat(blocos, axis=1).reindex(columns=pipeline["colunas"], fill_value=0)
+
+@instrumentar
+def ajustar_pipeline_features(df: pd.DataFrame, treino: np.ndarray = None) -> (pd.DataFrame, dict):
+    """
+    Ajusta o pipeline de features sobre os dados processados e retorna as features transformadas
+    junto com o pipeline ajustado. `treino` são as posições das linhas de treino (todas, por padrão): o codificador
+    categórico e o índice espacial só usam os preços dessas linhas, e as demais recebem as features como imóveis novos.
+
+    O pipeline é um dicionário compacto com a ordem das colunas, o codificador categórico (vocabulários
+    congelados e target encoding do bairro) e seus vocabulários, a tabela de densidade por bairro (a
+    frequência de cada bairro), as features de texto e data (`TextDateFeatures`) e o scaler, permitindo
+    reproduzir exatamente as mesmas features na previsão sem carregar o dataset de treinamento.
+    """
+    categoricas = selecionar_colunas_categoricas(df)
+    treino = np.arange(len(df)) if treino is None else np.asarray(treino)
+    teste = np.setdiff1d(np.arange(len(df)), treino)
+    # Vocabulários e target encoding ajustados só nas linhas de treino, que recebem a média fora do fold;
+    # as de teste são codificadas como imóveis novos
+    codificador = CategoricalEncoder(categoricas, COLUNAS_TARGET_ENCODING)
+    alvo_treino = codificador.ajustar(df.iloc[treino], df['price_log'].iloc[treino] if 'price_log' in df.columns else None)
+    alvo = None
+    if alvo_treino is not None:
+        alvo = np.empty((len(df), len(codificador.colunas_alvo)))
+        alvo[treino] = alvo_treino
+        if len(teste):
+            alvo[teste] = codificador.transformar_alvo(df.iloc[teste])
+    pipeline = {
+        "categorias": codificador.categorias,
+        "codificador_categorico": codificador,
+        "densidade_por_bairro": df["bairro"].astype(object).value_counts().to_dict() if 'bairro' in df.columns else {},
+        "densidade_padrao": 1,
+        "espacial": None,
+        "texto": TextDateFeatures(n_jobs=-1).ajustar(df.iloc[treino]) if {'nome', 'ultima_review'} & set(df.columns) else None,
+    }
+    if 'bairro' not in df.columns:
+        logger.warning("Coluna 'bairro' não encontrada. 'densidade_imoveis' definido como 1 para todos os registros.")
+
+    # Índice espacial sobre as coordenadas de treino; as features dos anúncios de treino são leave-one-out
+    # e as dos anúncios de teste são consultas comuns, sem os seus preços no índice
+    espaciais = None
+    if {'latitude', 'longitude', 'price_log'} <= set(df.columns):
+        pipeline["espacial"] = SpatialIndex()
+        espaciais = np.empty((len(df), len(COLUNAS_ESPACIAIS)))
+        espaciais[treino] = pipeline["espacial"].ajustar(df['latitude'].iloc[treino], df['longitude'].iloc[treino],
+                                                         df['price_log'].iloc[treino])
+        espaciais[teste] = pipeline["espacial"].calcular(df['latitude'].iloc[teste], df['longitude'].iloc[teste])
+    else:
+        logger.warning("Colunas 'latitude', 'longitude' ou 'price_log' não encontradas. Features espaciais não serão criadas.")
+
+    # A ordem das colunas segue a do fluxo original: colunas restantes seguidas das dummies
+    colunas_base = excluir_colunas_irrelevantes(df.drop(columns=categoricas)).columns.tolist()
+    colunas_derivadas = ["densidade_imoveis", "proximidade_centro"]
+    if pipeline["espacial"] is not None:
+        colunas_derivadas += COLUNAS_ESPACIAIS
+    colunas_derivadas += codificador.nomes_alvo()
+    if pipeline["texto"] is not None:
+        colunas_derivadas += pipeline["texto"].nomes_colunas()
+    colunas_base = [c for c in colunas_base if c != 'price_log' and c not in colunas_derivadas]
+    pipeline["colunas"] = colunas_base + colunas_derivadas + codificador.nomes_dummies()
+
+    X = _montar_features(df, pipeline, espaciais, alvo)
+    X, scaler = normalizar_variaveis_numericas(X)
+    pipeline["colunas_numericas"] = list(scaler.feature_names_in_)
+    pipeline["scaler"] = scaler
+    logger.info(f"Pipeline de features ajustado com {len(pipeline['colunas'])} colunas.")
+    return X, pipeline
+
+@instrumentar
+def aplicar_pipeline_features(df: pd.DataFrame, pipeline: dict) -> pd.DataFrame:
+    """
+    Aplica o pipeline de features ajustado a novos dados, produzindo as mesmas colunas,
+    na mesma ordem e com a mesma normalização utilizadas no treinamento.
+    """
+    X = _montar_features(df, pipeline)
+    colunas_numericas = pipeline["colunas_numericas"]
+    X[colunas_numericas] = pipeline["scaler"].transform(X[colunas_numericas])
+    return X
+
+def decodificar_categorias(X: pd.DataFrame, categorias: dict) -> pd.DataFrame:
+    """
+    Reconstrói as variáveis categóricas a partir das dummies do pipeline (inverso do one-hot com
+    categoria de referência): linhas sem nenhuma dummy ativa recebem a primeira categoria.
+    """
+    decodificadas = {}
+    for coluna, valores in (categorias or {}).items():
+        rotulos = np.full(len(X), valores[0], dtype=object)
+        for categoria in valores[1:]:
+            dummy = f"{coluna}_{categoria}"
+            if dummy in X.columns:
+                rotulos[X[dummy].to_numpy(dtype=bool)] = categoria
+        decodificadas[coluna] = rotulos
+    return pd.DataFrame(decodificadas, index=X.index)
+
+# Marca os campos não informados na chave canônica de um imóvel
+_AUSENTE = object()
+
+def _valor_canonico(valor):
+    if valor is None or isinstance(valor, str):
+        return valor
+    try:
+        valor = float(valor)
+    except (TypeError, ValueError):
+        return valor
+    return None if math.isnan(valor) else valor
+
+class ListingEncoder:
+    """
+    Codificador pré-compilado de imóveis individuais: converte o dicionário bruto de um imóvel
+    diretamente no vetor de features do pipeline, sem criar DataFrames. A posição de cada coluna,
+    a posição da dummy de cada categoria e a média e a escala do scaler são resolvidas uma única vez,
+    na criação; o resultado é o mesmo de `aplicar_pipeline_features`. As features que dependem só das
+    coordenadas (distância ao centro e consultas ao índice espacial) são memorizadas por par de coordenadas.
+    """
+
+    def __init__(self, pipeline: dict):
+        self.colunas = list(pipeline["colunas"])
+        indices = {coluna: i for i, coluna in enumerate(self.colunas)}
+        self._densidade_por_bairro = pipeline["densidade_por_bairro"]
+        self._densidade_padrao = pipeline["densidade_padrao"]
+        self._indice_densidade = indices.get("densidade_imoveis")
+        self._indice_proximidade = indices.get("proximidade_centro")
+        self._espacial = pipeline.get("espacial")
+        self._indices_espaciais = [indices[c] for c in COLUNAS_ESPACIAIS] if self._espacial is not None else []
+        self._coordenadas = lru_cache(maxsize=TAMANHO_MEMO_COORDENADAS)(self._features_coordenadas)
+
+        # Posição da dummy de cada categoria; a categoria de referência e as não vistas não têm posição
+        self._dummies = {coluna: {categoria: indices[f"{coluna}_{categoria}"] for categoria in categorias[1:]
+                                  if f"{coluna}_{categoria}" in indices}
+                         for coluna, categorias in pipeline["categorias"].items()}
+        # Colunas de target encoding: (variável, posição), com a média global do alvo para o valor ausente
+        self._codificador = codificador_categorico(pipeline)
+        self._alvo = [(coluna, indices[nome]) for coluna, nome in
+                      zip(self._codificador.colunas_alvo, self._codificador.nomes_alvo()) if nome in indices]
+        self._texto = pipeline.get("texto")
+        self._indices_texto = [indices[c] for c in self._texto.nomes_colunas()] if self._texto is not None else []
+        derivadas = {"densidade_imoveis", "proximidade_centro", *COLUNAS_ESPACIAIS, *self._codificador.nomes_alvo()}
+        derivadas.update(self._texto.nomes_colunas() if self._texto is not None else [])
+        derivadas.update(f"{coluna}_{categoria}" for coluna, categorias in pipeline["categorias"].items()
+                         for categoria in categorias[1:])
+        self._diretas = [(coluna, i) for coluna, i in indices.items() if coluna not in derivadas]
+        # Campos brutos que afetam o vetor de features; os demais (id, host_name...) são ignorados
+        campos = {coluna for coluna, _ in self._diretas} | set(pipeline["categorias"]) | {c for c, _ in self._alvo}
+        if self._indice_densidade is not None:
+            campos.add('bairro')
+        if self._indice_proximidade is not None or self._espacial is not None:
+            campos.update(('latitude', 'longitude'))
+        if self._texto is not None:
+            campos.update(('nome', 'ultima_review', 'numero_de_reviews'))
+        self.campos = tuple(sorted(campos))
+
+        scaler = pipeline["scaler"]
+        self._indices_numericos = np.array([indices[c] for c in pipeline["colunas_numericas"]], dtype=np.intp)
+        self._media = scaler.mean_ if scaler.with_mean else np.zeros(len(self._indices_numericos))
+        self._escala = scaler.scale_ if scaler.with_std else np.ones(len(self._indices_numericos))
+
+        # Vetor inicial: colunas não informadas valem 0 (como no reindex do pipeline), a densidade, o padrão,
+        # as features espaciais, NaN (imóvel sem coordenadas), e o target encoding, a média global
+        self._inicial = np.zeros(len(self.colunas))
+        if self._indice_densidade is not None:
+            self._inicial[self._indice_densidade] = self._densidade_padrao
+        self._inicial[self._indices_espaciais] = np.nan
+        for coluna, i in self._alvo:
+            self._inicial[i] = self._codificador.valor_alvo(coluna, None)
+
+    def _features_coordenadas(self, latitude: float, longitude: float) -> (float, np.ndarray):
+        proximidade = distancia_centro(latitude, longitude) if self._indice_proximidade is not None else None
+        espaciais = self._espacial.calcular_um(latitude, longitude) if self._espacial is not None else None
+        return proximidade, espaciais
+
+    def codificar(self, dados: dict) -> np.ndarray:
+        """
+        Retorna as features normalizadas de um imóvel, com formato (1, n_colunas).
+        """
+        x = self._inicial.copy()
+        for coluna, i in self._diretas:
+            if coluna in dados:
+                valor = dados[coluna]
+                x[i] = np.nan if valor is None else valor
+        if self._indice_densidade is not None and 'bairro' in dados:
+            x[self._indice_densidade] = self._densidade_por_bairro.get(dados['bairro'], self._densidade_padrao)
+        if 'latitude' in dados and 'longitude' in dados:
+            latitude = np.nan if dados['latitude'] is None else dados['latitude']
+            longitude = np.nan if dados['longitude'] is None else dados['longitude']
+            proximidade, espaciais = self._coordenadas(latitude, longitude)
+            if self._indice_proximidade is not None:
+                x[self._indice_proximidade] = proximidade
+            if self._espacial is not None:
+                x[self._indices_espaciais] = espaciais
+        for coluna, i in self._alvo:
+            if coluna in dados:
+                x[i] = self._codificador.valor_alvo(coluna, dados[coluna])
+        if self._texto is not None:
+            x[self._indices_texto] = self._texto.calcular_um(dados)
+        for coluna, posicoes in self._dummies.items():
+            i = posicoes.get(dados.get(coluna))
+            if i is not None:
+                x[i] = 1.0
+        x[self._indices_numericos] = (x[self._indices_numericos] - self._media) / self._escala
+        return x.reshape(1, -1)
+
+    def chave(self, dados: dict) -> tuple:
+        """
+        Chave canônica de um imóvel: os valores dos `campos` usados pelo codificador, com números
+        convertidos para float e None/NaN unificados, de modo que imóveis com as mesmas features tenham a
+        mesma chave. Campos ausentes são distinguidos de nulos, pois o codificador os trata de forma diferente.
+        O título entra pelas colunas do hash que ativa, e não pelo texto: títulos que só diferem em palavras
+        descartadas, na caixa ou na pontuação têm a mesma chave.
+        """
+        return tuple(self._texto.colunas_nome(dados.get(campo)) if campo == 'nome' else
+                     _valor_canonico(dados[campo]) if campo in dados else _AUSENTE for campo in self.campos)
+
+    def chaves_lote(self, df: pd.DataFrame) -> list:
+        """
+        Chaves canônicas (ver `chave`) de todas as linhas de um DataFrame, montadas coluna a coluna:
+        o mesmo resultado de `chave` aplicada a cada linha convertida em dicionário.
+        """
+        colunas = []
+        for campo in self.campos:
+            if campo == 'nome':
+                colunas.append(self._texto.colunas_nomes(df))
+            elif campo not in df.columns:
+                colunas.append([_AUSENTE] * len(df))
+            elif pd.api.types.is_numeric_dtype(df[campo]):
+                valores = df[campo].to_numpy(dtype=np.float64, na_value=np.nan)
+                canonicos = valores.astype(object)
+                canonicos[np.isnan(valores)] = None
+                colunas.append(canonicos.tolist())
+            else:
+                colunas.append([_valor_canonico(valor) for valor in df[campo].tolist()])
+        return list(zip(*colunas)) if colunas else [()] * len(df)
+
+    def codificar_lote(self, registros) -> np.ndarray:
+        """
+        Codifica uma lista de imóveis (dicionários), retornando uma matriz (n_imoveis, n_colunas).
+        """
+        if not registros:
+            return np.empty((0, len(self.colunas)))
+        return np.vstack([self.codificar(dados) for dados in registros])
+
+def atualizar_pipeline_features(df: pd.DataFrame, pipeline: dict) -> dict:
+    """
+    Atualiza incrementalmente as estatísticas de normalização (média e variância) com novos registros, sem
+    reajustá-las sobre todo o histórico. As estatísticas atualizadas ficam em `estatisticas_scaler`; o `scaler`
+    aplicado às features permanece congelado, assim como vocabulários, tabela de densidade e ordem das colunas,
+    para que as árvores já treinadas continuem recebendo as mesmas features (e as novas, features na mesma
+    escala). Retorna um novo pipeline; o original não é alterado.
+    """
+    novo = dict(pipeline)
+    novo["estatisticas_scaler"] = copy.deepcopy(pipeline.get("estatisticas_scaler", pipeline["scaler"]))
+    colunas_numericas = pipeline["colunas_numericas"]
+    novo["estatisticas_scaler"].partial_fit(_montar_features(df, pipeline)[colunas_numericas])
+    logger.info(f"Estatísticas de normalização atualizadas com {len(df)} novos registros "
+                f"(total de {int(novo['estatisticas_scaler'].n_samples_seen_)} registros vistos).")
+    return novo
+
+def deriva_normalizacao(pipeline: dict) -> pd.Series:
+    """
+    Deslocamento da média de cada coluna numérica desde o ajuste do scaler congelado, em desvios-padrão do
+    scaler: mostra quanto os dados acumulados pelas atualizações incrementais já se afastaram da normalização.
+    """
+    scaler = pipeline["scaler"]
+    estatisticas = pipeline.get("estatisticas_scaler", scaler)
+    return pd.Series((estatisticas.mean_ - scaler.mean_) / scaler.scale_, index=pipeline["colunas_numericas"])
+
+def salvar_pipeline_features(pipeline: dict, caminho: str) -> None:
+    """
+    Salva o pipeline de features ajustado no caminho especificado.
+    """
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    joblib.dump(pipeline, caminho)
+    logger.info(f"Pipeline de features salvo com sucesso em: {caminho}")
+
 def salvar_dados(df: pd.DataFrame, caminho: str) -> None:
     """
-    Salva o DataFrame em um arquivo CSV no caminho especificado.
+    Salva o DataFrame no caminho especificado, em Parquet (tipado) ou CSV conforme a extensão.
+    Em Parquet, salva também a matriz de features em NumPy para carregamento por mapeamento de memória.
     """
     os.makedirs(os.path.dirname(caminho), exist_ok=True)
-    df.to_csv(caminho, index=False)
+    if caminho.endswith(".parquet"):
+        salvar_parquet(df, caminho)
+        salvar_matriz_features(df, os.path.splitext(caminho)[0])
+    else:
+        df.to_csv(caminho, index=False)
     logger.info(f"Dados com novas features salvos com sucesso em: {caminho}")
 
-def gerar_relatorio(df: pd.DataFrame, caminho_report: str) -> None:
+def gerar_relatorio(df: pd.DataFrame, caminho_report: str, estatisticas: pd.DataFrame = None) -> None:
     """
     Gera um relatório TXT contendo o resumo da engenharia de atributos.
     """
+    estatisticas = estatisticas if estatisticas is not None else obter_estatisticas(df)
     with open(caminho_report, 'w', encoding='utf-8') as f:
         f.write("RELATÓRIO DE ENGENHARIA DE ATRIBUTOS\n")
         f.write("------------------------------------\n")
         f.write(f"Dimensões do dataset após feature engineering: {df.shape}\n")
         f.write("Estatísticas descritivas:\n")
-        f.write(df.describe().to_string())
+        f.write(descrever(estatisticas).to_string())
     logger.info(f"Relatório de engenharia de atributos gerado em: {caminho_report}")
 
-def main():
-    logger.info("=== Executando feature_engineering.py ===")
-    caminho_entrada = os.path.join("data", "processed", "nyc_rental_data_processed.csv")
-    caminho_saida = os.path.join("data", "final", "nyc_rental_data_features.csv")
-    df = carregar_dados(caminho_entrada)
-    df = criar_novas_features(df)
-    df = codificar_variaveis_categoricas(df)
+@instrumentar
+def executar(df: pd.DataFrame, salvar: bool = True) -> (pd.DataFrame, dict):
+    """
+    Executa a etapa de engenharia de atributos sobre os dados processados e retorna o dataset final
+    e o pipeline ajustado. O dataset final só é gravado em disco quando `salvar` é verdadeiro;
+    o relatório, o scaler e o pipeline de features são sempre salvos.
+    """
     df = transformar_variavel_alvo(df)   # Calcular price_log antes de remover price
-    df = excluir_colunas_irrelevantes(df)  # Remover colunas vazadoras agora que price_log foi calculado
-    df, scaler = normalizar_variaveis_numericas(df)
-    salvar_dados(df, caminho_saida)
+    # O mesmo pipeline ajustado aqui é aplicado na previsão (predict_price); os anúncios que o treinamento
+    # separa para teste não contribuem com o preço nas features
+    treino, _ = separar_treino_teste(len(df))
+    X, pipeline = ajustar_pipeline_features(df, treino)
+    df = aplicar_esquema_features(X.assign(price_log=df["price_log"].to_numpy()))
+    if salvar:
+        salvar_dados(df, CAMINHO_FEATURES + ".parquet")
     
     report_dir = os.path.join("reports", "feature_engineering")
     os.makedirs(report_dir, exist_ok=True)
     gerar_relatorio(df, os.path.join(report_dir, "feature_engineering_report.txt"))
     
-    # Salvar o scaler para uso em previsões
+    # Salvar o scaler e o pipeline de features para uso em previsões
     os.makedirs("models", exist_ok=True)
-    joblib.dump(scaler, os.path.join("models", "scaler.pkl"))
+    joblib.dump(pipeline["scaler"], os.path.join("models", "scaler.pkl"))
     logger.info("Scaler salvo com sucesso em: models/scaler.pkl")
+    salvar_pipeline_features(pipeline, os.path.join("models", "feature_pipeline.pkl"))
+    return df, pipeline
+
+def carregar_ou_gerar_features() -> (pd.DataFrame, pd.Series):
+    """
+    Mapeia em memória a matriz de features gravada por esta etapa, entrada do treinamento e da avaliação
+    quando executados como scripts. Se ela não existir (por padrão, a execução em processo do main.py não
+    grava os datasets intermediários), refaz a engenharia de atributos, e o pré-processamento se preciso.
+    """
+    if not os.path.exists(CAMINHO_FEATURES + "_X.npy"):
+        logger.warning(f"{CAMINHO_FEATURES}_X.npy não encontrado; refazendo a engenharia de atributos.")
+        executar(carregar_ou_processar(), salvar=True)
+    return carregar_matriz_features(CAMINHO_FEATURES)
+
+def main():
+    logger.info("=== Executando feature_engineering.py ===")
+    executar(carregar_ou_processar())
     
     logger.info("Engenharia de atributos concluída com sucesso.\nMódulo feature_engineering executado com sucesso.")
 
@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+import os
+import sys
+import json
+import time
+import cProfile
+import pstats
+import inspect
+import argparse
+import threading
+import functools
+import logging
+from collections import Counter
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import psutil
+
+# Configuração do logger
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Configuração lida do ambiente, para valer também nos scripts executados como subprocessos
+VARIAVEL_METRICAS = "PIPELINE_METRICAS"
+VARIAVEL_PERFIL = "PIPELINE_PERFIL"
+CAMINHO_METRICAS_PADRAO = os.path.join("reports", "metricas_etapas.jsonl")
+DIRETORIO_PERFIS = os.path.join("reports", "perfis")
+INTERVALO_AMOSTRAGEM_S = 0.01
+
+_lock = threading.Lock()
+_local = threading.local()
+_processo = psutil.Process()
+
+
+def configurar_instrumentacao(caminho_metricas: str = None, perfilar: str = None) -> None:
+    """
+    Define o arquivo JSON-lines das métricas (None ou '' desativa o registro) e a etapa a perfilar
+    (ex.: 'model_training.train_model'). A configuração vai para variáveis de ambiente, de modo que
+    subprocessos e workers herdam os mesmos valores.
+    """
+    os.environ[VARIAVEL_METRICAS] = caminho_metricas or ""
+    if perfilar:
+        os.environ[VARIAVEL_PERFIL] = perfilar
+    else:
+        os.environ.pop(VARIAVEL_PERFIL, None)
+
+
+def caminho_metricas() -> str:
+    # Sem configuração explícita, nenhuma métrica é gravada
+    return os.environ.get(VARIAVEL_METRICAS, "")
+
+
+def _instrumentacao_ativa() -> bool:
+    return bool(caminho_metricas() or os.environ.get(VARIAVEL_PERFIL))
+
+
+def _contar_linhas(valor):
+    if isinstance(valor, (pd.DataFrame, pd.Series, np.ndarray)):
+        return int(valor.shape[0]) if valor.ndim else None
+    if isinstance(valor, tuple) and valor:
+        return _contar_linhas(valor[0])
+    return None
+
+
+def _rss_mb() -> float:
+    return _processo.memory_info().rss / 2**20
+
+
+class _Medicao:
+    """
+    Medição de uma chamada de etapa: tempo de parede, tempo de CPU do processo e pico da memória
+    residente (RSS), amostrada pelo psutil em uma thread enquanto a etapa executa. Quando a etapa é a
+    escolhida para perfilar, também coleta um perfil do cProfile e amostras da pilha da thread da etapa
+    (formato de pilhas agregadas, usado para gerar flamegraphs).
+
+    A medição pode ser pausada (`pausar`/`retomar`), como nos geradores enquanto o consumidor processa cada
+    bloco: só o tempo, a CPU e as amostras de RSS e de pilha dos trechos ativos entram no registro, e o nível
+    de aninhamento volta ao de fora da etapa durante a pausa.
+    """
+
+    def __init__(self, etapa: str, linhas_entrada):
+        self.etapa = etapa
+        self.linhas_entrada = linhas_entrada
+        self.perfilar = os.environ.get(VARIAVEL_PERFIL) == etapa
+        self.nivel = getattr(_local, "nivel", 0)
+
+    def iniciar(self) -> None:
+        self.rss_inicial = self.rss_pico = _rss_mb()
+        self.duracao = self.duracao_cpu = 0.0
+        self._thread_etapa = threading.get_ident()
+        self._pilhas = Counter()
+        self._ativa = threading.Event()
+        self._parar = threading.Event()
+        self._amostrador = threading.Thread(target=self._amostrar, name="instrumentacao", daemon=True)
+        self._amostrador.start()
+        self._perfil = cProfile.Profile() if self.perfilar else None
+        self.retomar()
+
+    def retomar(self) -> None:
+        _local.nivel = self.nivel + 1
+        self._thread_etapa = threading.get_ident()
+        self._ativa.set()
+        self.inicio_cpu = time.process_time()
+        self.inicio = time.perf_counter()
+        if self._perfil is not None:
+            self._perfil.enable()
+
+    def pausar(self) -> None:
+        if not self._ativa.is_set():
+            return
+        if self._perfil is not None:
+            self._perfil.disable()
+        self.duracao += time.perf_counter() - self.inicio
+        self.duracao_cpu += time.process_time() - self.inicio_cpu
+        self._ativa.clear()
+        self.rss_pico = max(self.rss_pico, _rss_mb())
+        _local.nivel = self.nivel
+
+    def _amostrar(self) -> None:
+        while not self._parar.wait(INTERVALO_AMOSTRAGEM_S):
+            if not self._ativa.is_set():
+                continue
+            self.rss_pico = max(self.rss_pico, _rss_mb())
+            if self.perfilar:
+                quadro = sys._current_frames().get(self._thread_etapa)
+                pilha = []
+                while quadro is not None:
+                    codigo = quadro.f_code
+                    pilha.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})")
+                    quadro = quadro.f_back
+                if pilha:
+                    self._pilhas[";".join(reversed(pilha))] += 1
+
+    def finalizar(self, linhas_saida=None, erro: BaseException = None) -> dict:
+        self.pausar()
+        duracao, duracao_cpu = self.duracao, self.duracao_cpu
+        self._parar.set()
+        self._amostrador.join()
+        linhas = max((v for v in (self.linhas_entrada, linhas_saida) if v is not None), default=None)
+        registro = {
+            "timestamp": time.time(),
+            "etapa": self.etapa,
+            "pid": os.getpid(),
+            "nivel": self.nivel,
+            "tempo_parede_s": duracao,
+            "tempo_cpu_s": duracao_cpu,
+            "rss_inicial_mb": self.rss_inicial,
+            "rss_pico_mb": self.rss_pico,
+            "rss_acrescimo_mb": self.rss_pico - self.rss_inicial,
+            "linhas_entrada": self.linhas_entrada,
+            "linhas_saida": linhas_saida,
+            "linhas_por_s": linhas / duracao if linhas is not None and duracao > 0 else None,
+            "erro": f"{type(erro).__name__}: {erro}" if erro is not None else None,
+        }
+        if self.perfilar:
+            registro["perfil"] = self._salvar_perfil()
+        registrar_metricas(registro)
+        self.registro = registro
+        return registro
+
+    def _salvar_perfil(self) -> str:
+        os.makedirs(DIRETORIO_PERFIS, exist_ok=True)
+        base = os.path.join(DIRETORIO_PERFIS, f"{self.etapa}-{time.strftime('%Y%m%d-%H%M%S')}")
+        self._perfil.dump_stats(base + ".prof")
+        with open(base + ".txt", 'w', encoding='utf-8') as f:
+            pstats.Stats(self._perfil, stream=f).sort_stats("cumulative").print_stats(40)
+        with open(base + ".folded", 'w', encoding='utf-8') as f:
+            for pilha, amostras in self._pilhas.most_common():
+                f.write(f"{pilha} {amostras}\n")
+        logger.info(f"Perfil da etapa '{self.etapa}' salvo em: {base}.prof (.txt e .folded)")
+        return base + ".prof"
+
+
+class MonitorWorkers:
+    """
+    Acompanha, enquanto o contexto está aberto, a memória do processo principal e de cada processo filho
+    (os workers do joblib): pico de RSS e pico de USS, a memória exclusiva do processo, que não conta
+    as páginas compartilhadas, como as de uma matriz mapeada em memória. A amostragem usa o psutil.
+    """
+
+    def __init__(self, intervalo_s: float = 0.5):
+        self.intervalo_s = intervalo_s
+        self.picos = {}
+
+    def _medir(self) -> None:
+        for processo in [_processo] + _processo.children(recursive=True):
+            try:
+                memoria = processo.memory_full_info()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            pico = self.picos.setdefault(processo.pid, {"principal": processo.pid == _processo.pid,
+                                                         "rss_mb": 0.0, "uss_mb": 0.0})
+            pico["rss_mb"] = max(pico["rss_mb"], memoria.rss / 2**20)
+            pico["uss_mb"] = max(pico["uss_mb"], memoria.uss / 2**20)
+
+    def _amostrar(self) -> None:
+        while not self._parar.wait(self.intervalo_s):
+            self._medir()
+
+    def __enter__(self):
+        self._medir()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._amostrar, name="monitor-workers", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *excecao):
+        self._parar.set()
+        self._thread.join()
+        self._medir()
+        return False
+
+    def resumo(self) -> dict:
+        """
+        Resume os picos por worker e estima quantos workers cabem na memória disponível, pelo maior
+        pico de memória exclusiva (USS) entre eles.
+        """
+        workers = {pid: pico for pid, pico in self.picos.items() if not pico["principal"]}
+        principal = next((pico for pico in self.picos.values() if pico["principal"]), {"rss_mb": 0.0, "uss_mb": 0.0})
+        resumo = {
+            "principal_rss_pico_mb": principal["rss_mb"],
+            "principal_uss_pico_mb": principal["uss_mb"],
+            "workers": len(workers),
+            "workers_rss_pico_mb": [round(pico["rss_mb"], 1) for pico in workers.values()],
+            "workers_uss_pico_mb": [round(pico["uss_mb"], 1) for pico in workers.values()],
+        }
+        if workers:
+            maior_uss = max(pico["uss_mb"] for pico in workers.values())
+            # Os workers do joblib continuam vivos para reuso, então a memória deles também conta como disponível
+            disponivel = psutil.virtual_memory().available / 2**20 + sum(pico["uss_mb"] for pico in workers.values())
+            resumo["worker_uss_pico_max_mb"] = maior_uss
+            resumo["workers_suportados_memoria"] = int(disponivel // maior_uss) if maior_uss > 0 else None
+        return resumo
+
+
+def registrar_metricas(registro: dict) -> None:
+    """
+    Acrescenta um registro ao arquivo JSON-lines de métricas (uma linha por chamada de etapa).
+    """
+    caminho = caminho_metricas()
+    if not caminho:
+        return
+    linha = json.dumps(registro, ensure_ascii=False, default=str) + "\n"
+    with _lock:
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        with open(caminho, 'a', encoding='utf-8') as f:
+            f.write(linha)
+
+
+def instrumentar(funcao=None, *, etapa: str = None):
+    """
+    Decorador das funções de etapa do pipeline. Cada chamada gera um registro com o tempo de parede,
+    o tempo de CPU, o pico de RSS, as linhas de entrada (primeiro argumento tabular) e de saída
+    (resultado tabular, ou soma dos blocos produzidos por um gerador) e a vazão em linhas por segundo.
+    Nos geradores, só o tempo gasto produzindo cada bloco é medido; o trabalho do consumidor entre os
+    blocos fica de fora.
+    O nome da etapa é '<módulo>.<função>', a menos que `etapa` seja informado. Sem arquivo de métricas
+    nem etapa a perfilar configurados (o padrão), a função é chamada diretamente.
+    """
+    if funcao is None:
+        return functools.partial(instrumentar, etapa=etapa)
+    modulo = funcao.__module__ if funcao.__module__ != "__main__" else \
+        os.path.splitext(os.path.basename(inspect.getsourcefile(funcao)))[0]
+    nome = etapa or f"{modulo}.{funcao.__name__}"
+
+    def _linhas_entrada(args, kwargs):
+        for valor in list(args) + list(kwargs.values()):
+            linhas = _contar_linhas(valor)
+            if linhas is not None:
+                return linhas
+        return None
+
+    if inspect.isgeneratorfunction(funcao):
+        @functools.wraps(funcao)
+        def envoltorio_gerador(*args, **kwargs):
+            if not _instrumentacao_ativa():
+                yield from funcao(*args, **kwargs)
+                return
+            medicao = _Medicao(nome, _linhas_entrada(args, kwargs))
+            gerador = funcao(*args, **kwargs)
+            medicao.iniciar()
+            linhas_saida, erro = 0, None
+            try:
+                for bloco in gerador:
+                    linhas_saida += _contar_linhas(bloco) or 0
+                    # A medição fica pausada enquanto o consumidor processa o bloco
+                    medicao.pausar()
+                    yield bloco
+                    medicao.retomar()
+            except BaseException as e:
+                erro = e
+                raise
+            finally:
+                gerador.close()
+                medicao.finalizar(linhas_saida, erro)
+        return envoltorio_gerador
+
+    @functools.wraps(funcao)
+    def envoltorio(*args, **kwargs):
+        if not _instrumentacao_ativa():
+            return funcao(*args, **kwargs)
+        medicao = _Medicao(nome, _linhas_entrada(args, kwargs))
+        medicao.iniciar()
+        try:
+            resultado = funcao(*args, **kwargs)
+        except BaseException as e:
+            medicao.finalizar(erro=e)
+            raise
+        medicao.finalizar(_contar_linhas(resultado))
+        return resultado
+    return envoltorio
+
+
+@contextmanager
+def medir_trecho(etapa: str, linhas_entrada: int = None):
+    """
+    Mede um trecho de código como uma etapa instrumentada, mesmo sem métricas configuradas: ao sair do
+    contexto, `medicao.registro` traz o tempo de parede, a CPU e o pico de RSS (o registro também vai
+    para o arquivo de métricas, se houver um).
+    """
+    medicao = _Medicao(etapa, linhas_entrada)
+    medicao.iniciar()
+    try:
+        yield medicao
+    except BaseException as e:
+        medicao.finalizar(erro=e)
+        raise
+    medicao.finalizar()
+
+
+def carregar_metricas(caminho: str = None) -> pd.DataFrame:
+    """
+    Lê o arquivo JSON-lines de métricas em um DataFrame.
+    """
+    return pd.read_json(caminho or caminho_metricas() or CAMINHO_METRICAS_PADRAO, lines=True)
+
+
+def resumir_metricas(metricas: pd.DataFrame) -> pd.DataFrame:
+    """
+    Agrega as métricas por etapa: chamadas, tempos total e médio, CPU e maior pico de RSS.
+    """
+    return metricas.groupby("etapa").agg(
+        chamadas=("etapa", "size"),
+        tempo_parede_total_s=("tempo_parede_s", "sum"),
+        tempo_parede_medio_s=("tempo_parede_s", "mean"),
+        tempo_cpu_total_s=("tempo_cpu_s", "sum"),
+        rss_pico_mb=("rss_pico_mb", "max"),
+        linhas_por_s_media=("linhas_por_s", "mean"),
+    ).sort_values("tempo_parede_total_s", ascending=False)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Resume as métricas por etapa registradas em JSON-lines.")
+    parser.add_argument("caminho", nargs="?", default=CAMINHO_METRICAS_PADRAO)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(resumir_metricas(carregar_metricas(args.caminho)).round(3).to_string())
+
+
+if __name__ == "__main__":
+    main()
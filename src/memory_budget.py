@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+import os
+import logging
+from functools import lru_cache
+
+import numpy as np
+import psutil
+from sklearn.tree import DecisionTreeRegressor
+
+# Configuração do logger
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MB = 2 ** 20
+# Arrays por nó da árvore ajustada (atributos documentados de `tree_`); os que não existem na versão
+# instalada do scikit-learn são ignorados
+ATRIBUTOS_NO = ("children_left", "children_right", "feature", "threshold", "impurity", "n_node_samples",
+                "weighted_n_node_samples", "missing_go_to_left", "value")
+# Estimativas, não medições: buffers do construtor da árvore por amostra (índices, valores da feature, pesos do
+# bootstrap e auxiliares) e memória exclusiva (USS) de um worker do joblib recém-criado (interpretador, NumPy,
+# pandas e scikit-learn importados). O relatório do treino acusa quando o pico real passa do estimado.
+BYTES_CONSTRUCAO_POR_AMOSTRA = 40
+MEMORIA_BASE_WORKER_MB = 110.0
+# Fração de amostras distintas em um bootstrap do mesmo tamanho do conjunto (1 - 1/e)
+FRACAO_DISTINTAS_BOOTSTRAP = 0.632
+# Menor árvore aceitável no modo com orçamento; abaixo disso, o orçamento é considerado insuficiente
+FOLHAS_MINIMAS = 32
+
+
+def _bytes_arvore(arvore) -> int:
+    return sum(getattr(arvore, atributo).nbytes for atributo in ATRIBUTOS_NO if hasattr(arvore, atributo))
+
+
+@lru_cache(maxsize=None)
+def bytes_por_no() -> float:
+    """
+    Bytes por nó de uma árvore de regressão, calibrados uma vez por processo com o ajuste de uma árvore
+    pequena, em vez de depender do layout interno dos nós do scikit-learn.
+    """
+    rng = np.random.default_rng(0)
+    arvore = DecisionTreeRegressor(random_state=0).fit(rng.random((256, 4)), rng.random(256)).tree_
+    return _bytes_arvore(arvore) / arvore.node_count
+
+
+def estimar_nos_arvore(n_linhas: int, min_samples_leaf: int = 1, min_samples_split: int = 2, max_depth: int = None,
+                       max_samples: float = None, max_leaf_nodes: int = None) -> float:
+    """
+    Número esperado de nós de uma árvore de regressão da floresta: sem limites, ela cresce até folhas
+    com cerca de `min_samples_leaf` amostras distintas do bootstrap, limitada por 2^max_depth folhas e por
+    `max_leaf_nodes`.
+    """
+    amostras = n_linhas * (max_samples or 1.0)
+    folhas = FRACAO_DISTINTAS_BOOTSTRAP * amostras / max(min_samples_leaf, min_samples_split / 2)
+    if max_depth:
+        folhas = min(folhas, 2.0 ** max_depth)
+    if max_leaf_nodes:
+        folhas = min(folhas, max_leaf_nodes)
+    return 2 * max(folhas, 1.0) - 1
+
+
+def _memoria_ajuste_mb(n_arvores: int, nos: float, amostras: float) -> float:
+    # Árvores prontas, a árvore em construção (cuja capacidade dobra conforme cresce) e os buffers do construtor
+    return ((n_arvores + 2) * nos * bytes_por_no() + amostras * BYTES_CONSTRUCAO_POR_AMOSTRA) / MB
+
+
+def planejar_treino(n_linhas: int, n_features: int, memoria_mb: float, grade: dict, n_folds: int = 5,
+                    floresta: bool = True, cpus: int = None, memoria_base_mb: float = None) -> dict:
+    """
+    Planeja a busca de hiperparâmetros para caber em `memoria_mb`: quantos workers da validação cruzada
+    rodam em paralelo e, para florestas, a fração do bootstrap por árvore (`max_samples`) e o limite de
+    folhas (`max_leaf_nodes`). A estimativa soma a memória atual do processo, a matriz de treino
+    compartilhada em float32 e, por worker, sua memória base, a cópia do fold e a floresta do maior
+    candidato da `grade`; o reajuste final no processo principal conta como mais uma floresta. Com um único
+    worker, o joblib ajusta os folds no próprio processo, um de cada vez, antes do reajuste final.
+
+    Prioriza árvores completas: usa o maior número de workers que ainda comporta a floresta sem limites e,
+    se nem um worker a comporta, treina com um só, subamostrando o bootstrap até que as árvores caibam.
+    Lança ValueError se o orçamento não comporta nem árvores com `FOLHAS_MINIMAS` folhas.
+    """
+    cpus = cpus or os.cpu_count() or 1
+    base = memoria_base_mb if memoria_base_mb is not None else psutil.Process().memory_info().rss / MB
+    bytes_linha = n_features * 4 + 8
+    dados = n_linhas * bytes_linha / MB
+    fold = n_linhas * (n_folds - 1) / n_folds * bytes_linha / MB
+    disponivel = memoria_mb - base - dados
+    max_workers = min(cpus, n_folds)
+
+    def memoria_workers(workers: int) -> float:
+        return fold if workers == 1 else workers * (MEMORIA_BASE_WORKER_MB + fold)
+
+    def ajustes_simultaneos(workers: int) -> int:
+        return 1 if workers == 1 else workers + 1
+
+    plano = {"memoria_mb": memoria_mb, "workers": 1, "parametros": {}}
+    if not floresta:
+        if disponivel < fold:
+            raise ValueError(f"Orçamento de {memoria_mb:.0f} MB insuficiente: a memória atual ({base:.0f} MB), "
+                             f"os dados ({dados:.0f} MB) e o fold ({fold:.0f} MB) já o excedem.")
+        plano["workers"] = max(w for w in range(1, max_workers + 1) if memoria_workers(w) <= disponivel)
+        ajuste = 0.0
+    else:
+        # O maior candidato da grade; as árvores são estimadas sobre todo o treino (o reajuste final)
+        n_arvores = max(grade.get("n_estimators", [100]))
+        profundidades = grade.get("max_depth", [None])
+        candidato = {"min_samples_leaf": min(grade.get("min_samples_leaf", [1])),
+                     "min_samples_split": min(grade.get("min_samples_split", [2])),
+                     "max_depth": None if None in profundidades else max(profundidades)}
+
+        def nos_disponiveis(workers: int) -> float:
+            por_ajuste = (disponivel - memoria_workers(workers)) * MB / ajustes_simultaneos(workers)
+            return (por_ajuste - n_linhas * BYTES_CONSTRUCAO_POR_AMOSTRA) / ((n_arvores + 2) * bytes_por_no())
+
+        nos = estimar_nos_arvore(n_linhas, **candidato)
+        workers = next((w for w in range(max_workers, 0, -1) if nos_disponiveis(w) >= nos), None)
+        if workers is not None:
+            plano["workers"] = workers
+        else:
+            folhas = int((nos_disponiveis(1) + 1) / 2)
+            if folhas < FOLHAS_MINIMAS:
+                raise ValueError(f"Orçamento de {memoria_mb:.0f} MB insuficiente para {n_arvores} árvores com ao menos "
+                                 f"{FOLHAS_MINIMAS} folhas (memória atual {base:.0f} MB, dados {dados:.0f} MB, "
+                                 f"fold {fold:.0f} MB).")
+            # Subamostra o bootstrap até que as árvores naturalmente tenham `folhas` folhas; o limite de folhas
+            # garante o tamanho mesmo quando a estimativa de crescimento é otimista
+            fracao = folhas * max(candidato["min_samples_leaf"], candidato["min_samples_split"] / 2) \
+                / (FRACAO_DISTINTAS_BOOTSTRAP * n_linhas)
+            plano["parametros"] = {"max_samples": min(max(fracao, 1.0 / n_linhas), 1.0), "max_leaf_nodes": folhas}
+            nos = estimar_nos_arvore(n_linhas, **candidato, **plano["parametros"])
+        ajuste = _memoria_ajuste_mb(n_arvores, nos, n_linhas * plano["parametros"].get("max_samples", 1.0))
+
+    plano["estimativa"] = {
+        "memoria_atual_mb": base,
+        "dados_mb": dados,
+        "workers_mb": memoria_workers(plano["workers"]),
+        "ajuste_mb": ajuste,
+        "pico_total_mb": base + dados + memoria_workers(plano["workers"]) + ajustes_simultaneos(plano["workers"]) * ajuste,
+    }
+    logger.info(f"Plano de memória para {memoria_mb:.0f} MB: {plano['workers']} worker(s), "
+                f"parâmetros {plano['parametros'] or 'sem limites'}, pico estimado de "
+                f"{plano['estimativa']['pico_total_mb']:.0f} MB.")
+    return plano
+
+
+def estimar_tamanho_floresta_mb(n_linhas: int, parametros: dict):
+    """
+    Tamanho estimado dos nós de uma floresta com os `parametros` do RandomForestRegressor (n_estimators,
+    min_samples_leaf, min_samples_split, max_depth, max_samples e max_leaf_nodes) treinada em `n_linhas`.
+    """
+    chaves = ("min_samples_leaf", "min_samples_split", "max_depth", "max_samples", "max_leaf_nodes")
+    nos = estimar_nos_arvore(n_linhas, **{chave: parametros[chave] for chave in chaves if chave in parametros})
+    return parametros.get("n_estimators", 100) * nos * bytes_por_no() / MB
+
+
+def tamanho_floresta_mb(modelo):
+    """
+    Memória ocupada pelos nós das árvores de uma floresta ajustada (None para outros modelos), somando
+    os arrays de cada árvore.
+    """
+    estimadores = getattr(modelo, "estimators_", None)
+    if estimadores is None or not hasattr(estimadores[0], "tree_"):
+        return None
+    return sum(_bytes_arvore(arvore.tree_) for arvore in estimadores) / MB
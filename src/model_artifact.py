@@ -0,0 +1,379 @@
+#!/usr/bin/env python
+import os
+import json
+import shutil
+import hashlib
+import argparse
+import logging
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+
+# Configuração do logger
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+FORMATO = "nyc-rental-modelo"
+VERSAO_FORMATO = 1
+ARQUIVO_CABECALHO = "cabecalho.json"
+ARQUIVO_NOS_COMPRIMIDOS = "nos.joblib"
+ARQUIVO_PAYLOAD = "modelo.joblib"
+PRECISOES = ("float32", "float64")
+COMPRESSOES = (None, "zlib", "gzip", "bz2", "lzma")
+
+# Arrays de nós de todas as árvores concatenadas; os filhos usam índices globais (-1 nas folhas)
+CAMPOS_NOS = ("feature", "threshold", "esquerda", "direita", "valor", "nan_esquerda", "raizes")
+
+# Maior lote percorrido pelo motor vetorizado quando o cabeçalho não traz o valor medido por
+# `evaluation.py --benchmark-inferencia`. Com 200 árvores em uma CPU, o motor é 3x mais rápido que o
+# scikit-learn com 100 linhas, empata com 1.000 e é 0,5x com 10.000.
+LIMITE_PERCURSO_VETORIZADO = 1000
+
+
+def descrever_dados(X, y=None) -> dict:
+    """
+    Resume os dados de treinamento para o cabeçalho do artefato: hash SHA-256 da matriz de features
+    (em float32, a precisão usada pelas árvores) e do alvo, quantidade de linhas e de colunas.
+    """
+    M = X.to_numpy(dtype=np.float32) if hasattr(X, "to_numpy") else np.asarray(X, dtype=np.float32)
+    h = hashlib.sha256(np.ascontiguousarray(M).tobytes())
+    if y is not None:
+        h.update(np.ascontiguousarray(np.asarray(y, dtype=np.float64)).tobytes())
+    return {"hash": h.hexdigest(), "linhas": int(M.shape[0]), "colunas": int(M.shape[1])}
+
+
+def _limiares_float32(threshold: np.ndarray) -> np.ndarray:
+    """
+    Converte os limiares para float32 arredondando para baixo. Como as árvores comparam features em
+    float32, x <= t vale exatamente quando x <= float32_abaixo(t), e as decisões não mudam.
+    """
+    limiares = threshold.astype(np.float32)
+    acima = limiares.astype(np.float64) > threshold
+    limiares[acima] = np.nextafter(limiares[acima], np.float32(-np.inf))
+    return limiares
+
+
+def _hash_arquivo(caminho: str) -> str:
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _eh_floresta(modelo) -> bool:
+    return (hasattr(modelo, "estimators_") and getattr(modelo, "n_outputs_", None) == 1
+            and all(hasattr(arvore, "tree_") for arvore in modelo.estimators_))
+
+
+def achatar_floresta(modelo, precisao: str = "float32") -> dict:
+    """
+    Converte as árvores de uma floresta de regressão em arrays NumPy contíguos (feature, limiar,
+    filhos, valor da folha e direção dos valores ausentes), com todas as árvores concatenadas.
+    """
+    arvores = [arvore.tree_ for arvore in modelo.estimators_]
+    contagens = np.array([arvore.node_count for arvore in arvores], dtype=np.int64)
+    inicios = np.concatenate([[0], np.cumsum(contagens)[:-1]])
+    tipo_indice = np.int32 if contagens.sum() < np.iinfo(np.int32).max else np.int64
+
+    def filhos(campo):
+        return np.concatenate([np.where(getattr(arvore, campo) < 0, -1, getattr(arvore, campo) + inicio)
+                               for arvore, inicio in zip(arvores, inicios)]).astype(tipo_indice)
+
+    threshold = np.concatenate([arvore.threshold for arvore in arvores])
+    valor = np.concatenate([arvore.value[:, 0, 0] for arvore in arvores])
+    return {
+        "feature": np.concatenate([arvore.feature for arvore in arvores]).astype(np.int32),
+        "threshold": _limiares_float32(threshold) if precisao == "float32" else threshold,
+        "esquerda": filhos("children_left"),
+        "direita": filhos("children_right"),
+        "valor": valor.astype(precisao),
+        "nan_esquerda": np.concatenate([arvore.missing_go_to_left for arvore in arvores]).astype(np.uint8),
+        "raizes": inicios.astype(tipo_indice),
+    }
+
+
+def salvar_artefato(modelo, caminho: str, backend: str = None, dados_treino: dict = None,
+                    precisao: str = "float32", compressao: str = None, nivel: int = 3,
+                    estimador_original: str = None) -> dict:
+    """
+    Salva o modelo no formato de artefato compacto: um diretório com um cabeçalho JSON (features,
+    parâmetros, hash e tamanho dos dados de treino, estatísticas das árvores) e os arrays de nós.
+
+    Florestas são gravadas como arrays de nós; sem compressão, cada array é um arquivo .npy que pode
+    ser mapeado em memória e compartilhado entre processos. Com `compressao` ('zlib', 'gzip', 'bz2'
+    ou 'lzma'), os arrays ocupam menos disco mas são carregados em memória. Outros estimadores são
+    gravados com joblib dentro do artefato, com o mesmo cabeçalho.
+
+    `estimador_original` é o arquivo joblib do mesmo modelo, gravado fora do artefato: o cabeçalho guarda
+    seu caminho relativo e seu hash, e o motor de florestas o usa para os lotes grandes (ver `FlorestaCompacta`).
+    """
+    if precisao not in PRECISOES:
+        raise ValueError(f"Precisão inválida: {precisao}. Opções: {', '.join(PRECISOES)}")
+    if compressao not in COMPRESSOES:
+        raise ValueError(f"Compressão inválida: {compressao}. Opções: {', '.join(str(c) for c in COMPRESSOES)}")
+    temporario = caminho + ".tmp"
+    shutil.rmtree(temporario, ignore_errors=True)
+    os.makedirs(temporario)
+
+    cabecalho = {
+        "formato": FORMATO,
+        "versao_formato": VERSAO_FORMATO,
+        "criado_em": datetime.now().isoformat(timespec='seconds'),
+        "backend": backend,
+        "estimador": type(modelo).__name__,
+        "sklearn": sklearn.__version__,
+        "parametros": {chave: valor for chave, valor in modelo.get_params().items()
+                       if isinstance(valor, (int, float, str, bool, type(None)))},
+        "colunas": [str(c) for c in getattr(modelo, "feature_names_in_", [])],
+        "n_features": int(getattr(modelo, "n_features_in_", 0)),
+        "dados_treino": dados_treino or {},
+        "compressao": compressao,
+    }
+    if estimador_original is not None:
+        cabecalho["estimador_original"] = {
+            "arquivo": os.path.relpath(estimador_original, os.path.dirname(os.path.abspath(caminho))),
+            "sha256": _hash_arquivo(estimador_original),
+        }
+    if _eh_floresta(modelo):
+        nos = achatar_floresta(modelo, precisao)
+        if compressao is None:
+            for campo, array in nos.items():
+                np.save(os.path.join(temporario, f"{campo}.npy"), array)
+        else:
+            joblib.dump(nos, os.path.join(temporario, ARQUIVO_NOS_COMPRIMIDOS), compress=(compressao, nivel))
+        folhas = nos["esquerda"] < 0
+        cabecalho.update({
+            "tipo": "floresta",
+            "precisao": precisao,
+            "n_arvores": len(modelo.estimators_),
+            "n_nos": int(len(nos["feature"])),
+            "n_folhas": int(folhas.sum()),
+            "profundidade_maxima": int(max(arvore.tree_.max_depth for arvore in modelo.estimators_)),
+        })
+    else:
+        joblib.dump(modelo, os.path.join(temporario, ARQUIVO_PAYLOAD), compress=(compressao, nivel) if compressao else 0)
+        cabecalho["tipo"] = "joblib"
+
+    cabecalho["tamanhos"] = {nome: os.path.getsize(os.path.join(temporario, nome)) for nome in sorted(os.listdir(temporario))}
+    cabecalho["bytes_total"] = sum(cabecalho["tamanhos"].values())
+    with open(os.path.join(temporario, ARQUIVO_CABECALHO), 'w', encoding='utf-8') as f:
+        json.dump(cabecalho, f, indent=4)
+
+    # Troca o artefato anterior pelo novo; processos que já mapearam os arquivos antigos seguem válidos
+    shutil.rmtree(caminho, ignore_errors=True)
+    os.replace(temporario, caminho)
+    logger.info(f"Artefato do modelo salvo em: {caminho} ({cabecalho['bytes_total'] / 1024 ** 2:.2f} MB)")
+    return cabecalho
+
+
+def ler_cabecalho(caminho: str) -> dict:
+    """
+    Lê apenas o cabeçalho do artefato, sem carregar o modelo.
+    """
+    with open(os.path.join(caminho, ARQUIVO_CABECALHO), 'r', encoding='utf-8') as f:
+        cabecalho = json.load(f)
+    if cabecalho.get("formato") != FORMATO:
+        raise ValueError(f"Diretório não contém um artefato de modelo válido: {caminho}")
+    return cabecalho
+
+
+class FlorestaCompacta:
+    """
+    Motor de inferência para florestas de regressão a partir dos arrays de nós achatados.
+
+    Percorre todas as árvores para todas as linhas de uma vez: cada par (árvore, linha) avança um
+    nível por iteração com operações vetorizadas (leitura da feature, comparação com o limiar e
+    escolha do filho). As folhas apontam para si mesmas, e os pares já resolvidos são descartados
+    quando passam a ser maioria. O resultado é o mesmo do RandomForestRegressor original, sem o
+    custo de despachar cada árvore separadamente. Os arrays do artefato podem ser mapeados em memória.
+
+    O percurso vetorizado só compensa em lotes pequenos: acima de `limite_percurso_vetorizado` linhas
+    (medido pelo benchmark de inferência e gravado no cabeçalho), a previsão é feita pelo estimador original
+    do scikit-learn, carregado uma única vez do arquivo joblib indicado no cabeçalho. Se esse arquivo não
+    existir ou não for o mesmo modelo (hash diferente), todos os lotes usam o percurso vetorizado.
+    """
+
+    # Quantidade máxima de pares (árvore, linha) percorridos por bloco, para manter os arrays no cache
+    PARES_POR_BLOCO = 1 << 18
+
+    def __init__(self, nos: dict, cabecalho: dict, caminho: str = None):
+        self.cabecalho = cabecalho
+        self.caminho = caminho
+        for campo in CAMPOS_NOS:
+            setattr(self, campo, nos[campo])
+        self.n_estimators = len(self.raizes)
+        self.n_features_in_ = cabecalho["n_features"]
+        self.colunas = cabecalho["colunas"]
+        if self.colunas:
+            self.feature_names_in_ = np.asarray(self.colunas, dtype=object)
+
+        # Arrays de percurso: folhas com feature 0 e os dois filhos apontando para a própria folha;
+        # os filhos ficam intercalados (direito em 2i, esquerdo em 2i + 1) para uma única leitura
+        folhas = np.asarray(self.esquerda) < 0
+        indices = np.arange(len(folhas), dtype=np.int32)
+        self._feature = np.where(folhas, 0, self.feature).astype(np.int32)
+        self._filhos = np.empty((len(folhas), 2), dtype=np.int32)
+        self._filhos[:, 0] = np.where(folhas, indices, self.direita)
+        self._filhos[:, 1] = np.where(folhas, indices, self.esquerda)
+        self._filhos = self._filhos.ravel()
+        self._nan_esquerda = np.asarray(self.nan_esquerda).astype(bool)
+        self._raizes = np.asarray(self.raizes, dtype=np.int32)
+        self.limite_percurso_vetorizado = cabecalho.get("limite_percurso_vetorizado", LIMITE_PERCURSO_VETORIZADO)
+        self._estimador = None
+
+    @classmethod
+    def de_modelo(cls, modelo, precisao: str = "float64") -> "FlorestaCompacta":
+        """
+        Cria o motor diretamente de uma floresta treinada, sem passar pelo disco.
+        """
+        if not _eh_floresta(modelo):
+            raise ValueError(f"Estimador não suportado pelo motor de florestas: {type(modelo).__name__}")
+        motor = cls(achatar_floresta(modelo, precisao), {
+            "n_features": int(modelo.n_features_in_),
+            "colunas": [str(c) for c in getattr(modelo, "feature_names_in_", [])],
+        })
+        motor._estimador = modelo
+        return motor
+
+    def _matriz(self, X) -> np.ndarray:
+        if isinstance(X, pd.DataFrame):
+            if self.colunas and list(X.columns) != self.colunas:
+                X = X[self.colunas]
+            return X.to_numpy(dtype=np.float32)
+        return np.asarray(X, dtype=np.float32)
+
+    def aplicar(self, M: np.ndarray) -> np.ndarray:
+        """
+        Retorna o índice global da folha alcançada por cada linha em cada árvore (n_arvores x n_linhas).
+        """
+        n_linhas, n_features = M.shape
+        # Par k = árvore * n_linhas + linha: pares vizinhos percorrem a mesma árvore
+        nos = np.repeat(self._raizes, n_linhas)
+        deslocamentos = np.tile(np.arange(n_linhas, dtype=np.int32) * n_features, self.n_estimators)
+        valores = np.ascontiguousarray(M).ravel()
+        tem_ausentes = bool(np.isnan(valores).any())
+        folhas = nos
+        pares, desl = None, deslocamentos
+        while True:
+            x = valores.take(desl + self._feature.take(nos))
+            para_esquerda = x <= self.threshold.take(nos)
+            if tem_ausentes:
+                para_esquerda |= np.isnan(x) & self._nan_esquerda.take(nos)
+            proximos = self._filhos.take(2 * nos + para_esquerda)
+            if pares is None:
+                folhas = proximos
+            else:
+                folhas[pares] = proximos
+            continuam = proximos != nos
+            restantes = np.count_nonzero(continuam)
+            if restantes == 0:
+                return folhas.reshape(self.n_estimators, n_linhas)
+            if restantes < len(nos) // 2:
+                selecionados = np.flatnonzero(continuam)
+                pares = selecionados if pares is None else pares.take(selecionados)
+                nos = proximos.take(selecionados)
+                desl = deslocamentos.take(pares)
+            else:
+                nos = proximos
+
+    def prever_vetorizado(self, M: np.ndarray) -> np.ndarray:
+        """
+        Previsão pelo percurso vetorizado, em blocos de até `PARES_POR_BLOCO` pares (árvore, linha).
+        """
+        bloco = max(1, self.PARES_POR_BLOCO // self.n_estimators)
+        previsoes = np.empty(len(M))
+        for inicio in range(0, len(M), bloco):
+            folhas = self.aplicar(M[inicio:inicio + bloco])
+            previsoes[inicio:inicio + bloco] = self.valor.take(folhas).sum(axis=0, dtype=np.float64) / self.n_estimators
+        return previsoes
+
+    def estimador_original(self):
+        """
+        Estimador do scikit-learn indicado no cabeçalho, carregado na primeira chamada (None se indisponível).
+        """
+        if self._estimador is None:
+            original = self.cabecalho.get("estimador_original")
+            arquivo = (os.path.join(os.path.dirname(os.path.abspath(self.caminho)), original["arquivo"])
+                       if original and self.caminho else None)
+            if arquivo is None or not os.path.exists(arquivo) or _hash_arquivo(arquivo) != original["sha256"]:
+                logger.warning(f"Estimador original do artefato indisponível ({arquivo}); "
+                               f"lotes grandes também usarão o percurso vetorizado.")
+                self.limite_percurso_vetorizado = float("inf")
+                return None
+            self._estimador = joblib.load(arquivo)
+            logger.info(f"Estimador original carregado de: {arquivo}")
+        return self._estimador
+
+    def predict(self, X) -> np.ndarray:
+        M = self._matriz(X)
+        if len(M) > self.limite_percurso_vetorizado and self.estimador_original() is not None:
+            return self._estimador.predict(pd.DataFrame(M, columns=self.colunas) if self.colunas else M)
+        return self.prever_vetorizado(M)
+
+
+def registrar_limite_percurso(caminho: str, linhas: int) -> None:
+    """
+    Grava no cabeçalho do artefato o maior lote em que o percurso vetorizado foi mais rápido que o
+    scikit-learn, usado como limite de `FlorestaCompacta` nas próximas cargas.
+    """
+    cabecalho = ler_cabecalho(caminho)
+    cabecalho["limite_percurso_vetorizado"] = int(linhas)
+    temporario = os.path.join(caminho, ARQUIVO_CABECALHO + ".tmp")
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(cabecalho, f, indent=4)
+    os.replace(temporario, os.path.join(caminho, ARQUIVO_CABECALHO))
+    logger.info(f"Limite do percurso vetorizado gravado em {caminho}: {linhas} linhas.")
+
+
+def carregar_artefato(caminho: str, mmap: bool = True):
+    """
+    Carrega um artefato de modelo. Florestas sem compressão têm os arrays de nós mapeados em memória
+    (`mmap`), de modo que vários processos compartilham as mesmas páginas.
+    """
+    cabecalho = ler_cabecalho(caminho)
+    if cabecalho["tipo"] == "joblib":
+        return joblib.load(os.path.join(caminho, ARQUIVO_PAYLOAD))
+    if cabecalho["compressao"] is None:
+        nos = {campo: np.load(os.path.join(caminho, f"{campo}.npy"), mmap_mode='r' if mmap else None)
+               for campo in CAMPOS_NOS}
+    else:
+        nos = joblib.load(os.path.join(caminho, ARQUIVO_NOS_COMPRIMIDOS))
+    return FlorestaCompacta(nos, cabecalho, caminho)
+
+
+def carregar_modelo_salvo(caminho: str):
+    """
+    Carrega um modelo salvo, seja um artefato compacto (diretório) ou um arquivo joblib.
+    """
+    if os.path.isdir(caminho):
+        return carregar_artefato(caminho)
+    return joblib.load(caminho)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Inspeciona ou gera artefatos compactos de modelo.")
+    parser.add_argument("caminho", help="Diretório do artefato a inspecionar (ou a gerar, com --exportar).")
+    parser.add_argument("--exportar", metavar="MODELO_PKL",
+                        help="Gera o artefato em `caminho` a partir de um modelo salvo com joblib.")
+    parser.add_argument("--precisao", choices=PRECISOES, default="float32",
+                        help="Precisão dos limiares e valores das folhas (padrão: float32).")
+    parser.add_argument("--compressao", choices=[c for c in COMPRESSOES if c], default=None,
+                        help="Compressão dos arrays de nós (desativa o mapeamento em memória).")
+    parser.add_argument("--nivel", type=int, default=3, help="Nível de compressão (padrão: 3).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.exportar:
+        salvar_artefato(joblib.load(args.exportar), args.caminho, precisao=args.precisao,
+                        compressao=args.compressao, nivel=args.nivel, estimador_original=args.exportar)
+    print(json.dumps(ler_cabecalho(args.caminho), indent=4, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
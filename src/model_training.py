@@ -1,53 +1,245 @@
 #!/usr/bin/env python
 import os
-import warnings
+import time
+import argparse
 import joblib
 import pandas as pd
 import json
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split, GridSearchCV, cross_val_score
+from sklearn.base import clone
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import (train_test_split, GridSearchCV, HalvingGridSearchCV, ParameterGrid,
+                                     ParameterSampler, cross_validate)
 from sklearn.metrics import mean_squared_error, r2_score
 import logging
 
+from data_storage import carregar_tabela, aplicar_esquema, ESQUEMA_PROCESSADO, matriz_compartilhada
+from data_processing import tratar_valores_ausentes, remover_outliers, CAMINHO_PROCESSADOS
+from feature_engineering import (transformar_variavel_alvo, aplicar_pipeline_features, atualizar_pipeline_features,
+                                 deriva_normalizacao,
+                                 salvar_pipeline_features, decodificar_categorias, separar_treino_teste,
+                                 carregar_ou_gerar_features, CAMINHO_FEATURES)
+from model_artifact import descrever_dados, ler_cabecalho
+from model_backends import obter_backend, listar_backends, definir_modelo_ativo, obter_modelo_ativo, medir_desempenho
+from model_versions import registrar_versao, restaurar_versao, ultima_versao, descrever_janela
+from instrumentation import instrumentar, MonitorWorkers
+from memory_budget import estimar_tamanho_floresta_mb, tamanho_floresta_mb
+
 # Configuração do logger
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 def load_data(filepath: str) -> pd.DataFrame:
     """
-    Carrega os dados a partir de um arquivo CSV.
+    Carrega os dados a partir de um arquivo Parquet ou CSV.
     """
     try:
-        df = pd.read_csv(filepath)
+        df = carregar_tabela(filepath)
         logger.info(f"Dados carregados com sucesso de: {filepath}")
         return df
     except Exception as e:
         logger.error(f"Erro ao carregar o arquivo '{filepath}': {e}", exc_info=True)
         raise
 
-def train_model(X_train, y_train):
+MODOS_BUSCA = ("grid", "halving", "adaptativa")
+
+N_FOLDS = 5
+
+CAMINHO_MODELO = os.path.join("models", "random_forest.pkl")
+CAMINHO_PIPELINE = os.path.join("models", "feature_pipeline.pkl")
+CAMINHO_TESTE = os.path.join("reports", "model_training", "previsoes_teste.parquet")
+
+
+def _custo_grid(grade: dict, estimador) -> (int, int):
+    """
+    Custo da busca que `--busca grid` executa com a mesma grade: todos os candidatos em 5 folds mais o reajuste
+    final e, para florestas, as árvores treinadas na validação cruzada (as mesmas contadas por `_contar_ajustes`).
+    """
+    candidatos = list(ParameterGrid(grade))
+    ajustes = len(candidatos) * N_FOLDS + 1
+    if "n_estimators" not in estimador.get_params():
+        return ajustes, None
+    return ajustes, sum(params.get('n_estimators', estimador.n_estimators) for params in candidatos) * N_FOLDS
+
+
+def _busca_grid(estimador, grade, X_train, y_train, n_jobs=-1):
+    busca = GridSearchCV(estimator=estimador, param_grid=grade, cv=N_FOLDS,
+                         scoring='neg_mean_squared_error', n_jobs=n_jobs, verbose=1, error_score='raise')
+    busca.fit(X_train, y_train)
+    return (busca.best_estimator_, busca.best_params_, busca.cv_results_, busca.best_index_,
+            {"tempo_ajuste_final_s": busca.refit_time_})
+
+
+def _busca_halving(estimador, grade, argumentos, X_train, y_train, n_jobs=-1):
+    """
+    Successive halving: todas as combinações começam com poucos recursos (árvores ou amostras, conforme
+    o backend) e, a cada rodada, apenas as melhores seguem com mais recursos.
+    """
+    busca = HalvingGridSearchCV(estimator=estimador, param_grid=grade, cv=N_FOLDS, **argumentos,
+                                scoring='neg_mean_squared_error', n_jobs=n_jobs, verbose=1, error_score='raise',
+                                random_state=42)
+    busca.fit(X_train, y_train)
+    unidade = "árvores" if argumentos["resource"] == "n_estimators" else "amostras"
+    detalhes = {"tempo_ajuste_final_s": busca.refit_time_,
+                "rodadas": [f"{c} candidatos com {r} {unidade}" for c, r in zip(busca.n_candidates_, busca.n_resources_)]}
+    return busca.best_estimator_, busca.best_params_, busca.cv_results_, busca.best_index_, detalhes
+
+
+def _busca_adaptativa(estimador, grade, X_train, y_train, orcamento_s=None, paciencia=10, max_candidatos=None, n_jobs=-1):
+    """
+    Amostragem aleatória da grade, avaliando um candidato por vez, até esgotar o orçamento de tempo,
+    atingir `max_candidatos` ou passar `paciencia` candidatos seguidos sem melhora (parada antecipada).
+    """
+    total = len(ParameterGrid(grade))
+    max_candidatos = total if max_candidatos is None else min(max_candidatos, total)
+    resultados = {"params": [], "mean_test_score": [], "std_test_score": [], "mean_fit_time": []}
+    melhor, sem_melhora, motivo = -1, 0, "grade esgotada"
+    inicio = time.perf_counter()
+    for params in ParameterSampler(grade, n_iter=max_candidatos, random_state=42):
+        decorrido = time.perf_counter() - inicio
+        if resultados["params"] and orcamento_s is not None:
+            # Não inicia um candidato que, pela média dos anteriores, estouraria o orçamento
+            if decorrido + decorrido / len(resultados["params"]) > orcamento_s:
+                motivo = "orçamento de tempo"
+                break
+        if paciencia is not None and sem_melhora >= paciencia:
+            motivo = "parada antecipada"
+            break
+        cv = cross_validate(clone(estimador).set_params(**params), X_train, y_train, cv=N_FOLDS,
+                            scoring='neg_mean_squared_error', n_jobs=n_jobs, error_score='raise')
+        resultados["params"].append(params)
+        resultados["mean_test_score"].append(cv["test_score"].mean())
+        resultados["std_test_score"].append(cv["test_score"].std())
+        resultados["mean_fit_time"].append(cv["fit_time"].mean())
+        if melhor < 0 or resultados["mean_test_score"][-1] > resultados["mean_test_score"][melhor]:
+            melhor, sem_melhora = len(resultados["params"]) - 1, 0
+        else:
+            sem_melhora += 1
+        logger.info(f"Candidato {len(resultados['params'])}/{max_candidatos}: {params} "
+                    f"(MSE {-resultados['mean_test_score'][-1]:.4f})")
+    else:
+        if len(resultados["params"]) < total:
+            motivo = "limite de candidatos"
+    resultados = {chave: np.array(valores) if chave != "params" else valores for chave, valores in resultados.items()}
+    best_params = resultados["params"][melhor]
+    inicio_ajuste = time.perf_counter()
+    best_model = clone(estimador).set_params(**best_params).fit(X_train, y_train)
+    detalhes = {"tempo_ajuste_final_s": time.perf_counter() - inicio_ajuste, "motivo_parada": motivo}
+    return best_model, best_params, resultados, melhor, detalhes
+
+
+def _contar_ajustes(cv_results: dict, estimador) -> (int, int):
     """
-    Treina o modelo RandomForestRegressor utilizando GridSearchCV para otimização dos hiperparâmetros.
-    Retorna o melhor modelo encontrado, os melhores parâmetros e o erro médio da validação cruzada.
+    Conta os ajustes realizados pela busca (folds de cada candidato mais o reajuste final) e, para
+    florestas, o total de árvores treinadas, usando o número de árvores de cada candidato.
     """
-    rf = RandomForestRegressor(random_state=42)
-    param_grid = {
-        'n_estimators': [50, 100, 200],
-        'max_depth': [10, 20, 30],
-        'min_samples_split': [2, 5, 10],
-        'min_samples_leaf': [1, 2, 4]
+    ajustes = len(cv_results["params"]) * N_FOLDS + 1
+    if "n_estimators" not in estimador.get_params():
+        return ajustes, None
+    if "n_resources" in cv_results and "n_estimators" in cv_results["params"][0]:
+        arvores = np.asarray(cv_results["n_resources"])
+    else:
+        arvores = np.array([params.get('n_estimators', estimador.n_estimators) for params in cv_results["params"]])
+    return ajustes, int(arvores.sum()) * N_FOLDS
+
+
+def _restaurar_nomes_features(modelo, X) -> None:
+    # O ajuste sobre a matriz compartilhada não registra os nomes das colunas; sem eles, o modelo não validaria
+    # os DataFrames recebidos na previsão. Pipelines convertem a entrada em array no primeiro passo e não os usam.
+    if hasattr(X, "columns") and hasattr(modelo, "n_features_in_") and not hasattr(modelo, "steps"):
+        modelo.feature_names_in_ = np.asarray(X.columns, dtype=object)
+
+@instrumentar
+def train_model(X_train, y_train, busca: str = "grid", orcamento_s: float = None, paciencia: int = 10,
+                max_candidatos: int = None, backend: str = "random_forest", categorias: dict = None,
+                memoria_mb: float = None):
+    """
+    Treina o modelo do `backend` (RandomForestRegressor por padrão) otimizando os hiperparâmetros conforme
+    o modo de `busca`: 'grid' (grade exaustiva), 'halving' (successive halving) ou 'adaptativa'
+    (amostragem aleatória com orçamento de tempo e parada antecipada).
+    Com `memoria_mb`, a busca segue o plano do backend para esse orçamento de RAM: menos workers em paralelo
+    e, para florestas, bootstrap subamostrado e limite de folhas (ver `memory_budget.planejar_treino`).
+    O erro da validação cruzada vem dos próprios resultados da busca, sem reajustar o melhor modelo.
+    Retorna o melhor modelo, os melhores parâmetros e um resumo da busca.
+    """
+    if busca not in MODOS_BUSCA:
+        raise ValueError(f"Modo de busca desconhecido: {busca}. Opções: {', '.join(MODOS_BUSCA)}")
+    especificacao = obter_backend(backend)
+    estimador = especificacao.criar_estimador(X_train, categorias)
+    grade = especificacao.grade
+    n_jobs, plano = -1, None
+    if memoria_mb is not None:
+        plano = especificacao.planejar_memoria(len(X_train), X_train.shape[1], memoria_mb, N_FOLDS)
+        estimador.set_params(**plano["parametros"])
+        n_jobs = plano["workers"]
+    inicio = time.perf_counter()
+    # A matriz de treino é montada uma única vez, em float32 e na memória compartilhada: os workers da
+    # validação cruzada mapeiam o mesmo arquivo em vez de receber, cada um, uma cópia do DataFrame
+    with matriz_compartilhada(X_train, y_train) as (M, y_compartilhado), MonitorWorkers() as monitor:
+        if busca == "grid":
+            best_model, best_params, cv_results, best_index, detalhes = _busca_grid(estimador, grade, M, y_compartilhado, n_jobs)
+        elif busca == "halving":
+            grade_halving, argumentos = especificacao.parametros_halving()
+            best_model, best_params, cv_results, best_index, detalhes = _busca_halving(
+                estimador, grade_halving, argumentos, M, y_compartilhado, n_jobs)
+        else:
+            best_model, best_params, cv_results, best_index, detalhes = _busca_adaptativa(
+                estimador, grade, M, y_compartilhado, orcamento_s=orcamento_s, paciencia=paciencia,
+                max_candidatos=max_candidatos, n_jobs=n_jobs)
+    tempo_total = time.perf_counter() - inicio
+    _restaurar_nomes_features(best_model, X_train)
+
+    mean_cv_score = -cv_results["mean_test_score"][best_index]
+    ajustes, arvores = _contar_ajustes(cv_results, estimador)
+    ajustes_grid, arvores_grid = _custo_grid(grade, estimador)
+    resumo = {
+        "backend": backend,
+        "modo": busca,
+        "tempo_total_s": tempo_total,
+        "candidatos_avaliados": len(cv_results["params"]),
+        "ajustes_realizados": ajustes,
+        "ajustes_grid": ajustes_grid,
+        "ajustes_evitados": ajustes_grid - ajustes,
+        "mse_validacao_cruzada": float(mean_cv_score),
+        "memoria": monitor.resumo(),
+        **detalhes,
     }
-    grid_search = GridSearchCV(estimator=rf, param_grid=param_grid, cv=5,
-                               scoring='neg_mean_squared_error', n_jobs=-1, verbose=1, error_score='raise')
-    grid_search.fit(X_train, y_train)
-    best_model = grid_search.best_estimator_
-    best_params = grid_search.best_params_
-    cv_scores = cross_val_score(best_model, X_train, y_train, cv=5, scoring='neg_mean_squared_error')
-    mean_cv_score = -cv_scores.mean()
-    logger.info(f"Melhores hiperparâmetros encontrados: {best_params}")
+    if arvores is not None:
+        resumo["arvores_treinadas"] = arvores
+        resumo["arvores_grid"] = arvores_grid
+    if plano is not None:
+        resumo["orcamento"] = _comparar_orcamento(plano, resumo["memoria"], best_model, len(X_train))
+    logger.info(f"Melhores hiperparâmetros encontrados ({backend}): {best_params}")
     logger.info(f"Erro quadrático médio na validação cruzada: {mean_cv_score:.4f}")
-    return best_model, best_params
+    logger.info(f"Busca '{busca}' concluída em {tempo_total:.2f}s com {ajustes} ajustes "
+                f"({ajustes_grid - ajustes} evitados em relação à busca grid)")
+    logger.info(f"Memória na busca: {resumo['memoria']}")
+    if plano is not None:
+        logger.info(f"Orçamento de memória: {resumo['orcamento']}")
+        if resumo["orcamento"]["pico_excedido"]:
+            logger.warning(f"Pico de memória real ({resumo['orcamento']['pico_real_mb']:.0f} MB) acima do estimado "
+                           f"({resumo['orcamento']['pico_estimado_mb']:.0f} MB).")
+    return best_model, best_params, resumo
+
+
+def _comparar_orcamento(plano: dict, memoria: dict, modelo, n_linhas: int) -> dict:
+    """
+    Compara o plano de memória com o observado: o pico real soma o RSS do processo principal ao pico de
+    memória exclusiva (USS) de cada worker; o tamanho do modelo é o dos nós das árvores da floresta final.
+    `pico_excedido` indica que o pico real passou do estimado (as constantes do plano subestimaram o uso).
+    """
+    parametros = modelo.get_params() if hasattr(modelo, "estimators_") else None
+    pico_real = memoria["principal_rss_pico_mb"] + sum(memoria["workers_uss_pico_mb"])
+    return {
+        "memoria_mb": plano["memoria_mb"],
+        "workers": plano["workers"],
+        "parametros": plano["parametros"],
+        "pico_estimado_mb": plano["estimativa"]["pico_total_mb"],
+        "pico_real_mb": pico_real,
+        "pico_excedido": pico_real > plano["estimativa"]["pico_total_mb"],
+        "modelo_estimado_mb": estimar_tamanho_floresta_mb(n_linhas, parametros) if parametros else None,
+        "modelo_real_mb": tamanho_floresta_mb(modelo),
+    }
 
 def save_model(model, path: str):
     """
@@ -66,13 +258,17 @@ def salvar_best_params(best_params: dict, path: str):
         json.dump(best_params, f, indent=4)
     logger.info(f"Melhores hiperparâmetros salvos em: {path}")
 
-def gerar_relatorio_treinamento(best_params: dict, caminho_report: str, test_metrics: dict = None) -> None:
+def gerar_relatorio_treinamento(best_params: dict, caminho_report: str, test_metrics: dict = None,
+                                resumo_busca: dict = None, comparacao: dict = None) -> None:
     """
-    Gera um relatório TXT contendo o resumo do treinamento do modelo, incluindo os melhores hiperparâmetros e, opcionalmente, as métricas do conjunto de teste.
+    Gera um relatório TXT contendo o resumo do treinamento do modelo, incluindo os melhores hiperparâmetros e, opcionalmente, as métricas do conjunto de teste,
+    o custo da busca de hiperparâmetros e a comparação entre os backends treinados.
     """
     with open(caminho_report, 'w', encoding='utf-8') as f:
         f.write("RELATÓRIO DE TREINAMENTO DO MODELO\n")
         f.write("-----------------------------------\n")
+        if resumo_busca and "backend" in resumo_busca:
+            f.write(f"Backend: {resumo_busca['backend']}\n")
         f.write("Melhores hiperparâmetros encontrados:\n")
         for param, value in best_params.items():
             f.write(f" - {param}: {value}\n")
@@ -80,41 +276,290 @@ def gerar_relatorio_treinamento(best_params: dict, caminho_report: str, test_met
             f.write("\nAvaliação no conjunto de teste:\n")
             for metric, value in test_metrics.items():
                 f.write(f" - {metric}: {value:.4f}\n")
+        if resumo_busca:
+            f.write("\nBusca de hiperparâmetros:\n")
+            f.write(f" - Modo: {resumo_busca['modo']}\n")
+            f.write(f" - Tempo total: {resumo_busca['tempo_total_s']:.2f}s\n")
+            f.write(f" - Candidatos avaliados: {resumo_busca['candidatos_avaliados']}\n")
+            f.write(f" - Ajustes realizados: {resumo_busca['ajustes_realizados']}\n")
+            f.write(f" - Ajustes evitados (vs. busca grid com {resumo_busca['ajustes_grid']} ajustes): {resumo_busca['ajustes_evitados']}\n")
+            if "arvores_treinadas" in resumo_busca:
+                f.write(f" - Árvores treinadas: {resumo_busca['arvores_treinadas']} "
+                        f"(busca grid: {resumo_busca['arvores_grid']})\n")
+            f.write(f" - MSE na validação cruzada: {resumo_busca['mse_validacao_cruzada']:.4f}\n")
+            memoria = resumo_busca.get("memoria")
+            if memoria:
+                f.write(f" - Pico de memória do processo principal: {memoria['principal_rss_pico_mb']:.1f} MB (RSS), "
+                        f"{memoria['principal_uss_pico_mb']:.1f} MB (USS)\n")
+                if memoria["workers"]:
+                    f.write(f" - Pico de memória exclusiva (USS) por worker, em MB: {memoria['workers_uss_pico_mb']}\n")
+                    f.write(f" - Workers que caberiam na memória disponível: {memoria['workers_suportados_memoria']}\n")
+            orcamento = resumo_busca.get("orcamento")
+            if orcamento:
+                limites = ", ".join(f"{param}={valor:.4g}" for param, valor in orcamento["parametros"].items())
+                f.write(f" - Orçamento de memória: {orcamento['memoria_mb']:.0f} MB, com {orcamento['workers']} worker(s) "
+                        f"e limites: {limites or 'nenhum'}\n")
+                f.write(f" - Pico de memória estimado / real: {orcamento['pico_estimado_mb']:.1f} MB / "
+                        f"{orcamento['pico_real_mb']:.1f} MB"
+                        f"{' (ATENÇÃO: pico real acima do estimado)' if orcamento.get('pico_excedido') else ''}\n")
+                if orcamento["modelo_real_mb"] is not None:
+                    f.write(f" - Tamanho do modelo estimado / real: {orcamento['modelo_estimado_mb']:.1f} MB / "
+                            f"{orcamento['modelo_real_mb']:.1f} MB\n")
+            if "motivo_parada" in resumo_busca:
+                f.write(f" - Motivo da parada: {resumo_busca['motivo_parada']}\n")
+            for rodada in resumo_busca.get("rodadas", []):
+                f.write(f" - Rodada: {rodada}\n")
+        if comparacao:
+            f.write("\nComparação entre backends (conjunto de teste):\n")
+            f.write(pd.DataFrame(comparacao).T.to_string(float_format=lambda v: f"{v:.4f}"))
+            f.write("\n")
     logger.info(f"Relatório de treinamento gerado em: {caminho_report}")
 
-def main():
-    logger.info("=== Executando model_training.py ===")
-    caminho_dados = os.path.join("data", "final", "nyc_rental_data_features.csv")
-    df = load_data(caminho_dados)
-    
-    target_column = 'price_log'
+def split_features_target(df: pd.DataFrame, target_column: str = 'price_log'):
+    """
+    Separa o dataset final em features e alvo.
+    """
     # Remover colunas vazadoras e irrelevantes: price, id e host_id
     features_to_drop = [target_column, 'price', 'id', 'host_id']
     X = df.drop(columns=features_to_drop, errors='ignore')
     y = df[target_column]
-    
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    
-    best_model, best_params = train_model(X_train, y_train)
-    
-    # Avaliação no conjunto de teste
-    y_pred_test = best_model.predict(X_test)
-    rmse_test = np.sqrt(mean_squared_error(y_test, y_pred_test))
-    r2_test = r2_score(y_test, y_pred_test)
-    test_metrics = {"RMSE": rmse_test, "R2": r2_test}
-    logger.info(f"Avaliação no conjunto de teste - RMSE: {rmse_test:.4f}, R2: {r2_test:.4f}")
-    
-    # Salvar apenas os modelos treinados na pasta models
-    caminho_modelo = os.path.join("models", "random_forest.pkl")
-    save_model(best_model, caminho_modelo)
-    
+    return X, y
+
+@instrumentar
+def executar(X: pd.DataFrame, y: pd.Series, busca: str = "grid", orcamento_s: float = None, janela: dict = None,
+             backends=("random_forest",), categorias: dict = None, memoria_mb: float = None) -> dict:
+    """
+    Executa a etapa de treinamento sobre as features e o alvo já carregados: separa treino e teste,
+    otimiza (conforme o modo de `busca`) e avalia cada um dos `backends` e salva os modelos, os hiperparâmetros e o relatório.
+    O primeiro backend passa a ser o modelo ativo (usado na avaliação e na previsão); os demais servem de comparação
+    em tempo de ajuste, tamanho em disco, vazão em lote e latência por linha, ao lado de RMSE e R².
+    `categorias` são os vocabulários do pipeline de features, usados pelos backends com suporte nativo a categorias.
+    `memoria_mb` ativa o treino com orçamento de RAM (ver `train_model`).
+    O modelo ativo é registrado como uma nova versão completa, com a janela de dados informada, e o conjunto de teste
+    é salvo com as previsões do modelo ativo (ver `salvar_conjunto_teste`).
+    Retorna o modelo ativo, os hiperparâmetros, as métricas de teste, o resumo da busca, a comparação e o conjunto de teste.
+    """
+    # A mesma separação usada no ajuste do pipeline de features
+    posicoes_treino, posicoes_teste = separar_treino_teste(len(X))
+    X_train, X_test = X.iloc[posicoes_treino], X.iloc[posicoes_teste]
+    y_train, y_test = y.iloc[posicoes_treino], y.iloc[posicoes_teste]
+
+    resultados = {}
+    comparacao = {}
+    for nome in backends:
+        modelo, params, resumo_busca = train_model(X_train, y_train, busca=busca, orcamento_s=orcamento_s,
+                                                   backend=nome, categorias=categorias, memoria_mb=memoria_mb)
+        # Avaliação no conjunto de teste
+        test_metrics = _metricas(modelo, X_test, y_test)
+        logger.info(f"Avaliação no conjunto de teste ({nome}) - RMSE: {test_metrics['RMSE']:.4f}, R2: {test_metrics['R2']:.4f}")
+        # Salvar apenas os modelos treinados na pasta models
+        especificacao = obter_backend(nome)
+        caminho_modelo = especificacao.salvar(modelo, dados_treino=descrever_dados(X_train, y_train))
+        comparacao[nome] = {
+            **test_metrics,
+            "busca_s": resumo_busca["tempo_total_s"],
+            "ajuste_s": resumo_busca["tempo_ajuste_final_s"],
+            "tamanho_mb": os.path.getsize(caminho_modelo) / 1024 ** 2,
+            "artefato_mb": ler_cabecalho(especificacao.caminho_artefato())["bytes_total"] / 1024 ** 2,
+            **medir_desempenho(modelo, X_test),
+        }
+        resultados[nome] = (modelo, params, test_metrics, resumo_busca)
+
+    principal = backends[0]
+    best_model, best_params, test_metrics, resumo_busca = resultados[principal]
+    definir_modelo_ativo(principal)
+
     # Salvar os melhores hiperparâmetros na pasta de relatórios
     best_params_path = os.path.join("reports", "model_training", "best_params.json")
     salvar_best_params(best_params, best_params_path)
-    
+
+    report_dir = os.path.join("reports", "model_training")
+    os.makedirs(report_dir, exist_ok=True)
+    gerar_relatorio_treinamento(best_params, os.path.join(report_dir, "model_training_report.txt"), test_metrics,
+                                resumo_busca, comparacao)
+    registro = registrar_versao("completo", janela or {"linhas": int(len(X))}, metricas=test_metrics,
+                                detalhes={"backend": principal, "n_estimators": getattr(best_model, "n_estimators", None),
+                                          "best_params": best_params})
+    teste = salvar_conjunto_teste(posicoes_teste, X_test, y_test, best_model.predict(X_test), categorias,
+                                  versao=registro["versao"])
+    return {
+        "model": best_model,
+        "best_params": best_params,
+        "test_metrics": test_metrics,
+        "resumo_busca": resumo_busca,
+        "comparacao": comparacao,
+        "X_test": X_test,
+        "y_test": y_test,
+        "teste": teste
+    }
+
+def salvar_conjunto_teste(posicoes, X_test: pd.DataFrame, y_test, y_pred, categorias: dict = None,
+                          caminho: str = CAMINHO_TESTE, versao: str = None) -> pd.DataFrame:
+    """
+    Salva o conjunto de teste separado no treinamento: a posição de cada linha no dataset de features,
+    o valor real e o previsto pelo modelo ativo e as variáveis categóricas reconstruídas das dummies,
+    usadas pela avaliação para as métricas por fatia sem refazer a separação nem a previsão.
+    `versao` é a versão do modelo que fez as previsões; a avaliação recusa o arquivo se o modelo ativo for outro.
+    """
+    teste = pd.DataFrame({"indice": np.asarray(posicoes, dtype=np.int64), "y_true": np.asarray(y_test, dtype=np.float64),
+                          "y_pred": np.asarray(y_pred, dtype=np.float64)})
+    teste = pd.concat([teste, decodificar_categorias(X_test, categorias).reset_index(drop=True)], axis=1)
+    return _gravar_conjunto_teste(teste, versao, caminho)
+
+def _gravar_conjunto_teste(teste: pd.DataFrame, versao: str, caminho: str) -> pd.DataFrame:
+    teste = teste.assign(versao_modelo=versao)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    teste.to_parquet(caminho, index=False)
+    logger.info(f"Conjunto de teste ({len(teste)} linhas) e previsões da versão {versao} salvos em: {caminho}")
+    return teste
+
+def atualizar_conjunto_teste(modelo, pipeline: dict, versao: str, caminho: str = CAMINHO_TESTE,
+                             caminho_processados: str = CAMINHO_PROCESSADOS):
+    """
+    Refaz as previsões do conjunto de teste salvo com o modelo e o pipeline atuais (após uma atualização
+    incremental), a partir das mesmas linhas dos dados processados. Se os dados processados não estiverem
+    disponíveis ou não corresponderem ao conjunto salvo, ele é mantido com a versão antiga, e a avaliação o recusa.
+    """
+    if not os.path.exists(caminho):
+        return None
+    teste = carregar_tabela(caminho)
+    if not os.path.exists(caminho_processados):
+        logger.warning(f"{caminho_processados} não encontrado; as previsões de {caminho} não foram refeitas "
+                       f"e a avaliação não as usará com a versão {versao}.")
+        return None
+    linhas = transformar_variavel_alvo(carregar_tabela(caminho_processados))
+    if teste["indice"].max() >= len(linhas) or not np.allclose(
+            linhas["price_log"].to_numpy()[teste["indice"].to_numpy()], teste["y_true"].to_numpy()):
+        logger.warning(f"Os dados de {caminho_processados} não correspondem ao conjunto de teste salvo; "
+                       f"as previsões não foram refeitas e a avaliação não as usará com a versão {versao}.")
+        return None
+    linhas = linhas.iloc[teste["indice"].to_numpy()]
+    teste["y_pred"] = modelo.predict(aplicar_pipeline_features(linhas, pipeline))
+    return _gravar_conjunto_teste(teste, versao, caminho)
+
+def _metricas(modelo, X, y) -> dict:
+    y_pred = modelo.predict(X)
+    return {"RMSE": float(np.sqrt(mean_squared_error(y, y_pred))), "R2": float(r2_score(y, y_pred))}
+
+def gerar_relatorio_incremental(registro: dict, caminho_report: str, metricas_antes: dict, tempo_total: float) -> None:
+    """
+    Gera um relatório TXT da atualização incremental: versão, janela de dados, árvores adicionadas e
+    métricas na validação dos novos dados antes e depois da atualização.
+    """
+    with open(caminho_report, 'w', encoding='utf-8') as f:
+        f.write("RELATÓRIO DE ATUALIZAÇÃO INCREMENTAL DO MODELO\n")
+        f.write("----------------------------------------------\n")
+        f.write(f"Versão: {registro['versao']} (base: {registro['base']})\n")
+        f.write(f"Tempo total: {tempo_total:.2f}s\n")
+        f.write(f"Árvores: {registro['arvores_anteriores']} -> {registro['n_estimators']}\n")
+        f.write("Maior deslocamento da média desde o ajuste do scaler (em desvios-padrão):\n")
+        for coluna, deslocamento in registro["deriva_normalizacao"].items():
+            f.write(f" - {coluna}: {deslocamento:+.3f}\n")
+        f.write("Janela de dados:\n")
+        for chave, valor in registro["janela"].items():
+            f.write(f" - {chave}: {valor}\n")
+        if metricas_antes:
+            f.write("\nValidação nos novos dados (antes -> depois):\n")
+            for metrica, valor in metricas_antes.items():
+                f.write(f" - {metrica}: {valor:.4f} -> {registro['metricas'][metrica]:.4f}\n")
+    logger.info(f"Relatório de atualização incremental gerado em: {caminho_report}")
+
+@instrumentar
+def executar_incremental(caminho_novos: str, n_arvores: int = 50, fracao_validacao: float = 0.2) -> dict:
+    """
+    Atualiza o modelo salvo com novos anúncios (no formato dos dados brutos), sem refazer a busca
+    de hiperparâmetros: `n_arvores` árvores treinadas nos novos dados são acrescentadas à floresta (warm start).
+    As árvores existentes não são alteradas: o scaler continua congelado, e as novas árvores recebem os novos
+    dados normalizados por ele. As estatísticas de normalização são atualizadas incrementalmente e ficam no
+    pipeline, com o deslocamento da média de cada coluna no relatório (ver `atualizar_pipeline_features`).
+    A atualização é registrada como uma nova versão, e as previsões do conjunto de teste salvo são refeitas
+    com o modelo atualizado (ver `atualizar_conjunto_teste`).
+    """
+    if obter_modelo_ativo() != "random_forest":
+        raise ValueError("A atualização incremental só é suportada com o backend random_forest ativo.")
+    inicio = time.perf_counter()
+    df = carregar_tabela(caminho_novos)
+    janela = descrever_janela(df, caminho_novos)
+    df = remover_outliers(tratar_valores_ausentes(df), "price")
+    df = transformar_variavel_alvo(aplicar_esquema(df, ESQUEMA_PROCESSADO))
+    if fracao_validacao > 0:
+        treino, validacao = train_test_split(df, test_size=fracao_validacao, random_state=42)
+    else:
+        treino, validacao = df, None
+
+    modelo = joblib.load(CAMINHO_MODELO)
+    pipeline = joblib.load(CAMINHO_PIPELINE)
+    # Modelos treinados antes do versionamento são registrados como base antes da atualização
+    base = ultima_versao() or registrar_versao("completo", {"origem": None})
+    metricas_antes = {}
+    if validacao is not None:
+        metricas_antes = _metricas(modelo, aplicar_pipeline_features(validacao, pipeline), validacao["price_log"])
+
+    novo_pipeline = atualizar_pipeline_features(treino, pipeline)
+    deriva = deriva_normalizacao(novo_pipeline)
+    deriva = deriva.reindex(deriva.abs().sort_values(ascending=False).index).head(5)
+    arvores_anteriores = modelo.n_estimators
+    modelo.set_params(warm_start=True, n_estimators=arvores_anteriores + n_arvores)
+    modelo.fit(aplicar_pipeline_features(treino, novo_pipeline), treino["price_log"])
+    modelo.set_params(warm_start=False)
+    logger.info(f"{n_arvores} árvores acrescentadas ao modelo com {len(treino)} novos registros "
+                f"(total de {modelo.n_estimators} árvores).")
+
+    metricas = {}
+    if validacao is not None:
+        metricas = _metricas(modelo, aplicar_pipeline_features(validacao, novo_pipeline), validacao["price_log"])
+        logger.info(f"Validação nos novos dados - RMSE: {metricas_antes['RMSE']:.4f} -> {metricas['RMSE']:.4f}, "
+                    f"R2: {metricas_antes['R2']:.4f} -> {metricas['R2']:.4f}")
+
+    obter_backend("random_forest").salvar(modelo, dados_treino=descrever_dados(
+        aplicar_pipeline_features(treino, novo_pipeline), treino["price_log"]))
+    salvar_pipeline_features(novo_pipeline, CAMINHO_PIPELINE)
+    registro = registrar_versao("incremental", janela, metricas=metricas, base=base["versao"],
+                                detalhes={"n_estimators": modelo.n_estimators, "arvores_anteriores": arvores_anteriores,
+                                          "deriva_normalizacao": {coluna: float(valor) for coluna, valor in deriva.items()}})
+    atualizar_conjunto_teste(modelo, novo_pipeline, registro["versao"])
+
     report_dir = os.path.join("reports", "model_training")
     os.makedirs(report_dir, exist_ok=True)
-    gerar_relatorio_treinamento(best_params, os.path.join(report_dir, "model_training_report.txt"), test_metrics)
+    gerar_relatorio_incremental(registro, os.path.join(report_dir, "incremental_report.txt"), metricas_antes,
+                                time.perf_counter() - inicio)
+    return {"model": modelo, "pipeline": novo_pipeline, "versao": registro}
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Treina o modelo de previsão de preços.")
+    parser.add_argument("--busca", choices=MODOS_BUSCA, default="grid",
+                        help="Modo de busca de hiperparâmetros (padrão: grid).")
+    parser.add_argument("--orcamento-s", type=float, default=None,
+                        help="Orçamento de tempo, em segundos, para a busca adaptativa.")
+    parser.add_argument("--backends", nargs="+", choices=listar_backends(), default=["random_forest"],
+                        help="Backends a treinar e comparar; o primeiro passa a ser o modelo ativo (padrão: random_forest).")
+    parser.add_argument("--memoria-mb", type=float, default=None,
+                        help="Orçamento de RAM, em MB, para o treino: limita os workers da busca e, para florestas, "
+                             "o bootstrap e o tamanho das árvores.")
+    parser.add_argument("--incremental", metavar="CAMINHO",
+                        help="Atualiza o modelo salvo com novos anúncios (CSV ou Parquet no formato dos dados brutos).")
+    parser.add_argument("--arvores", type=int, default=50,
+                        help="Árvores acrescentadas na atualização incremental (padrão: 50).")
+    parser.add_argument("--restaurar", metavar="VERSAO",
+                        help="Restaura os artefatos de uma versão registrada (ex.: v0003).")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    logger.info("=== Executando model_training.py ===")
+    if args.restaurar:
+        restaurar_versao(args.restaurar)
+        return
+    if args.incremental:
+        executar_incremental(args.incremental, n_arvores=args.arvores)
+        logger.info("Atualização incremental do modelo concluída com sucesso.")
+        return
+    # Matriz de features mapeada em memória, sem cópia nem parsing
+    caminho_base = CAMINHO_FEATURES
+    X, y = carregar_ou_gerar_features()
+    categorias = joblib.load(CAMINHO_PIPELINE)["categorias"] if os.path.exists(CAMINHO_PIPELINE) else None
+    executar(X, y, busca=args.busca, orcamento_s=args.orcamento_s, janela={"origem": caminho_base, "linhas": int(len(X))},
+             backends=args.backends, categorias=categorias, memoria_mb=args.memoria_mb)
     
     logger.info("Treinamento do modelo concluído com sucesso.\nMódulo model_training executado com sucesso.")
 
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+import os
+import json
+import shutil
+import logging
+from datetime import datetime
+
+import pandas as pd
+
+from stage_cache import hash_arquivo
+
+# Configuração do logger
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DIRETORIO_VERSOES = os.path.join("models", "versoes")
+ARQUIVO_MODELO_ATIVO = "modelo_ativo.json"
+ARTEFATOS_PADRAO = (
+    os.path.join("models", "random_forest.pkl"),
+    os.path.join("models", "hist_gradient_boosting.pkl"),
+    os.path.join("models", "random_forest.modelo"),
+    os.path.join("models", "hist_gradient_boosting.modelo"),
+    os.path.join("models", "modelo_ativo.json"),
+    os.path.join("models", "feature_pipeline.pkl"),
+    os.path.join("models", "scaler.pkl"),
+)
+
+
+def _caminho_manifesto(diretorio: str) -> str:
+    return os.path.join(diretorio, "manifest.json")
+
+
+def carregar_manifesto(diretorio: str = DIRETORIO_VERSOES) -> list:
+    """
+    Retorna a lista de versões registradas, da mais antiga para a mais recente.
+    """
+    caminho = _caminho_manifesto(diretorio)
+    if not os.path.exists(caminho):
+        return []
+    with open(caminho, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _salvar_manifesto(versoes: list, diretorio: str) -> None:
+    caminho = _caminho_manifesto(diretorio)
+    temporario = caminho + ".tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(versoes, f, indent=4, default=str)
+    os.replace(temporario, caminho)
+
+
+def ultima_versao(diretorio: str = DIRETORIO_VERSOES):
+    """
+    Retorna o registro da versão mais recente, ou None se nenhuma versão foi registrada.
+    """
+    versoes = carregar_manifesto(diretorio)
+    return versoes[-1] if versoes else None
+
+
+def descrever_janela(df: pd.DataFrame, origem: str = None) -> dict:
+    """
+    Descreve a janela de dados utilizada em uma atualização do modelo: origem (e hash do arquivo),
+    quantidade de linhas e intervalos de 'id' e 'ultima_review', quando presentes.
+    """
+    janela = {"origem": origem, "linhas": int(len(df))}
+    if origem and os.path.isfile(origem):
+        janela["hash"] = hash_arquivo(origem)
+    if 'id' in df.columns and len(df):
+        janela["id_min"] = int(df['id'].min())
+        janela["id_max"] = int(df['id'].max())
+    if 'ultima_review' in df.columns:
+        datas = pd.to_datetime(df['ultima_review'], errors='coerce').dropna()
+        if len(datas):
+            janela["ultima_review_min"] = datas.min().date().isoformat()
+            janela["ultima_review_max"] = datas.max().date().isoformat()
+    return janela
+
+
+def _marcar_versao(caminho: str, nome: str) -> None:
+    # A indicação do modelo ativo guarda a versão a que pertence; ao restaurar uma versão, ela volta junto
+    with open(caminho, 'r', encoding='utf-8') as f:
+        ativo = json.load(f)
+    ativo["versao"] = nome
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(ativo, f, indent=4)
+
+
+def _copiar(origem: str, destino: str) -> None:
+    """
+    Copia um artefato preservando a data de modificação; diretórios (artefatos compactos) substituem o destino.
+    """
+    if os.path.isdir(origem):
+        shutil.rmtree(destino, ignore_errors=True)
+        shutil.copytree(origem, destino)
+    else:
+        shutil.copy2(origem, destino)
+
+
+def registrar_versao(tipo: str, janela: dict, metricas: dict = None, base: str = None,
+                     detalhes: dict = None, artefatos=ARTEFATOS_PADRAO, diretorio: str = DIRETORIO_VERSOES) -> dict:
+    """
+    Registra uma nova versão do modelo: copia os artefatos atuais para `models/versoes/vNNNN/`
+    e acrescenta ao manifesto o tipo da atualização ('completo' ou 'incremental'), a versão base,
+    a janela de dados utilizada e as métricas. A indicação do modelo ativo (`modelo_ativo.json`), quando
+    está entre os artefatos, passa a registrar o nome da versão.
+    """
+    versoes = carregar_manifesto(diretorio)
+    nome = f"v{len(versoes) + 1:04d}"
+    destino = os.path.join(diretorio, nome)
+    os.makedirs(destino, exist_ok=True)
+    copiados = []
+    for caminho in artefatos:
+        if os.path.exists(caminho):
+            if os.path.basename(caminho) == ARQUIVO_MODELO_ATIVO:
+                _marcar_versao(caminho, nome)
+            _copiar(caminho, os.path.join(destino, os.path.basename(caminho)))
+            copiados.append(os.path.basename(caminho))
+    registro = {
+        "versao": nome,
+        "criado_em": datetime.now().isoformat(timespec='seconds'),
+        "tipo": tipo,
+        "base": base,
+        "janela": janela,
+        "metricas": metricas or {},
+        "artefatos": copiados,
+        **(detalhes or {}),
+    }
+    versoes.append(registro)
+    _salvar_manifesto(versoes, diretorio)
+    logger.info(f"Versão {nome} ({tipo}) registrada em: {destino}")
+    return registro
+
+
+def restaurar_versao(nome: str, diretorio: str = DIRETORIO_VERSOES, destino: str = "models") -> dict:
+    """
+    Restaura os artefatos de uma versão registrada para a pasta de modelos.
+    """
+    registro = next((v for v in carregar_manifesto(diretorio) if v["versao"] == nome), None)
+    if registro is None:
+        raise ValueError(f"Versão não encontrada: {nome}")
+    for arquivo in registro["artefatos"]:
+        _copiar(os.path.join(diretorio, nome, arquivo), os.path.join(destino, arquivo))
+    # Versões sem a indicação do modelo ativo são anteriores aos backends e usam o random_forest
+    ativo = os.path.join(destino, ARQUIVO_MODELO_ATIVO)
+    if ARQUIVO_MODELO_ATIVO not in registro["artefatos"] and os.path.exists(ativo):
+        os.remove(ativo)
+    logger.info(f"Versão {nome} restaurada em: {destino}")
+    return registro
@@ -1,21 +1,32 @@
 #!/usr/bin/env python
 import os
+import time
+import argparse
 import joblib
 import numpy as np
 import pandas as pd
 import logging
-import requests
+
+from feature_engineering import aplicar_pipeline_features, ListingEncoder
+from exchange_rates import CachedRateProvider, converter_valores
+from model_backends import caminho_modelo_ativo
+from prediction_cache import PredictionCache
+from model_artifact import carregar_modelo_salvo
+from instrumentation import instrumentar
 
 # Configuração do logger
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+CAMINHO_PIPELINE = os.path.join("models", "feature_pipeline.pkl")
+CAMINHO_SCALER = os.path.join("models", "scaler.pkl")
+
 def carregar_modelo(caminho: str):
     """
-    Carrega o modelo treinado a partir do arquivo especificado.
+    Carrega o modelo treinado a partir do artefato compacto (diretório) ou do arquivo joblib especificado.
     """
     try:
-        model = joblib.load(caminho)
+        model = carregar_modelo_salvo(caminho)
         logger.info(f"Modelo carregado com sucesso de: {caminho}")
         return model
     except Exception as e:
@@ -34,69 +45,193 @@ def carregar_scaler(caminho: str):
         logger.error(f"Erro ao carregar o scaler: {e}", exc_info=True)
         raise
 
-def preparar_entrada(dados: dict, expected_columns: list, scaler) -> pd.DataFrame:
+def carregar_pipeline_features(caminho: str) -> dict:
+    """
+    Carrega o pipeline de features ajustado na engenharia de atributos.
+    """
+    try:
+        pipeline = joblib.load(caminho)
+        logger.info(f"Pipeline de features carregado com sucesso de: {caminho}")
+        return pipeline
+    except Exception as e:
+        logger.error(f"Erro ao carregar o pipeline de features: {e}", exc_info=True)
+        raise
+
+def preparar_lote(df: pd.DataFrame, pipeline: dict) -> pd.DataFrame:
+    """
+    Prepara um lote de imóveis para a previsão em uma única passagem vetorizada,
+    aplicando o mesmo pipeline de features ajustado no treinamento.
+    """
+    return aplicar_pipeline_features(df, pipeline)
+
+_codificadores = {}
+
+def obter_codificador(pipeline: dict) -> ListingEncoder:
+    """
+    Retorna o codificador pré-compilado do pipeline, criado na primeira utilização.
+    """
+    pipeline_codificado, codificador = _codificadores.get(id(pipeline), (None, None))
+    if pipeline_codificado is not pipeline:
+        codificador = ListingEncoder(pipeline)
+        _codificadores[id(pipeline)] = (pipeline, codificador)
+    return codificador
+
+def preparar_entrada(dados: dict, pipeline: dict, rapido: bool = True):
     """
     Prepara os dados de entrada para a previsão, aplicando o mesmo pipeline de transformação utilizado no treinamento.
+    Por padrão, usa o codificador pré-compilado, que monta o vetor de features (array de formato (1, n))
+    sem pandas; com `rapido=False`, passa pelo pipeline em DataFrame. Os dois produzem as mesmas features.
     """
     # Verificar se as chaves essenciais estão presentes
-    chaves_necessarias = ['bairro_group', 'room_type']
-    for chave in chaves_necessarias:
+    for chave in pipeline["categorias"]:
         if chave not in dados:
             logger.warning(f"A chave '{chave}' não foi fornecida. Verifique os dados de entrada.")
-    
-    # Cria DataFrame a partir dos dados fornecidos
-    df = pd.DataFrame([dados])
-    # Remover colunas irrelevantes e vazadoras
-    df = df.drop(columns=['nome', 'host_name', 'ultima_review', 'bairro', 'price', 'id', 'host_id'], errors='ignore')
-
-    # Adicionar novas features com valores padrão se não existirem
-    if 'densidade_imoveis' not in df.columns:
-        df['densidade_imoveis'] = 1
-    if 'proximidade_centro' not in df.columns:
-        df['proximidade_centro'] = 0
-
-    # Aplicar codificação one-hot para as colunas categóricas
-    df = pd.get_dummies(df, columns=['bairro_group', 'room_type'], drop_first=True)
-
-    # Reindexar para garantir que os dados tenham as mesmas colunas do conjunto de treinamento
-    df = df.reindex(columns=expected_columns, fill_value=0)
-
-    # Identificar as colunas numéricas que foram normalizadas durante o treinamento
-    if hasattr(scaler, 'feature_names_in_'):
-        numeric_cols = list(scaler.feature_names_in_)
-        cols_to_scale = [col for col in numeric_cols if col in df.columns]
-        if cols_to_scale:
-            df[cols_to_scale] = scaler.transform(df[cols_to_scale])
-            logger.info("Dados numéricos normalizados com sucesso.")
-    else:
-        logger.warning("O scaler não possui o atributo 'feature_names_in_'. Pulando a normalização.")
-    
-    return df
+
+    if rapido:
+        return obter_codificador(pipeline).codificar(dados)
+    return preparar_lote(pd.DataFrame([dados]), pipeline)
+
+def _entrada_modelo(modelo, X):
+    # Estimadores do scikit-learn ajustados com nomes de colunas esperam um DataFrame
+    nomes = getattr(modelo, "feature_names_in_", None)
+    if isinstance(X, np.ndarray) and nomes is not None and hasattr(modelo, "get_params"):
+        return pd.DataFrame(X, columns=nomes)
+    return X
 
 def prever_preco(modelo, X):
     """
     Realiza a previsão do preço utilizando o modelo e reverte a transformação logarítmica.
     """
-    preco_log = modelo.predict(X)[0]
+    preco_log = modelo.predict(_entrada_modelo(modelo, X))[0]
     return np.expm1(preco_log)
 
-def converter_moedas(valor_usd):
+def prever_precos(modelo, X) -> np.ndarray:
+    """
+    Realiza a previsão dos preços de um lote inteiro em uma única chamada ao modelo
+    e reverte a transformação logarítmica.
+    """
+    return np.expm1(modelo.predict(_entrada_modelo(modelo, X)))
+
+def iterar_lotes(fonte, tamanho_lote: int = 10000):
+    """
+    Percorre a fonte de imóveis em blocos de no máximo `tamanho_lote` linhas.
+    A fonte pode ser uma lista de dicionários, um DataFrame ou o caminho de um CSV;
+    no caso do CSV, o arquivo é lido em blocos para manter a memória limitada.
+    """
+    if isinstance(fonte, (str, os.PathLike)):
+        yield from pd.read_csv(fonte, chunksize=tamanho_lote)
+        return
+    if not isinstance(fonte, pd.DataFrame):
+        fonte = list(fonte)
+        for inicio in range(0, len(fonte), tamanho_lote):
+            yield pd.DataFrame(fonte[inicio:inicio + tamanho_lote])
+        return
+    for inicio in range(0, len(fonte), tamanho_lote):
+        yield fonte.iloc[inicio:inicio + tamanho_lote]
+
+def artefatos_previsao() -> tuple:
+    """
+    Arquivos cuja regravação invalida as previsões em cache: o modelo ativo, a indicação do modelo ativo,
+    o pipeline de features e o scaler.
+    """
+    return (caminho_modelo_ativo(), os.path.join("models", "modelo_ativo.json"), CAMINHO_PIPELINE, CAMINHO_SCALER)
+
+_cache_previsoes = None
+
+def obter_cache_previsoes() -> PredictionCache:
+    """
+    Retorna o cache de previsões compartilhado pelo processo, invalidado quando os artefatos de previsão mudam.
+    """
+    global _cache_previsoes
+    if _cache_previsoes is None:
+        _cache_previsoes = PredictionCache(arquivos=artefatos_previsao())
+    return _cache_previsoes
+
+def precificar_imovel(dados: dict, modelo, pipeline: dict, cache: PredictionCache = None) -> float:
+    """
+    Precifica um imóvel consultando antes o cache de previsões (por padrão, o compartilhado pelo processo):
+    imóveis que diferem apenas em campos não usados pelo modelo (id, host_name...) reaproveitam a previsão.
+    """
+    cache = cache if cache is not None else obter_cache_previsoes()
+    precos = cache.prever([dados], modelo, pipeline,
+                          lambda posicoes: [prever_preco(modelo, preparar_entrada(dados, pipeline))])
+    return float(precos[0])
+
+@instrumentar
+def precificar_lote(fonte, modelo, pipeline: dict, tamanho_lote: int = 10000, cotacoes: dict = None,
+                    cache: PredictionCache = None):
     """
-    Converte o valor previsto em USD para BRL e EUR utilizando a API AwesomeAPI.
+    Precifica um lote de imóveis, retornando os resultados bloco a bloco.
+
+    Cada bloco é codificado, normalizado e previsto em uma única passagem vetorizada e
+    devolvido como um DataFrame com os dados originais acrescidos da coluna 'preco_previsto'.
+    Com um `cache` de previsões, apenas os imóveis ausentes dele (sem repetição) passam pelo pipeline e pelo modelo.
+    Se `cotacoes` for informado (ex.: {'BRL': 5.0}), acrescenta uma coluna 'preco_previsto_<moeda>'
+    por moeda, convertida com uma única multiplicação vetorizada por bloco.
+    Ao final, registra o total de linhas processadas e a vazão em linhas por segundo.
     """
+    total_linhas = 0
+    inicio = time.perf_counter()
     try:
-        # URL da API para obter as cotações de USD para BRL e EUR
-        url = "https://economia.awesomeapi.com.br/json/last/USD-BRL,USD-EUR"
-        response = requests.get(url)
-        data = response.json()
+        for bloco in iterar_lotes(fonte, tamanho_lote):
+            if bloco.empty:
+                continue
+            resultado = bloco.copy()
+            if cache is None:
+                resultado['preco_previsto'] = prever_precos(modelo, preparar_lote(bloco, pipeline))
+            else:
+                resultado['preco_previsto'] = cache.prever_lote(
+                    bloco, modelo, pipeline,
+                    lambda posicoes: prever_precos(modelo, preparar_lote(bloco.iloc[posicoes], pipeline)))
+            if cotacoes:
+                convertidos = converter_valores(resultado['preco_previsto'].to_numpy(), cotacoes)
+                for moeda in convertidos.columns:
+                    resultado[f'preco_previsto_{moeda.lower()}'] = convertidos[moeda].to_numpy()
+            total_linhas += len(bloco)
+            yield resultado
+    finally:
+        duracao = time.perf_counter() - inicio
+        vazao = total_linhas / duracao if duracao > 0 else float('inf')
+        logger.info(f"Lote precificado: {total_linhas} linhas em {duracao:.2f}s ({vazao:.0f} linhas/s).")
+        if cache is not None:
+            logger.info(f"Cache de previsões: {cache.metricas()}")
 
-        # Obter as taxas de câmbio
-        usd_brl = float(data['USDBRL']['bid'])
-        usd_eur = float(data['USDEUR']['bid'])
+def salvar_previsoes(blocos, caminho: str) -> int:
+    """
+    Salva os blocos de previsões em um arquivo CSV à medida que são gerados.
+    Retorna o número de linhas escritas.
+    """
+    diretorio = os.path.dirname(caminho)
+    if diretorio:
+        os.makedirs(diretorio, exist_ok=True)
+    total = 0
+    for i, bloco in enumerate(blocos):
+        bloco.to_csv(caminho, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+        total += len(bloco)
+    logger.info(f"Previsões salvas com sucesso em: {caminho}")
+    return total
 
-        # Converter o valor previsto
-        valor_brl = valor_usd * usd_brl
-        valor_eur = valor_usd * usd_eur
+_provedor_cotacoes = None
+
+def obter_provedor_cotacoes():
+    """
+    Retorna o provedor de cotações compartilhado pelo processo (AwesomeAPI com cache em memória e em arquivo).
+    """
+    global _provedor_cotacoes
+    if _provedor_cotacoes is None:
+        _provedor_cotacoes = CachedRateProvider()
+    return _provedor_cotacoes
+
+def converter_moedas(valor_usd, provedor=None):
+    """
+    Converte o valor previsto em USD para BRL e EUR utilizando as cotações em cache
+    (atualizadas pela AwesomeAPI quando expiradas).
+    """
+    try:
+        provedor = provedor if provedor is not None else obter_provedor_cotacoes()
+        convertidos = converter_valores([valor_usd], provedor.obter_cotacoes(("BRL", "EUR")))
+        valor_brl = convertidos["BRL"].iloc[0]
+        valor_eur = convertidos["EUR"].iloc[0]
 
         # Exibir os resultados com emojis
         print(f"\n🔹 == Conversão de Moedas == 🔹")
@@ -107,20 +242,11 @@ def converter_moedas(valor_usd):
     except Exception as e:
         print(f"❌ Erro ao converter moedas: {e}")
 
-def main():
-    logger.info("=== Executando predict_price.py ===")
-    
-    # Caminhos para o modelo e scaler treinados
-    caminho_modelo = os.path.join("models", "random_forest.pkl")
-    caminho_scaler = os.path.join("models", "scaler.pkl")
-    modelo = carregar_modelo(caminho_modelo)
-    scaler = carregar_scaler(caminho_scaler)
-    
-    # Carregar as colunas esperadas do conjunto de treinamento (exceto 'price_log')
-    caminho_features = os.path.join("data", "final", "nyc_rental_data_features.csv")
-    df_features = pd.read_csv(caminho_features)
-    expected_columns = list(df_features.drop(columns=["price_log"]).columns)
-    
+@instrumentar
+def precificar_exemplo(modelo, pipeline: dict) -> float:
+    """
+    Precifica o apartamento de exemplo e exibe a conversão para BRL e EUR.
+    """
     # Dados do apartamento a ser precificado
     apartamento = {
         'id': 2595,
@@ -140,16 +266,52 @@ def main():
         'disponibilidade_365': 355
     }
     
-    # Preparar os dados de entrada com normalização e pipeline de transformação
-    X = preparar_entrada(apartamento, expected_columns, scaler)
-    
-    # Realizar a previsão e converter de log(price) para price
-    preco_sugerido = prever_preco(modelo, X)
+    # Preparar os dados de entrada e prever o preço (revertendo o log), salvo se já estiver em cache
+    preco_sugerido = precificar_imovel(apartamento, modelo, pipeline)
     
     logger.info(f"🏡 Preço sugerido para '{apartamento['nome']}': **${preco_sugerido:.2f}**")
     
     # Converter o valor previsto para BRL e EUR
     converter_moedas(preco_sugerido)
+    return preco_sugerido
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Previsão de preços de aluguel em Nova York.")
+    parser.add_argument("--lote", help="CSV com os imóveis a serem precificados em lote.")
+    parser.add_argument("--saida", default=os.path.join("data", "predictions", "previsoes.csv"),
+                        help="CSV de saída para as previsões em lote.")
+    parser.add_argument("--tamanho-lote", type=int, default=10000,
+                        help="Número máximo de linhas processadas por bloco.")
+    parser.add_argument("--moedas", nargs="*", default=[],
+                        help="Moedas para as quais converter as previsões em lote (ex.: BRL EUR).")
+    parser.add_argument("--cache", action="store_true",
+                        help="Usa o cache de previsões no lote: imóveis repetidos são previstos uma única vez.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    logger.info("=== Executando predict_price.py ===")
+    
+    # Caminhos para o modelo e o pipeline de features ajustados no treinamento
+    caminho_modelo = caminho_modelo_ativo()
+    modelo = carregar_modelo(caminho_modelo)
+    pipeline = carregar_pipeline_features(CAMINHO_PIPELINE)
+
+    if args.lote:
+        # As cotações são obtidas uma única vez para todo o lote
+        cotacoes = None
+        if args.moedas:
+            try:
+                cotacoes = obter_provedor_cotacoes().obter_cotacoes(tuple(args.moedas))
+            except Exception as e:
+                logger.warning(f"Cotações indisponíveis, previsões mantidas apenas em USD: {e}")
+        blocos = precificar_lote(args.lote, modelo, pipeline, args.tamanho_lote, cotacoes,
+                                 cache=obter_cache_previsoes() if args.cache else None)
+        total = salvar_previsoes(blocos, args.saida)
+        logger.info(f"✅ {total} imóveis precificados em lote.")
+        return
+    
+    precificar_exemplo(modelo, pipeline)
 
     logger.info("✅ Módulo predict_price executado com sucesso.")
 
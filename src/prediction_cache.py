@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+import os
+import sys
+import time
+import threading
+import logging
+from collections import OrderedDict
+from itertools import islice
+
+import numpy as np
+
+from feature_engineering import ListingEncoder
+
+# Configuração do logger
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+TAMANHO_PADRAO = 10000
+# Chaves medidas para estimar a memória ocupada pelo cache
+AMOSTRA_MEMORIA = 256
+
+
+def _assinatura_arquivo(caminho: str):
+    # Artefatos compactos são diretórios recriados a cada gravação (renomeados a partir de um temporário):
+    # o inode e o mtime do diretório e do cabeçalho mudam sempre que o modelo é salvo de novo
+    try:
+        estado = os.stat(caminho)
+    except FileNotFoundError:
+        return None
+    assinatura = (estado.st_ino, estado.st_mtime_ns, estado.st_size)
+    if os.path.isdir(caminho):
+        assinatura += (_assinatura_arquivo(os.path.join(caminho, "cabecalho.json")),)
+    return assinatura
+
+
+class MonitorArtefatos:
+    """
+    Detecta a regravação de arquivos pela assinatura de cada um (inode, mtime e tamanho), verificando-os
+    no máximo a cada `intervalo_s` segundos. Não é seguro entre threads por si só: quem o usa serializa as chamadas.
+    """
+
+    def __init__(self, arquivos=(), intervalo_s: float = 1.0):
+        self.arquivos = tuple(arquivos)
+        self.intervalo_s = intervalo_s
+        self._assinaturas = self._assinar()
+        self._proxima_verificacao = 0.0
+
+    def _assinar(self) -> tuple:
+        return tuple(_assinatura_arquivo(caminho) for caminho in self.arquivos)
+
+    def alterados(self) -> bool:
+        """
+        Indica se algum arquivo foi regravado desde a última verificação que o detectou.
+        """
+        agora = time.monotonic()
+        if not self.arquivos or agora < self._proxima_verificacao:
+            return False
+        self._proxima_verificacao = agora + self.intervalo_s
+        assinaturas = self._assinar()
+        if assinaturas == self._assinaturas:
+            return False
+        self._assinaturas = assinaturas
+        return True
+
+    def repetir(self) -> None:
+        """
+        Faz a próxima verificação acusar alteração (por exemplo, quando a recarga dos arquivos falhou).
+        """
+        self._assinaturas = None
+
+
+def _tamanho_chave(chave: tuple) -> int:
+    return sys.getsizeof(chave) + sum(map(sys.getsizeof, chave))
+
+
+class PredictionCache:
+    """
+    Cache LRU, em memória, de preços previstos por imóvel. A chave é a chave canônica do `ListingEncoder`
+    (apenas os campos que o modelo usa, normalizados), de modo que `id` e `host_name` não impedem
+    acertos; `nome` só entra na chave quando o pipeline usa as features do título. Mantém no máximo `tamanho_maximo` entradas, descartando as usadas há mais tempo.
+
+    O cache é esvaziado automaticamente quando o modelo ou o pipeline de features em uso mudam (outro
+    objeto) ou quando algum dos `arquivos` (modelo, pipeline e scaler salvos) é regravado; os arquivos
+    são verificados a cada `intervalo_verificacao_s` segundos. Seguro para uso entre threads.
+    Esvaziar o cache não recarrega o modelo nem o pipeline: quem os mantém em memória deve recarregá-los
+    ao ver os arquivos mudarem (como faz o `MicroBatcher` do serviço de previsão), senão as previsões
+    continuam vindo do modelo antigo até o processo ser reiniciado.
+    """
+
+    def __init__(self, tamanho_maximo: int = TAMANHO_PADRAO, arquivos=(), intervalo_verificacao_s: float = 1.0):
+        if tamanho_maximo < 1:
+            raise ValueError(f"O tamanho máximo do cache deve ser positivo: {tamanho_maximo}")
+        self.tamanho_maximo = tamanho_maximo
+        self.arquivos = tuple(arquivos)
+        self.intervalo_verificacao_s = intervalo_verificacao_s
+        self._monitor = MonitorArtefatos(self.arquivos, intervalo_verificacao_s)
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self._origem = None
+        self._codificador = None
+        self._acertos = 0
+        self._faltas = 0
+        self._despejos = 0
+        self._invalidacoes = 0
+        self._geracao = 0
+
+    def _limpar(self, motivo: str) -> None:
+        if self._entradas:
+            logger.info(f"Cache de previsões invalidado ({motivo}): {len(self._entradas)} entradas descartadas.")
+            self._invalidacoes += 1
+        self._entradas.clear()
+        self._geracao += 1
+
+    def limpar(self) -> None:
+        """
+        Descarta todas as entradas (as estatísticas de acertos são mantidas).
+        """
+        with self._lock:
+            self._limpar("limpeza manual")
+
+    def _validar(self, modelo, pipeline: dict) -> None:
+        # Chamado com o lock adquirido
+        if self._origem is None or self._origem[0] is not modelo or self._origem[1] is not pipeline:
+            if self._origem is not None:
+                self._limpar("modelo ou pipeline substituído")
+            self._origem = (modelo, pipeline)
+            self._codificador = ListingEncoder(pipeline)
+        if self._monitor.alterados():
+            self._limpar("artefato regravado")
+
+    def prever(self, registros, modelo, pipeline: dict, prever_faltantes) -> np.ndarray:
+        """
+        Retorna o preço previsto de cada imóvel de `registros` (lista de dicionários), consultando o cache.
+        Os imóveis ausentes do cache, sem repetição, são previstos de uma só vez por `prever_faltantes`,
+        que recebe as posições desses imóveis em `registros` e devolve os preços na mesma ordem.
+        """
+        registros = list(registros)
+        return self._prever(lambda codificador: [codificador.chave(dados) for dados in registros],
+                            modelo, pipeline, prever_faltantes)
+
+    def prever_lote(self, df, modelo, pipeline: dict, prever_faltantes) -> np.ndarray:
+        """
+        Versão de `prever` para um DataFrame de imóveis: as chaves são montadas coluna a coluna
+        (`ListingEncoder.chaves_lote`), sem converter as linhas em dicionários.
+        """
+        return self._prever(lambda codificador: codificador.chaves_lote(df), modelo, pipeline, prever_faltantes)
+
+    def _prever(self, montar_chaves, modelo, pipeline: dict, prever_faltantes) -> np.ndarray:
+        with self._lock:
+            self._validar(modelo, pipeline)
+            chaves = montar_chaves(self._codificador)
+            precos = np.empty(len(chaves))
+            # Cada imóvel ausente aponta para a sua chave entre as faltantes (sem repetição), na ordem de chegada
+            faltantes, primeiras, posicoes_faltantes, indices_faltantes = {}, [], [], []
+            for posicao, chave in enumerate(chaves):
+                preco = self._entradas.get(chave)
+                if preco is None:
+                    indice = faltantes.setdefault(chave, len(faltantes))
+                    if indice == len(primeiras):
+                        primeiras.append(posicao)
+                    posicoes_faltantes.append(posicao)
+                    indices_faltantes.append(indice)
+                else:
+                    self._entradas.move_to_end(chave)
+                    precos[posicao] = preco
+            self._acertos += len(chaves) - len(posicoes_faltantes)
+            self._faltas += len(posicoes_faltantes)
+            geracao = self._geracao
+        if not faltantes:
+            return precos
+
+        # A previsão roda fora do lock, para não bloquear as consultas de outras threads; cada imóvel
+        # distinto é previsto pela sua primeira ocorrência
+        previstos = np.asarray(prever_faltantes(primeiras), dtype=np.float64)
+        precos[posicoes_faltantes] = previstos[indices_faltantes]
+        with self._lock:
+            # Previsões feitas antes de uma invalidação não são guardadas; de um lote com mais imóveis
+            # distintos que o cache comporta, só os últimos, que não seriam despejados pelo próprio lote
+            if self._geracao == geracao:
+                novas = list(zip(faltantes, previstos.tolist()))[-self.tamanho_maximo:]
+                self._entradas.update(novas)
+                self._despejar()
+        return precos
+
+    def buscar(self, dados: dict, modelo, pipeline: dict):
+        """
+        Consulta um imóvel sem prevê-lo: retorna o preço guardado ou None. Só os acertos entram nas
+        estatísticas; a falta é contada quando o imóvel for previsto por `prever`.
+        """
+        with self._lock:
+            self._validar(modelo, pipeline)
+            chave = self._codificador.chave(dados)
+            preco = self._entradas.get(chave)
+            if preco is not None:
+                self._entradas.move_to_end(chave)
+                self._acertos += 1
+            return preco
+
+    def _despejar(self) -> None:
+        while len(self._entradas) > self.tamanho_maximo:
+            self._entradas.popitem(last=False)
+            self._despejos += 1
+
+    def _estimar_memoria(self) -> int:
+        # Dicionário, preços e chaves; o tamanho médio das chaves vem das mais recentes
+        amostra = list(islice(reversed(self._entradas), AMOSTRA_MEMORIA))
+        media_chaves = sum(map(_tamanho_chave, amostra)) / len(amostra) if amostra else 0
+        return int(sys.getsizeof(self._entradas) + len(self._entradas) * (media_chaves + sys.getsizeof(0.0)))
+
+    def metricas(self) -> dict:
+        """
+        Retorna as estatísticas do cache: entradas, acertos, faltas, taxa de acerto, despejos por LRU,
+        invalidações e a memória aproximada ocupada (dicionário, chaves e preços), em bytes, estimada
+        pelo tamanho médio das chaves mais recentes.
+        """
+        with self._lock:
+            consultas = self._acertos + self._faltas
+            return {
+                "entradas": len(self._entradas),
+                "tamanho_maximo": self.tamanho_maximo,
+                "acertos": self._acertos,
+                "faltas": self._faltas,
+                "taxa_acerto": self._acertos / consultas if consultas else None,
+                "despejos": self._despejos,
+                "invalidacoes": self._invalidacoes,
+                "memoria_bytes": self._estimar_memoria(),
+            }
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+import logging
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from predict_price import (carregar_modelo, carregar_pipeline_features, obter_codificador, prever_precos,
+                           artefatos_previsao, CAMINHO_PIPELINE)
+from prediction_cache import PredictionCache, MonitorArtefatos, TAMANHO_PADRAO
+from model_backends import caminho_modelo_ativo
+
+# Configuração do logger
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Agrupa as requisições que chegam dentro de uma janela de poucos milissegundos
+    em uma única chamada a `predict`, mantendo o modelo e o pipeline de features carregados em memória.
+    Com um `cache` de previsões, imóveis já precificados são respondidos na hora, sem entrar na fila.
+    Com `recarregar` (função que devolve o par modelo e pipeline), o modelo e o pipeline são recarregados
+    antes do próximo lote quando algum dos `arquivos` é regravado, verificados a cada `intervalo_verificacao_s` segundos.
+    """
+
+    def __init__(self, modelo, pipeline: dict, janela_ms: float = 5.0,
+                 tamanho_maximo: int = 512, historico: int = 10000, cache: PredictionCache = None,
+                 recarregar=None, arquivos=(), intervalo_verificacao_s: float = 1.0):
+        self._ativos = (modelo, pipeline, obter_codificador(pipeline))
+        self.cache = cache
+        self.recarregar = recarregar
+        self._monitor = MonitorArtefatos(arquivos if recarregar is not None else (), intervalo_verificacao_s)
+        self._recargas = 0
+        self.janela = janela_ms / 1000.0
+        self.tamanho_maximo = tamanho_maximo
+        self._fila = queue.Queue()
+        self._latencias = deque(maxlen=historico)
+        self._tamanhos_lote = deque(maxlen=historico)
+        self._profundidade_maxima = 0
+        self._total_requisicoes = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._executar, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    @property
+    def modelo(self):
+        return self._ativos[0]
+
+    @property
+    def pipeline(self) -> dict:
+        return self._ativos[1]
+
+    def _recarregar_se_alterado(self) -> None:
+        # Chamado apenas pela thread dos lotes; a troca do trio modelo, pipeline e codificador é atômica
+        if not self._monitor.alterados():
+            return
+        try:
+            modelo, pipeline = self.recarregar()
+        except Exception as e:
+            logger.warning(f"Falha ao recarregar o modelo e o pipeline ({e}); mantendo os atuais e tentando de novo.")
+            self._monitor.repetir()
+            return
+        self._ativos = (modelo, pipeline, obter_codificador(pipeline))
+        with self._lock:
+            self._recargas += 1
+        logger.info("Modelo e pipeline de features recarregados após a regravação dos artefatos.")
+
+    def submeter(self, dados: dict) -> Future:
+        """
+        Enfileira um imóvel para precificação e retorna um Future com o preço previsto.
+        """
+        futuro = Future()
+        if self.cache is not None:
+            modelo, pipeline, _ = self._ativos
+            preco = self.cache.buscar(dados, modelo, pipeline)
+            if preco is not None:
+                futuro.set_result(preco)
+                return futuro
+        self._fila.put((dados, futuro, time.perf_counter()))
+        with self._lock:
+            self._profundidade_maxima = max(self._profundidade_maxima, self._fila.qsize())
+        return futuro
+
+    def prever(self, dados: dict, timeout: float = None) -> float:
+        """
+        Precifica um imóvel, bloqueando até que o lote que o contém seja processado.
+        """
+        return self.submeter(dados).result(timeout=timeout)
+
+    def _coletar_lote(self) -> list:
+        lote = [self._fila.get()]
+        prazo = time.perf_counter() + self.janela
+        while len(lote) < self.tamanho_maximo:
+            restante = prazo - time.perf_counter()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._fila.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _executar(self) -> None:
+        while True:
+            lote = self._coletar_lote()
+            futuros = [futuro for _, futuro, _ in lote]
+            try:
+                self._recarregar_se_alterado()
+                modelo, pipeline, codificador = self._ativos
+                registros = [dados for dados, _, _ in lote]
+                if self.cache is None:
+                    precos = prever_precos(modelo, codificador.codificar_lote(registros))
+                else:
+                    precos = self.cache.prever(registros, modelo, pipeline, lambda posicoes: prever_precos(
+                        modelo, codificador.codificar_lote([registros[i] for i in posicoes])))
+            except Exception as e:
+                logger.error(f"Erro ao precificar lote de {len(lote)} requisições: {e}", exc_info=True)
+                for futuro in futuros:
+                    futuro.set_exception(e)
+                continue
+            fim = time.perf_counter()
+            for (_, futuro, _), preco in zip(lote, precos):
+                futuro.set_result(float(preco))
+            with self._lock:
+                self._latencias.extend(fim - inicio for _, _, inicio in lote)
+                self._tamanhos_lote.append(len(lote))
+                self._total_requisicoes += len(lote)
+
+    def metricas(self) -> dict:
+        """
+        Retorna as métricas do serviço: latências p50/p99 (ms), profundidade da fila, tamanho médio dos lotes
+        e, com o cache de previsões, taxa de acerto e memória do cache.
+        """
+        with self._lock:
+            latencias = np.array(self._latencias) * 1000.0
+            tamanhos = np.array(self._tamanhos_lote)
+            metricas = {
+                "requisicoes": self._total_requisicoes,
+                "fila_atual": self._fila.qsize(),
+                "fila_maxima": self._profundidade_maxima,
+                "recargas_modelo": self._recargas,
+            }
+        metricas["latencia_p50_ms"] = float(np.percentile(latencias, 50)) if latencias.size else None
+        metricas["latencia_p99_ms"] = float(np.percentile(latencias, 99)) if latencias.size else None
+        metricas["tamanho_medio_lote"] = float(tamanhos.mean()) if tamanhos.size else None
+        if self.cache is not None:
+            metricas["cache"] = self.cache.metricas()
+        return metricas
+
+
+def criar_handler(batcher: MicroBatcher):
+    """
+    Cria a classe de handler HTTP ligada ao micro-batcher informado.
+    """
+    class PredictionHandler(BaseHTTPRequestHandler):
+        def _responder(self, status: int, corpo) -> None:
+            conteudo = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(conteudo)))
+            self.end_headers()
+            self.wfile.write(conteudo)
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                self._responder(200, batcher.metricas())
+            elif self.path == "/health":
+                self._responder(200, {"status": "ok"})
+            else:
+                self._responder(404, {"erro": f"Rota não encontrada: {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/predict":
+                self._responder(404, {"erro": f"Rota não encontrada: {self.path}"})
+                return
+            try:
+                tamanho = int(self.headers.get("Content-Length", 0))
+                corpo = json.loads(self.rfile.read(tamanho) or b"null")
+            except (ValueError, json.JSONDecodeError) as e:
+                self._responder(400, {"erro": f"JSON inválido: {e}"})
+                return
+            if not isinstance(corpo, (dict, list)):
+                self._responder(400, {"erro": "Envie um objeto JSON ou uma lista de objetos."})
+                return
+            try:
+                if isinstance(corpo, dict):
+                    self._responder(200, {"preco_previsto": batcher.prever(corpo)})
+                else:
+                    futuros = [batcher.submeter(dados) for dados in corpo]
+                    self._responder(200, {"precos_previstos": [futuro.result() for futuro in futuros]})
+            except Exception as e:
+                self._responder(500, {"erro": str(e)})
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return PredictionHandler
+
+
+class PredictionHTTPServer(ThreadingHTTPServer):
+    # Fila de conexões maior que o padrão (5) para absorver rajadas de requisições simultâneas
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def servir_http(batcher: MicroBatcher, host: str, porta: int) -> None:
+    """
+    Inicia o servidor HTTP com as rotas POST /predict, GET /metrics e GET /health.
+    """
+    servidor = PredictionHTTPServer((host, porta), criar_handler(batcher))
+    logger.info(f"Servidor de previsão escutando em http://{host}:{porta}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Servidor de previsão encerrado.")
+    finally:
+        servidor.server_close()
+        logger.info(f"Métricas finais: {batcher.metricas()}")
+
+
+def servir_stdin(batcher: MicroBatcher, entrada=sys.stdin, saida=sys.stdout) -> None:
+    """
+    Lê um imóvel por linha (JSON) da entrada padrão e escreve o preço previsto na saída padrão,
+    na mesma ordem. As linhas lidas em sequência são agrupadas pelo micro-batcher.
+    """
+    pendentes = queue.Queue()
+
+    def escrever():
+        while True:
+            futuro = pendentes.get()
+            if futuro is None:
+                break
+            try:
+                resposta = {"preco_previsto": futuro.result()}
+            except Exception as e:
+                resposta = {"erro": str(e)}
+            saida.write(json.dumps(resposta, ensure_ascii=False) + "\n")
+            saida.flush()
+
+    escritor = threading.Thread(target=escrever, name="stdin-writer", daemon=True)
+    escritor.start()
+    for linha in entrada:
+        linha = linha.strip()
+        if not linha:
+            continue
+        try:
+            pendentes.put(batcher.submeter(json.loads(linha)))
+        except json.JSONDecodeError as e:
+            futuro = Future()
+            futuro.set_exception(ValueError(f"JSON inválido: {e}"))
+            pendentes.put(futuro)
+    pendentes.put(None)
+    escritor.join()
+    logger.info(f"Métricas finais: {batcher.metricas()}")
+
+
+def carregar_artefatos() -> tuple:
+    """
+    Carrega o modelo ativo e o pipeline de features salvos.
+    """
+    return carregar_modelo(caminho_modelo_ativo()), carregar_pipeline_features(CAMINHO_PIPELINE)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serviço residente de previsão de preços com micro-batching.")
+    parser.add_argument("--stdin", action="store_true", help="Lê imóveis em JSON-lines da entrada padrão em vez de abrir um servidor HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8000)
+    parser.add_argument("--janela-ms", type=float, default=5.0, help="Janela de agrupamento das requisições, em milissegundos.")
+    parser.add_argument("--tamanho-maximo", type=int, default=512, help="Número máximo de requisições por lote.")
+    parser.add_argument("--cache-tamanho", type=int, default=TAMANHO_PADRAO,
+                        help=f"Entradas do cache LRU de previsões; 0 desativa o cache (padrão: {TAMANHO_PADRAO}).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logger.info("=== Executando prediction_server.py ===")
+    modelo, pipeline = carregar_artefatos()
+    cache = PredictionCache(args.cache_tamanho, arquivos=artefatos_previsao()) if args.cache_tamanho > 0 else None
+
+    batcher = MicroBatcher(modelo, pipeline, args.janela_ms, args.tamanho_maximo, cache=cache,
+                           recarregar=carregar_artefatos, arquivos=artefatos_previsao())
+    if args.stdin:
+        servir_stdin(batcher)
+    else:
+        servir_http(batcher, args.host, args.porta)
+
+
+if __name__ == "__main__":
+    main()
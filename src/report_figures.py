@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+import os
+import json
+import hashlib
+import inspect
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+
+# Configuração do logger
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Acima deste número de pontos, os gráficos de dispersão passam a agregar os pontos em hexágonos
+LIMITE_PONTOS = 5000
+ARQUIVO_MANIFESTO = ".figuras.json"
+ESTILO_PADRAO = {"style": "whitegrid", "context": "notebook"}
+
+
+def ativar_modo_headless() -> None:
+    """
+    Troca o backend do matplotlib por um não interativo (Agg): as figuras são apenas salvas em disco,
+    sem abrir janelas, o que permite gerar os relatórios em servidores sem interface gráfica.
+    """
+    if matplotlib.get_backend().lower() != "agg":
+        plt.switch_backend("Agg")
+
+
+def finalizar_figura(save_path: str = None) -> None:
+    """
+    Salva a figura atual, se houver caminho, exibe-a apenas quando o backend é interativo e a fecha.
+    """
+    if save_path:
+        plt.savefig(save_path)
+    if matplotlib.get_backend().lower() != "agg":
+        plt.show()
+    plt.close()
+
+
+def dispersao(x, y, limite: int = LIMITE_PONTOS, **kwargs) -> None:
+    """
+    Gráfico de dispersão de `x` contra `y`; com mais de `limite` pontos, agrega-os em hexágonos com a
+    contagem em escala logarítmica, evitando desenhar (e sobrepor) cada ponto individualmente.
+    `kwargs` são repassados ao `sns.scatterplot`.
+    """
+    if len(x) > limite:
+        plt.hexbin(x, y, gridsize=80, bins='log', mincnt=1, cmap='viridis')
+        plt.colorbar(label="Contagem")
+    else:
+        sns.scatterplot(x=x, y=y, **kwargs)
+
+
+def _hash_entrada(valor, h) -> None:
+    if isinstance(valor, pd.DataFrame):
+        h.update(json.dumps([str(c) for c in valor.columns]).encode('utf-8'))
+        h.update(pd.util.hash_pandas_object(valor, index=False).to_numpy().tobytes())
+    elif isinstance(valor, pd.Series):
+        h.update(str(valor.name).encode('utf-8'))
+        h.update(pd.util.hash_pandas_object(valor, index=False).to_numpy().tobytes())
+    elif isinstance(valor, np.ndarray):
+        h.update(str(valor.dtype).encode('utf-8'))
+        h.update(np.ascontiguousarray(valor).tobytes())
+    else:
+        h.update(repr(valor).encode('utf-8'))
+
+
+def chave_figura(funcao, args=(), kwargs=None) -> str:
+    """
+    Hash dos dados de entrada, dos parâmetros e do código-fonte da função que desenha a figura.
+    """
+    h = hashlib.sha256()
+    h.update(inspect.getsource(funcao).encode('utf-8'))
+    for valor in args:
+        _hash_entrada(valor, h)
+    for nome, valor in sorted((kwargs or {}).items()):
+        h.update(nome.encode('utf-8'))
+        _hash_entrada(valor, h)
+    return h.hexdigest()
+
+
+def _iniciar_processo(estilo: dict) -> None:
+    ativar_modo_headless()
+    sns.set(**estilo)
+
+
+def _desenhar(tarefa) -> str:
+    funcao, args, kwargs, caminho = tarefa
+    funcao(*args, save_path=caminho, **kwargs)
+    plt.close('all')
+    return caminho
+
+
+def renderizar_figuras(tarefas, diretorio: str, processos: int = None, estilo: dict = None,
+                       reaproveitar: bool = True) -> dict:
+    """
+    Gera, no modo headless, as figuras independentes descritas em `tarefas`, uma lista de tuplas
+    (funcao, args, kwargs, nome_arquivo): cada figura é desenhada por `funcao(*args, save_path=..., **kwargs)`
+    e salva em `diretorio`. As tarefas são distribuídas em até `processos` processos (padrão: o número de CPUs).
+
+    A chave de cada figura (dados de entrada, parâmetros e código da função) é registrada em um manifesto
+    no próprio diretório; com `reaproveitar`, figuras cuja chave não mudou e cujo arquivo ainda existe
+    não são redesenhadas. Para reduzir a cópia entre processos, cada tarefa deve receber apenas as colunas
+    que usa. Retorna um dicionário nome_arquivo -> caminho.
+    """
+    ativar_modo_headless()
+    estilo = estilo if estilo is not None else ESTILO_PADRAO
+    os.makedirs(diretorio, exist_ok=True)
+    caminho_manifesto = os.path.join(diretorio, ARQUIVO_MANIFESTO)
+    manifesto = {}
+    if reaproveitar and os.path.exists(caminho_manifesto):
+        try:
+            with open(caminho_manifesto, 'r', encoding='utf-8') as f:
+                manifesto = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Manifesto de figuras ignorado ({caminho_manifesto}): {e}")
+
+    caminhos, pendentes, chaves = {}, [], {}
+    for funcao, args, kwargs, nome in tarefas:
+        caminho = os.path.join(diretorio, nome)
+        caminhos[nome] = caminho
+        chaves[nome] = chave_figura(funcao, args, kwargs)
+        if manifesto.get(nome) == chaves[nome] and os.path.exists(caminho):
+            continue
+        pendentes.append((funcao, args, kwargs, caminho))
+
+    processos = min(processos or os.cpu_count() or 1, len(pendentes))
+    if processos > 1:
+        with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_processo, initargs=(estilo,)) as executor:
+            list(executor.map(_desenhar, pendentes))
+    elif pendentes:
+        with sns.axes_style(estilo.get("style")), sns.plotting_context(estilo.get("context")):
+            for tarefa in pendentes:
+                _desenhar(tarefa)
+
+    manifesto.update(chaves)
+    with open(caminho_manifesto, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=4)
+    logger.info(f"Figuras em {diretorio}: {len(pendentes)} geradas, {len(tarefas) - len(pendentes)} reaproveitadas "
+                f"({max(processos, 1)} processo(s)).")
+    return caminhos
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+import numpy as np
+import pandas as pd
+
+
+class QuantileSketch:
+    """
+    Sketch mesclável de quantis aproximados (compactação no estilo KLL).
+
+    Os valores entram no nível 0; quando um nível excede `k` itens, ele é ordenado e metade dos itens
+    (posições pares ou ímpares, escolhidas ao acaso) é promovida ao nível seguinte com o dobro do peso.
+    A memória fica limitada a O(k log(n/k)) e, enquanto nenhum nível for compactado, os quantis são exatos.
+    """
+
+    def __init__(self, k: int = 4096, seed: int = 0):
+        self.k = k
+        self.n = 0
+        self.niveis = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def atualizar(self, valores) -> None:
+        valores = np.asarray(valores, dtype=float).ravel()
+        valores = valores[~np.isnan(valores)]
+        if valores.size == 0:
+            return
+        self.n += valores.size
+        self.niveis[0] = np.concatenate([self.niveis[0], valores])
+        self._compactar()
+
+    def mesclar(self, outro: "QuantileSketch") -> None:
+        while len(self.niveis) < len(outro.niveis):
+            self.niveis.append(np.empty(0))
+        for nivel, itens in enumerate(outro.niveis):
+            self.niveis[nivel] = np.concatenate([self.niveis[nivel], itens])
+        self.n += outro.n
+        self._compactar()
+
+    def _compactar(self) -> None:
+        nivel = 0
+        while nivel < len(self.niveis):
+            itens = self.niveis[nivel]
+            if itens.size > self.k:
+                itens = np.sort(itens)
+                # Com quantidade ímpar, o último item permanece no nível atual
+                resto = itens[itens.size - itens.size % 2:]
+                pares = itens[:itens.size - itens.size % 2]
+                promovidos = pares[self._rng.integers(2)::2]
+                self.niveis[nivel] = resto
+                if nivel + 1 == len(self.niveis):
+                    self.niveis.append(np.empty(0))
+                self.niveis[nivel + 1] = np.concatenate([self.niveis[nivel + 1], promovidos])
+            nivel += 1
+
+    def itens(self) -> (np.ndarray, np.ndarray):
+        """
+        Retorna os itens retidos e seus pesos.
+        """
+        valores = np.concatenate(self.niveis)
+        pesos = np.concatenate([np.full(itens.size, 2 ** nivel, dtype=float) for nivel, itens in enumerate(self.niveis)])
+        return valores, pesos
+
+    def quantil(self, q, extras: dict = None):
+        """
+        Estima o(s) quantil(is) `q`. `extras` permite acrescentar valores com peso arbitrário
+        (ex.: {mediana: n_ausentes}) sem alterar o sketch.
+        """
+        valores, pesos = self.itens()
+        if extras:
+            valores = np.concatenate([valores, np.array(list(extras.keys()), dtype=float)])
+            pesos = np.concatenate([pesos, np.array(list(extras.values()), dtype=float)])
+        if valores.size == 0:
+            return np.nan if np.isscalar(q) else np.full(len(q), np.nan)
+        return quantil_ponderado(valores, pesos, q)
+
+
+def quantil_ponderado(valores: np.ndarray, pesos: np.ndarray, q):
+    """
+    Quantil com interpolação linear sobre valores ponderados. Com pesos inteiros, equivale ao
+    quantil linear (padrão do pandas) sobre os valores repetidos conforme seus pesos.
+    """
+    ordem = np.argsort(valores, kind='stable')
+    valores = valores[ordem]
+    acumulado = np.cumsum(pesos[ordem])
+    total = acumulado[-1]
+    # Posição (base 0) do quantil na sequência expandida e os valores vizinhos
+    posicao = np.asarray(q, dtype=float) * (total - 1)
+    inferior = np.floor(posicao)
+    fracao = posicao - inferior
+    idx_inferior = np.searchsorted(acumulado, inferior, side='right')
+    idx_superior = np.searchsorted(acumulado, np.minimum(inferior + 1, total - 1), side='right')
+    resultado = valores[idx_inferior] + fracao * (valores[idx_superior] - valores[idx_inferior])
+    return float(resultado) if np.ndim(resultado) == 0 else resultado
+
+
+class FrequencySketch:
+    """
+    Sketch mesclável de frequências (Misra-Gries) com no máximo `capacidade` contadores.
+    Enquanto o número de valores distintos não excede a capacidade, as contagens são exatas.
+    """
+
+    def __init__(self, capacidade: int = 4096):
+        self.capacidade = capacidade
+        self.contagens = {}
+        self.n = 0
+        self.exato = True
+
+    def atualizar(self, valores) -> None:
+        contagens = pd.Series(valores).value_counts(dropna=True)
+        self.n += int(contagens.sum())
+        self._somar(contagens.to_dict())
+
+    def mesclar(self, outro: "FrequencySketch") -> None:
+        self.n += outro.n
+        self.exato = self.exato and outro.exato
+        self._somar(outro.contagens)
+
+    def _somar(self, contagens: dict) -> None:
+        for valor, contagem in contagens.items():
+            self.contagens[valor] = self.contagens.get(valor, 0) + int(contagem)
+        if len(self.contagens) > self.capacidade:
+            # Subtrai a (capacidade + 1)-ésima maior contagem de todos os contadores e descarta os não positivos
+            limiar = sorted(self.contagens.values(), reverse=True)[self.capacidade]
+            self.contagens = {valor: c - limiar for valor, c in self.contagens.items() if c > limiar}
+            self.exato = False
+
+    def moda(self):
+        """
+        Retorna o valor mais frequente; em caso de empate, o menor valor (como em pandas.Series.mode).
+        """
+        if not self.contagens:
+            return np.nan
+        maximo = max(self.contagens.values())
+        candidatos = [valor for valor, c in self.contagens.items() if c == maximo]
+        try:
+            return min(candidatos)
+        except TypeError:
+            return min(candidatos, key=str)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+import math
+import logging
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Configuração do logger
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+RAIO_TERRA_KM = 6371.0
+RAIO_PADRAO_KM = 1.0
+K_PADRAO = 10
+COLUNAS_ESPACIAIS = ["anuncios_no_raio", "distancia_media_vizinhos", "preco_mediano_vizinhos"]
+
+
+class SpatialIndex:
+    """
+    Índice espacial sobre as coordenadas dos anúncios de treino, guardado no pipeline de features.
+    As coordenadas são projetadas na esfera unitária e indexadas em uma KD-tree: a distância euclidiana
+    (corda) cresce junto com a de Haversine, então vizinhos e raios são os mesmos, com consultas bem mais
+    baratas que as da BallTree do scikit-learn. Para cada imóvel, calcula:
+    - anuncios_no_raio: anúncios de treino a até `raio_km` quilômetros;
+    - distancia_media_vizinhos: distância média, em km, aos `k` anúncios mais próximos;
+    - preco_mediano_vizinhos: mediana do price_log desses `k` vizinhos.
+
+    No ajuste, as features dos próprios anúncios de treino são calculadas deixando cada anúncio de fora
+    (leave-one-out), para que o preço de um anúncio não entre nas suas próprias features. Construção e
+    consultas custam O(n log n); a consulta de um único imóvel leva microssegundos.
+    """
+
+    def __init__(self, raio_km: float = RAIO_PADRAO_KM, k: int = K_PADRAO):
+        self.raio_km = raio_km
+        self.k = k
+
+    @staticmethod
+    def _coordenadas(latitude, longitude) -> (np.ndarray, np.ndarray):
+        latitude = np.radians(np.asarray(latitude, dtype=np.float64))
+        longitude = np.radians(np.asarray(longitude, dtype=np.float64))
+        pontos = np.column_stack([np.cos(latitude) * np.cos(longitude), np.cos(latitude) * np.sin(longitude),
+                                  np.sin(latitude)])
+        return pontos, np.isfinite(pontos).all(axis=1)
+
+    @staticmethod
+    def _corda(distancia_km):
+        return 2 * np.sin(distancia_km / RAIO_TERRA_KM / 2)
+
+    @staticmethod
+    def _quilometros(corda):
+        return 2 * np.arcsin(np.minimum(corda / 2, 1.0)) * RAIO_TERRA_KM
+
+    def ajustar(self, latitude, longitude, preco_log) -> np.ndarray:
+        """
+        Constrói o índice com os anúncios de coordenadas válidas e retorna as features leave-one-out
+        de todos eles, com formato (n, 3); linhas sem coordenadas ficam com NaN.
+        """
+        pontos, validos = self._coordenadas(latitude, longitude)
+        self.arvore_ = cKDTree(pontos[validos])
+        self.precos_ = np.asarray(preco_log, dtype=np.float64)[validos]
+        self.n_anuncios_ = int(validos.sum())
+
+        features = np.full((len(pontos), len(COLUNAS_ESPACIAIS)), np.nan)
+        k = min(self.k, self.n_anuncios_ - 1)
+        if k < 1:
+            return features
+        distancias, vizinhos = self.arvore_.query(pontos[validos], k=k + 1)
+        # Remove o próprio anúncio de cada linha; com muitos empates em distância zero ele pode não
+        # aparecer entre os k + 1, e então o vizinho mais distante é descartado
+        outros = vizinhos != np.arange(self.n_anuncios_)[:, None]
+        sem_proprio = outros.all(axis=1)
+        outros[sem_proprio, -1] = False
+        distancias = distancias[outros].reshape(-1, k)
+        vizinhos = vizinhos[outros].reshape(-1, k)
+        contagens = self.arvore_.query_ball_point(pontos[validos], self._corda(self.raio_km), return_length=True) - 1
+        features[validos] = np.column_stack([contagens, self._quilometros(distancias).mean(axis=1),
+                                             np.median(self.precos_[vizinhos], axis=1)])
+        logger.info(f"Índice espacial ajustado com {self.n_anuncios_} anúncios "
+                    f"(raio de {self.raio_km} km, {k} vizinhos).")
+        return features
+
+    def calcular(self, latitude, longitude) -> np.ndarray:
+        """
+        Calcula as features espaciais de novos imóveis em relação aos anúncios de treino, com formato (n, 3).
+        """
+        pontos, validos = self._coordenadas(latitude, longitude)
+        features = np.full((len(pontos), len(COLUNAS_ESPACIAIS)), np.nan)
+        k = min(self.k, self.n_anuncios_)
+        if not validos.any() or k < 1:
+            return features
+        distancias, vizinhos = self.arvore_.query(pontos[validos], k=[k] if k == 1 else k)
+        contagens = self.arvore_.query_ball_point(pontos[validos], self._corda(self.raio_km), return_length=True)
+        features[validos] = np.column_stack([contagens, self._quilometros(distancias).mean(axis=1),
+                                             np.median(self.precos_[vizinhos], axis=1)])
+        return features
+
+    def calcular_um(self, latitude: float, longitude: float) -> np.ndarray:
+        """
+        Versão de `calcular` para um único imóvel, sem montar matrizes; retorna as 3 features.
+        """
+        if latitude is None or longitude is None or not (math.isfinite(latitude) and math.isfinite(longitude)):
+            return np.full(len(COLUNAS_ESPACIAIS), np.nan)
+        latitude, longitude = math.radians(latitude), math.radians(longitude)
+        ponto = np.array([math.cos(latitude) * math.cos(longitude), math.cos(latitude) * math.sin(longitude),
+                          math.sin(latitude)])
+        k = min(self.k, self.n_anuncios_)
+        distancias, vizinhos = self.arvore_.query(ponto, k=[k] if k == 1 else k, workers=1)
+        contagem = self.arvore_.query_ball_point(ponto, self._corda(self.raio_km), return_length=True)
+        # Mediana pelos valores centrais ordenados, com a mesma aritmética de np.median
+        precos = np.sort(self.precos_[vizinhos])
+        mediana = precos[k // 2] if k % 2 else (precos[k // 2 - 1] + precos[k // 2]) / 2
+        return np.array([contagem, self._quilometros(distancias).mean(), mediana])
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+import os
+import sys
+import json
+import time
+import glob
+import hashlib
+import inspect
+import logging
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+
+# Configuração do logger
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DIRETORIO_CACHE_PADRAO = os.path.join(".cache", "pipeline")
+
+
+def hash_arquivo(caminho: str, tamanho_bloco: int = 1 << 20) -> str:
+    """
+    Calcula o hash SHA-256 do conteúdo de um arquivo, lendo-o em blocos.
+    """
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def listar_arquivos(caminhos) -> list:
+    """
+    Expande a lista de caminhos, substituindo diretórios por todos os arquivos que contêm.
+    """
+    arquivos = []
+    for caminho in caminhos:
+        if os.path.isdir(caminho):
+            arquivos.extend(sorted(p for p in glob.glob(os.path.join(caminho, "**", "*"), recursive=True) if os.path.isfile(p)))
+        else:
+            arquivos.append(caminho)
+    return arquivos
+
+
+def impressao_digital(caminho: str):
+    """
+    Identifica a versão de um artefato gerado pelo tamanho e pela data de modificação,
+    sem precisar ler o arquivo inteiro.
+    """
+    if not os.path.exists(caminho):
+        return None
+    info = os.stat(caminho)
+    return [info.st_size, info.st_mtime_ns]
+
+
+class StageCache:
+    """
+    Cache endereçado por conteúdo das etapas do pipeline.
+
+    A chave de cada etapa é o hash dos seus arquivos de entrada, do código-fonte do módulo, dos
+    parâmetros, das versões das bibliotecas e das chaves das etapas das quais depende. Se a chave coincidir
+    com a registrada no manifesto e os artefatos gerados continuarem intactos em disco, a etapa é reaproveitada.
+    """
+
+    def __init__(self, diretorio: str = DIRETORIO_CACHE_PADRAO, forcar=()):
+        self.diretorio = diretorio
+        self.forcar = set(forcar)
+        self.caminho_manifesto = os.path.join(diretorio, "manifest.json")
+        self.manifesto = self._ler_manifesto()
+        self.resultados = {}
+
+    def _ler_manifesto(self) -> dict:
+        if not os.path.exists(self.caminho_manifesto):
+            return {}
+        try:
+            with open(self.caminho_manifesto, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Manifesto do cache ignorado ({self.caminho_manifesto}): {e}")
+            return {}
+
+    def _salvar_manifesto(self) -> None:
+        os.makedirs(self.diretorio, exist_ok=True)
+        temporario = self.caminho_manifesto + ".tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(self.manifesto, f, indent=4)
+        os.replace(temporario, self.caminho_manifesto)
+
+    def chave(self, etapa: str, arquivos=(), modulos=(), parametros: dict = None, dependencias=()) -> str:
+        """
+        Calcula a chave da etapa a partir das suas entradas.
+        """
+        conteudo = {
+            "etapa": etapa,
+            "arquivos": {caminho: hash_arquivo(caminho) for caminho in listar_arquivos(arquivos)},
+            "codigo": {modulo.__name__: hash_arquivo(inspect.getsourcefile(modulo)) for modulo in modulos},
+            "parametros": parametros or {},
+            "dependencias": list(dependencias),
+            "versoes": {
+                "python": sys.version.split()[0],
+                "numpy": np.__version__,
+                "pandas": pd.__version__,
+                "sklearn": sklearn.__version__,
+            },
+        }
+        return hashlib.sha256(json.dumps(conteudo, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def _caminho_saida(self, etapa: str, chave: str) -> str:
+        return os.path.join(self.diretorio, f"{etapa}-{chave[:16]}.joblib")
+
+    def buscar(self, etapa: str, chave: str):
+        """
+        Retorna (True, saída) se a etapa puder ser reaproveitada, ou (False, None) caso contrário.
+        """
+        if etapa in self.forcar or "all" in self.forcar:
+            return False, None
+        registro = self.manifesto.get(etapa)
+        if not registro or registro.get("chave") != chave:
+            return False, None
+        for caminho, digital in registro.get("artefatos", {}).items():
+            if impressao_digital(caminho) != digital:
+                logger.info(f"Cache da etapa '{etapa}' invalidado: artefato alterado ou ausente ({caminho}).")
+                return False, None
+        caminho_saida = registro.get("saida")
+        if caminho_saida is None:
+            return True, None
+        if not os.path.exists(caminho_saida):
+            return False, None
+        return True, joblib.load(caminho_saida)
+
+    def registrar(self, etapa: str, chave: str, saida, duracao: float, artefatos=()) -> None:
+        """
+        Registra a execução de uma etapa: guarda a saída, as impressões digitais dos artefatos e a duração.
+        """
+        anterior = self.manifesto.get(etapa, {}).get("saida")
+        caminho_saida = None
+        if saida is not None:
+            os.makedirs(self.diretorio, exist_ok=True)
+            caminho_saida = self._caminho_saida(etapa, chave)
+            joblib.dump(saida, caminho_saida)
+        if anterior and anterior != caminho_saida and os.path.exists(anterior):
+            os.remove(anterior)
+        self.manifesto[etapa] = {
+            "chave": chave,
+            "saida": caminho_saida,
+            "artefatos": {caminho: impressao_digital(caminho) for caminho in listar_arquivos(artefatos)},
+            "duracao_s": duracao,
+            "timestamp": time.time(),
+        }
+        self._salvar_manifesto()
+        self.resultados[etapa] = ("recalculado", duracao)
+
+    def marcar_reaproveitado(self, etapa: str) -> None:
+        self.resultados[etapa] = ("reaproveitado", self.manifesto[etapa]["duracao_s"])
+        logger.info(f"Etapa '{etapa}' reaproveitada do cache.")
+
+    def executar(self, etapa: str, chave: str, funcao, artefatos=()):
+        """
+        Executa a etapa somente se não houver resultado válido em cache, retornando sua saída.
+        """
+        encontrado, saida = self.buscar(etapa, chave)
+        if encontrado:
+            self.marcar_reaproveitado(etapa)
+            return saida
+        inicio = time.perf_counter()
+        saida = funcao()
+        self.registrar(etapa, chave, saida, time.perf_counter() - inicio, artefatos)
+        return saida
+
+    def resumo(self) -> str:
+        """
+        Resume quais etapas foram reaproveitadas ou recalculadas e o tempo economizado.
+        """
+        linhas = ["Resumo do cache de etapas:"]
+        economizado = 0.0
+        for etapa, (situacao, duracao) in self.resultados.items():
+            if situacao == "reaproveitado":
+                economizado += duracao
+                linhas.append(f" - {etapa}: reaproveitado (economizou {duracao:.2f}s)")
+            else:
+                linhas.append(f" - {etapa}: recalculado em {duracao:.2f}s")
+        linhas.append(f"Tempo economizado: {economizado:.2f}s")
+        return "\n".join(linhas)
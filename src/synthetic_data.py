@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+import os
+import argparse
+import logging
+
+import numpy as np
+import pandas as pd
+
+# Configuração do logger
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Bairros com o centro aproximado (latitude, longitude), o raio de dispersão em graus e o peso relativo
+# de anúncios, seguindo a distribuição do dataset original
+BAIRROS = [
+    ("Manhattan", "Harlem", 40.8116, -73.9465, 0.012, 2658),
+    ("Manhattan", "Upper West Side", 40.7870, -73.9754, 0.010, 1971),
+    ("Manhattan", "Hell's Kitchen", 40.7638, -73.9918, 0.006, 1958),
+    ("Manhattan", "East Village", 40.7265, -73.9815, 0.005, 1853),
+    ("Manhattan", "Upper East Side", 40.7736, -73.9566, 0.009, 1798),
+    ("Manhattan", "Midtown", 40.7549, -73.9840, 0.006, 1545),
+    ("Manhattan", "East Harlem", 40.7957, -73.9389, 0.007, 1117),
+    ("Manhattan", "Chelsea", 40.7465, -74.0014, 0.005, 1113),
+    ("Manhattan", "Lower East Side", 40.7150, -73.9843, 0.004, 911),
+    ("Manhattan", "Washington Heights", 40.8417, -73.9394, 0.010, 899),
+    ("Brooklyn", "Williamsburg", 40.7081, -73.9571, 0.010, 3920),
+    ("Brooklyn", "Bedford-Stuyvesant", 40.6872, -73.9418, 0.010, 3714),
+    ("Brooklyn", "Bushwick", 40.6958, -73.9171, 0.009, 2465),
+    ("Brooklyn", "Crown Heights", 40.6694, -73.9422, 0.009, 1564),
+    ("Brooklyn", "Greenpoint", 40.7305, -73.9515, 0.006, 1115),
+    ("Brooklyn", "Flatbush", 40.6415, -73.9594, 0.009, 621),
+    ("Brooklyn", "Clinton Hill", 40.6897, -73.9661, 0.004, 572),
+    ("Brooklyn", "Park Slope", 40.6710, -73.9814, 0.006, 506),
+    ("Queens", "Astoria", 40.7644, -73.9235, 0.009, 1400),
+    ("Queens", "Long Island City", 40.7447, -73.9485, 0.008, 900),
+    ("Queens", "Flushing", 40.7675, -73.8331, 0.010, 800),
+    ("Queens", "Ridgewood", 40.7043, -73.9018, 0.007, 700),
+    ("Queens", "Jamaica", 40.7027, -73.7890, 0.012, 400),
+    ("Bronx", "Mott Haven", 40.8091, -73.9229, 0.006, 300),
+    ("Bronx", "Concourse", 40.8275, -73.9235, 0.006, 250),
+    ("Bronx", "Fordham", 40.8616, -73.8904, 0.008, 230),
+    ("Staten Island", "St. George", 40.6437, -74.0736, 0.008, 150),
+    ("Staten Island", "Tompkinsville", 40.6363, -74.0837, 0.008, 140),
+]
+
+TIPOS_QUARTO = ["Entire home/apt", "Private room", "Shared room"]
+PROPORCOES_QUARTO = [0.52, 0.457, 0.023]
+# Mediana do preço por tipo de quarto e fator multiplicativo por bairro_group
+PRECO_MEDIANO_QUARTO = {"Entire home/apt": 160.0, "Private room": 70.0, "Shared room": 45.0}
+FATOR_PRECO_GRUPO = {"Manhattan": 1.3, "Brooklyn": 0.95, "Queens": 0.8, "Bronx": 0.7, "Staten Island": 0.75}
+
+PALAVRAS_NOME = ["Cozy", "Sunny", "Spacious", "Bright", "Charming", "Modern", "Quiet", "Private", "Large",
+                 "Beautiful", "Luxury", "Room", "Loft", "Studio", "Apartment", "Bedroom", "Home", "Suite",
+                 "near", "Park", "Subway", "View", "Williamsburg", "Manhattan", "Brooklyn", "Central"]
+NOMES_ANFITRIAO = ["Michael", "David", "John", "Alex", "Sarah", "Maria", "Daniel", "Jessica", "Anna",
+                   "Sonder (NYC)", "Blueground", "Kara", "Jennifer", "Chris", "Laura"]
+DATA_REFERENCIA = pd.Timestamp("2019-07-08")
+
+
+def gerar_anuncios(n: int, semente: int = 42) -> pd.DataFrame:
+    """
+    Gera `n` anúncios sintéticos com o mesmo esquema do arquivo bruto (teste_indicium_precificacao.csv)
+    e distribuições próximas às do dataset real: proporções de bairros e tipos de quarto, coordenadas
+    em torno do centro de cada bairro, preço log-normal dependente do tipo de quarto e da região (com
+    alguns preços zerados e outliers), cauda longa em noites mínimas e reviews, e cerca de 20% de anúncios
+    sem reviews (com 'ultima_review' e 'reviews_por_mes' ausentes). Toda a geração é vetorizada.
+    """
+    rng = np.random.default_rng(semente)
+    grupos, bairros, latitudes, longitudes, raios, pesos = (np.array(coluna) for coluna in zip(*BAIRROS))
+    pesos = pesos.astype(np.float64) / pesos.sum()
+    indice = rng.choice(len(BAIRROS), size=n, p=pesos)
+    bairro_group = grupos[indice]
+    raio = raios[indice].astype(np.float64)
+    latitude = latitudes[indice].astype(np.float64) + rng.normal(0, 1, n) * raio
+    longitude = longitudes[indice].astype(np.float64) + rng.normal(0, 1, n) * raio * 1.3
+
+    room_type = np.array(TIPOS_QUARTO)[rng.choice(len(TIPOS_QUARTO), size=n, p=PROPORCOES_QUARTO)]
+    mediana = pd.Series(room_type).map(PRECO_MEDIANO_QUARTO).to_numpy() * \
+        pd.Series(bairro_group).map(FATOR_PRECO_GRUPO).to_numpy()
+    price = np.round(mediana * np.exp(rng.normal(0, 0.55, n))).astype(np.int64)
+    price[rng.random(n) < 0.0003] = 0
+    outliers = rng.random(n) < 0.002
+    price[outliers] = rng.integers(1000, 10001, outliers.sum())
+
+    minimo_noites = np.minimum(rng.geometric(0.3, n), 365)
+    minimo_noites[rng.random(n) < 0.08] = 30
+    longas = rng.random(n) < 0.01
+    minimo_noites[longas] = rng.integers(31, 366, longas.sum())
+    numero_de_reviews = rng.negative_binomial(0.6, 0.025, n)
+    sem_reviews = rng.random(n) < 0.12
+    numero_de_reviews[sem_reviews] = 0
+    sem_reviews |= numero_de_reviews == 0
+    dias = rng.exponential(250, n).astype(np.int64).clip(0, 3000)
+    ultima_review = (DATA_REFERENCIA - pd.to_timedelta(dias, unit="D")).strftime("%Y-%m-%d").to_numpy(dtype=object)
+    ultima_review[sem_reviews] = None
+    reviews_por_mes = np.round(rng.gamma(0.9, 1.5, n), 2).clip(0.01, 58.5)
+    reviews_por_mes[sem_reviews] = np.nan
+
+    palavras = np.array(PALAVRAS_NOME, dtype=object)
+    nome = pd.Series(palavras[rng.integers(0, len(palavras), n)]) + " " + palavras[rng.integers(0, len(palavras), n)] \
+        + " " + palavras[rng.integers(0, len(palavras), n)]
+    nome[rng.random(n) < 0.0003] = None
+    host_name = pd.Series(np.array(NOMES_ANFITRIAO, dtype=object)[rng.integers(0, len(NOMES_ANFITRIAO), n)])
+    host_name[rng.random(n) < 0.0004] = None
+
+    disponibilidade_365 = rng.integers(0, 366, n)
+    disponibilidade_365[rng.random(n) < 0.36] = 0
+
+    df = pd.DataFrame({
+        "id": np.arange(2595, 2595 + n, dtype=np.int64),
+        "nome": nome,
+        "host_id": rng.integers(2000, 275_000_000, n),
+        "host_name": host_name,
+        "bairro_group": bairro_group,
+        "bairro": bairros[indice],
+        "latitude": latitude,
+        "longitude": longitude,
+        "room_type": room_type,
+        "price": price,
+        "minimo_noites": minimo_noites,
+        "numero_de_reviews": numero_de_reviews,
+        "ultima_review": ultima_review,
+        "reviews_por_mes": reviews_por_mes,
+        "calculado_host_listings_count": np.minimum(rng.zipf(2.2, n), 327),
+        "disponibilidade_365": disponibilidade_365,
+    })
+    logger.info(f"{n} anúncios sintéticos gerados (semente {semente}).")
+    return df
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Gera anúncios sintéticos com o esquema do dataset de Nova York.")
+    parser.add_argument("linhas", type=int, help="Número de anúncios a gerar.")
+    parser.add_argument("--saida", default=os.path.join("data", "raw", "anuncios_sinteticos.csv"),
+                        help="Arquivo CSV de saída.")
+    parser.add_argument("--semente", type=int, default=42)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    df = gerar_anuncios(args.linhas, args.semente)
+    os.makedirs(os.path.dirname(args.saida) or ".", exist_ok=True)
+    df.to_csv(args.saida, index=False)
+    logger.info(f"Anúncios sintéticos salvos em: {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
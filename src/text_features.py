@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+import logging
+from functools import lru_cache
+from datetime import datetime, date
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.utils import murmurhash3_32
+
+# Configuração do logger
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+COLUNAS_RECENCIA = ["dias_desde_ultima_review", "ano_ultima_review", "mes_ultima_review"]
+# Largura do hash das palavras do título, grande o bastante para que palavras distintas quase nunca
+# colidam; só as `N_PALAVRAS_PADRAO` posições mais frequentes no treino viram colunas densas
+N_HASH_PADRAO = 2 ** 18
+N_PALAVRAS_PADRAO = 32
+TAMANHO_BLOCO_PADRAO = 100000
+# Datas e palavras já interpretadas na previsão individual (as datas de review se repetem muito entre imóveis)
+TAMANHO_MEMO_DATAS = 8192
+TAMANHO_MEMO_PALAVRAS = 65536
+FORMATO_DATA = "%Y-%m-%d"
+# Valor das features de recência dos anúncios sem review (ou com data inválida)
+SEM_REVIEW = -1
+
+
+class TextDateFeatures:
+    """
+    Features do título (`nome`) e da data da última review (`ultima_review`), guardadas no pipeline de features:
+    - recência: dias entre a última review e a data de referência (a review mais recente do treino, fixada
+      no ajuste para que a previsão reproduza o treino), ano e mês da última review. A data é interpretada
+      uma única vez, de forma vetorizada; anúncios sem reviews (`numero_de_reviews` igual a 0, cuja data
+      foi imputada no pré-processamento) e datas inválidas recebem `SEM_REVIEW`;
+    - título: presença das palavras do `nome` em um vetor esparso de largura `n_hash`, pelo hashing trick
+      (HashingVectorizer do scikit-learn). A largura é grande para evitar colisões entre palavras, mas os
+      modelos treinam sobre uma matriz densa, então só as `n_palavras` posições presentes em mais títulos
+      do ajuste viram colunas, e as demais palavras são descartadas. Essas posições (`posicoes_`) são um
+      vocabulário de posições de hash, de tamanho fixo: as palavras em si não são guardadas, e a memória
+      não cresce com o corpus.
+
+    Acima de `tamanho_bloco` linhas, a transformação é feita em blocos, em paralelo com `n_jobs` processos.
+    """
+
+    def __init__(self, n_hash: int = N_HASH_PADRAO, n_palavras: int = N_PALAVRAS_PADRAO,
+                 tamanho_bloco: int = TAMANHO_BLOCO_PADRAO, n_jobs: int = 1):
+        self.n_hash = n_hash
+        self.n_palavras = n_palavras
+        self.tamanho_bloco = tamanho_bloco
+        self.n_jobs = n_jobs
+        self._vetorizador = HashingVectorizer(n_features=n_hash, alternate_sign=False, norm=None, binary=True,
+                                              strip_accents="unicode", dtype=np.float32)
+        self._analisador = None
+        self._recencia_data = None
+        self._posicao_palavra = None
+        # Posições do hash mantidas como colunas (todas, nos pipelines salvos antes da seleção)
+        self.posicoes_ = None
+        self._coluna_posicao = None
+
+    def __getstate__(self):
+        # O analisador do vetorizador e as memórias da previsão individual são recriados após a carga
+        estado = self.__dict__.copy()
+        estado.update(_analisador=None, _recencia_data=None, _posicao_palavra=None, _coluna_posicao=None)
+        return estado
+
+    def ajustar(self, df: pd.DataFrame) -> "TextDateFeatures":
+        """
+        Fixa a data de referência da recência (a última review mais recente de `df`) e as posições do hash
+        mantidas como colunas: as `n_palavras` presentes em mais títulos de `df`, da mais à menos frequente.
+        """
+        datas = self._datas(df)
+        self.referencia_ = datas.max() if datas.notna().any() else pd.Timestamp(date.today())
+        frequencias = np.asarray(self._vetorizador.transform(self._nomes(df)).sum(axis=0)).ravel()
+        presentes = np.flatnonzero(frequencias)
+        self.posicoes_ = presentes[np.argsort(-frequencias[presentes], kind="stable")[:self.n_palavras]]
+        logger.info(f"Features de texto e data ajustadas (referência {self.referencia_.date()}, {len(self.posicoes_)} de "
+                    f"{len(presentes)} posições de hash ocupadas).")
+        return self
+
+    def _posicoes(self) -> np.ndarray:
+        return self.posicoes_ if getattr(self, "posicoes_", None) is not None else np.arange(self.n_hash)
+
+    def nomes_colunas(self) -> list:
+        return COLUNAS_RECENCIA + [f"nome_hash_{i:02d}" for i in range(len(self._posicoes()))]
+
+    @staticmethod
+    def _datas(df: pd.DataFrame) -> pd.Series:
+        if 'ultima_review' not in df.columns:
+            return pd.Series(pd.NaT, index=df.index)
+        datas = pd.to_datetime(df['ultima_review'], format=FORMATO_DATA, errors='coerce')
+        if 'numero_de_reviews' in df.columns:
+            datas = datas.mask(df['numero_de_reviews'].to_numpy() == 0)
+        return datas
+
+    def _recencia(self, df: pd.DataFrame) -> np.ndarray:
+        datas = self._datas(df)
+        validas = datas.notna().to_numpy()
+        recencia = np.full((len(df), len(COLUNAS_RECENCIA)), SEM_REVIEW, dtype=np.int32)
+        recencia[validas, 0] = (self.referencia_ - datas[validas]).dt.days.to_numpy()
+        recencia[validas, 1] = datas[validas].dt.year.to_numpy()
+        recencia[validas, 2] = datas[validas].dt.month.to_numpy()
+        return recencia
+
+    @staticmethod
+    def _nomes(df: pd.DataFrame) -> pd.Series:
+        nomes = df['nome'].astype(object) if 'nome' in df.columns else pd.Series("", index=df.index)
+        return nomes.where(nomes.notna(), "").astype(str)
+
+    def _hash_nome(self, df: pd.DataFrame) -> sparse.csr_matrix:
+        return self._vetorizador.transform(self._nomes(df))[:, self._posicoes()]
+
+    def _transformar_bloco(self, df: pd.DataFrame) -> (np.ndarray, sparse.csr_matrix):
+        return self._recencia(df), self._hash_nome(df)
+
+    def transformar(self, df: pd.DataFrame) -> (np.ndarray, sparse.csr_matrix):
+        """
+        Retorna as features de recência (inteiros, formato (n, 3)) e o hash do título nas posições mantidas
+        (CSR float32, formato (n, n_palavras)).
+        """
+        if len(df) <= self.tamanho_bloco:
+            return self._transformar_bloco(df)
+        blocos = [df.iloc[inicio:inicio + self.tamanho_bloco] for inicio in range(0, len(df), self.tamanho_bloco)]
+        resultados = Parallel(n_jobs=self.n_jobs)(delayed(self._transformar_bloco)(bloco) for bloco in blocos)
+        return (np.concatenate([recencia for recencia, _ in resultados]),
+                sparse.vstack([hashes for _, hashes in resultados], format="csr"))
+
+    def _recencia_um(self, valor) -> tuple:
+        data = None
+        if isinstance(valor, str):
+            try:
+                data = datetime.strptime(valor, FORMATO_DATA)
+            except ValueError:
+                data = None
+        elif isinstance(valor, (datetime, date)):
+            data = valor
+        if data is None:
+            return (SEM_REVIEW,) * len(COLUNAS_RECENCIA)
+        data = pd.Timestamp(data)
+        return ((self.referencia_ - data).days, data.year, data.month)
+
+    def _preparar_memos(self) -> None:
+        if self._analisador is None:
+            self._analisador = self._vetorizador.build_analyzer()
+            self._coluna_posicao = {int(posicao): i for i, posicao in enumerate(self._posicoes())}
+            self._recencia_data = lru_cache(maxsize=TAMANHO_MEMO_DATAS)(self._recencia_um)
+            self._posicao_palavra = lru_cache(maxsize=TAMANHO_MEMO_PALAVRAS)(self._posicao_um)
+
+    def _posicao_um(self, palavra: str) -> int:
+        # Mesmo hash do HashingVectorizer: murmurhash3 da palavra, módulo n_hash; -1 se a posição não é coluna
+        return self._coluna_posicao.get(abs(murmurhash3_32(palavra, positive=False)) % self.n_hash, -1)
+
+    def colunas_nome(self, nome) -> tuple:
+        """
+        Colunas do hash ativadas pelo título de um imóvel, em ordem: tudo o que o título muda nas features.
+        """
+        self._preparar_memos()
+        colunas = {self._posicao_palavra(palavra) for palavra in self._analisador(nome if isinstance(nome, str) else "")}
+        colunas.discard(-1)
+        return tuple(sorted(colunas))
+
+    def colunas_nomes(self, df: pd.DataFrame) -> list:
+        """
+        `colunas_nome` de cada linha de `df`, a partir do hash do lote.
+        """
+        hashes = self._hash_nome(df)
+        hashes.sort_indices()
+        indices, inicios = hashes.indices.tolist(), hashes.indptr.tolist()
+        return [tuple(indices[inicio:fim]) for inicio, fim in zip(inicios[:-1], inicios[1:])]
+
+    def calcular_um(self, dados: dict) -> np.ndarray:
+        """
+        Features de um único imóvel (recência seguida do hash do título), sem criar DataFrames. A recência
+        de cada data e a posição de cada palavra ficam memorizadas, pois se repetem entre imóveis.
+        """
+        self._preparar_memos()
+        recencia = (SEM_REVIEW,) * len(COLUNAS_RECENCIA)
+        if dados.get('numero_de_reviews') != 0:
+            valor = dados.get('ultima_review')
+            if isinstance(valor, (str, datetime, date)):
+                recencia = self._recencia_data(valor)
+        features = np.zeros(len(COLUNAS_RECENCIA) + len(self._coluna_posicao))
+        features[:len(COLUNAS_RECENCIA)] = recencia
+        for coluna in self.colunas_nome(dados.get('nome')):
+            features[len(COLUNAS_RECENCIA) + coluna] = 1.0
+        return features
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from synthetic_data import gerar_anuncios
+from data_processing import tratar_valores_ausentes
+from feature_engineering import (ajustar_pipeline_features, aplicar_pipeline_features, transformar_variavel_alvo,
+                                 ListingEncoder)
+
+
+@pytest.fixture(scope="module")
+def pipeline():
+    df = transformar_variavel_alvo(tratar_valores_ausentes(gerar_anuncios(1500, semente=7)))
+    return ajustar_pipeline_features(df)[1]
+
+
+@pytest.fixture(scope="module")
+def anuncio():
+    return gerar_anuncios(1, semente=11).iloc[0].to_dict()
+
+
+CASOS = {
+    "categoria_nao_vista": {"room_type": "Casa flutuante", "bairro": "Atlântida", "bairro_group": "Nova Jersey"},
+    "sem_ultima_review": {"ultima_review": None, "reviews_por_mes": None},
+    "sem_reviews": {"numero_de_reviews": 0, "ultima_review": None, "reviews_por_mes": None},
+    "nome_vazio": {"nome": ""},
+}
+
+
+@pytest.mark.parametrize("caso", CASOS)
+def test_codificador_igual_ao_pipeline(pipeline, anuncio, caso):
+    dados = {**anuncio, **CASOS[caso]}
+    esperado = aplicar_pipeline_features(pd.DataFrame([dados]), pipeline).to_numpy(dtype=np.float64)
+    np.testing.assert_array_equal(ListingEncoder(pipeline).codificar(dados), esperado)
+
+
+def test_lote_igual_ao_pipeline(pipeline, anuncio):
+    registros = [{**anuncio, **alteracoes} for alteracoes in CASOS.values()]
+    esperado = aplicar_pipeline_features(pd.DataFrame(registros), pipeline).to_numpy(dtype=np.float64)
+    codificador = ListingEncoder(pipeline)
+    np.testing.assert_array_equal(codificador.codificar_lote(registros), esperado)
+    assert codificador.chaves_lote(pd.DataFrame(registros)) == [codificador.chave(dados) for dados in registros]
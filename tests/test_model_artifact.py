@@ -0,0 +1,58 @@
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
+from model_artifact import FlorestaCompacta, salvar_artefato, carregar_artefato
+
+
+@pytest.fixture(scope="module")
+def dados():
+    rng = np.random.default_rng(3)
+    X = pd.DataFrame(rng.normal(size=(600, 6)).astype(np.float32), columns=[f"x{i}" for i in range(6)])
+    y = X["x0"] * 2 + np.sin(X["x1"] * 3) + rng.normal(scale=0.1, size=len(X))
+    # Valores ausentes no treino, para que as árvores aprendam a direção dos NaN
+    X.iloc[rng.integers(0, len(X), 60), 2] = np.nan
+    return X, y
+
+
+@pytest.fixture(scope="module")
+def modelo(dados):
+    X, y = dados
+    return RandomForestRegressor(n_estimators=15, random_state=0).fit(X, y)
+
+
+def test_percurso_vetorizado_igual_ao_sklearn(modelo, dados):
+    X, _ = dados
+    motor = FlorestaCompacta.de_modelo(modelo, precisao="float64")
+    np.testing.assert_array_equal(motor.prever_vetorizado(motor._matriz(X)), modelo.predict(X))
+
+
+def test_artefato_float32_alcanca_as_mesmas_folhas(modelo, dados, tmp_path):
+    X, _ = dados
+    salvar_artefato(modelo, str(tmp_path / "floresta.modelo"), precisao="float32")
+    motor = carregar_artefato(str(tmp_path / "floresta.modelo"))
+    folhas = motor.aplicar(motor._matriz(X)) - motor._raizes[:, None]
+    np.testing.assert_array_equal(folhas, np.stack([arvore.apply(X.to_numpy()) for arvore in modelo.estimators_]))
+
+
+def test_lotes_grandes_usam_o_estimador_original(modelo, dados, tmp_path):
+    X, _ = dados
+    joblib.dump(modelo, tmp_path / "floresta.pkl")
+    salvar_artefato(modelo, str(tmp_path / "floresta.modelo"), estimador_original=str(tmp_path / "floresta.pkl"))
+    motor = carregar_artefato(str(tmp_path / "floresta.modelo"))
+    motor.limite_percurso_vetorizado = 100
+    np.testing.assert_array_equal(motor.predict(X), modelo.predict(X))
+    assert motor.estimador_original() is not None
+
+
+def test_sem_estimador_original_usa_percurso_vetorizado(modelo, dados, tmp_path):
+    X, _ = dados
+    joblib.dump(modelo, tmp_path / "floresta.pkl")
+    salvar_artefato(modelo, str(tmp_path / "floresta.modelo"), estimador_original=str(tmp_path / "floresta.pkl"))
+    (tmp_path / "floresta.pkl").unlink()
+    motor = carregar_artefato(str(tmp_path / "floresta.modelo"))
+    motor.limite_percurso_vetorizado = 100
+    np.testing.assert_array_equal(motor.predict(X), motor.prever_vetorizado(motor._matriz(X)))
+    assert motor.estimador_original() is None